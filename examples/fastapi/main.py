@@ -25,14 +25,26 @@ Streaming RO-Crates from a web server
 
 This example demonstrates how to create an RO-Crate on-the-fly
 and stream the result to the client.
-By using `stream_zip`, the RO-Crate is not written to disk and remote
-data is only fetched on the fly.
+By using `astream_zip`, the RO-Crate is not written to disk and remote
+data is only fetched on the fly, in worker threads that do not block the
+server's event loop.
+
+The /crate-ranged endpoint serves an archive whose members are stored
+without compression, so that its size is known in advance: the response
+has a Content-Length, and clients can request byte ranges (e.g., to resume
+a download). The archive's layout is computed once and shared by all
+requests, so that the CRCs of the members, which are needed for ranges
+that reach the end of the archive, are only computed once.
 
 To run: `fastapi dev main.py`, then visit http://localhost:8000/crate
 """
 
-from fastapi import FastAPI
-from fastapi.responses import StreamingResponse
+import functools
+import re
+
+from fastapi import FastAPI, Header
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response, StreamingResponse
 from rocrate.rocrate import ROCrate
 from io import StringIO
 
@@ -57,9 +69,58 @@ async def get():
 
     # Stream crate to client as a zip file
     return StreamingResponse(
-        crate.stream_zip(),
+        crate.astream_zip(),
         media_type="application/rocrate+zip",
         headers={
             "Content-Disposition": "attachment; filename=crate.zip",
         }
     )
+
+
+def make_ranged_crate():
+    # the crate must be the same for all requests: fix the publication date,
+    # which otherwise defaults to the current time
+    crate = ROCrate()
+    crate.root_dataset["datePublished"] = "2024-01-01T00:00:00+00:00"
+    crate.add_file(
+        source=StringIO("Hello, World!"),
+        dest_path="test-data/hello.txt"
+    )
+    return crate
+
+
+@functools.cache
+def get_ranged_crate_and_plan():
+    crate = make_ranged_crate()
+    return crate, crate.zip_plan()
+
+
+@app.get("/crate-ranged")
+async def get_ranged(range: str = Header(default=None)):
+    # rendering the metadata and stat'ing the files is blocking work
+    crate, plan = await run_in_threadpool(get_ranged_crate_and_plan)
+    headers = {
+        "Content-Disposition": "attachment; filename=crate.zip",
+        "Accept-Ranges": "bytes",
+    }
+    start, end, status = 0, plan.size, 200
+    if range:
+        m = re.fullmatch(r"bytes=(\d*)-(\d*)", range.strip())
+        if not m or not any(m.groups()):
+            return Response(status_code=416, headers={"Content-Range": f"bytes */{plan.size}"})
+        if m.group(1):
+            start = int(m.group(1))
+            end = min(int(m.group(2)) + 1, plan.size) if m.group(2) else plan.size
+        else:  # suffix range: last N bytes
+            start = max(plan.size - int(m.group(2)), 0)
+        if start >= end:
+            return Response(status_code=416, headers={"Content-Range": f"bytes */{plan.size}"})
+        status = 206
+        headers["Content-Range"] = f"bytes {start}-{end - 1}/{plan.size}"
+    headers["Content-Length"] = str(end - start)
+    return StreamingResponse(
+        crate.astream_zip(range=(start, end), plan=plan),
+        status_code=status,
+        media_type="application/rocrate+zip",
+        headers=headers,
+    )
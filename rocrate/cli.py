@@ -25,7 +25,10 @@ from pathlib import Path
 
 import click
 from .rocrate import ROCrate
+from .utils import LINK_MODES
+from .zip_writer import CompressionPolicy
 from .model.computerlanguage import LANG_MAP
+from .model.metadata import METADATA_FORMATS
 from .model.testservice import SERVICE_MAP
 from .model.softwareapplication import APP_MAP
 
@@ -236,12 +239,52 @@ def definition(crate_dir, suite, path, engine, engine_version, property):
     crate.metadata.write(crate_dir)
 
 
+@cli.command()
+@click.argument("dst", type=click.Path(writable=True, file_okay=False))
+@click.option(
+    "-l",
+    "--link-mode",
+    type=click.Choice(LINK_MODES),
+    default="copy",
+    help="How to materialize files in the destination directory. Falls back to copying if not supported.",
+)
+@click.option(
+    "-f",
+    "--metadata-format",
+    type=click.Choice(METADATA_FORMATS),
+    default="pretty",
+    help="Serialization of the metadata file. The compact formats leave out all whitespace.",
+)
+@OPTION_CRATE_PATH
+def write(crate_dir, dst, link_mode, metadata_format):
+    crate = ROCrate(crate_dir, init=False, gen_preview=False)
+    crate.write(dst, link_mode=link_mode, metadata_format=metadata_format)
+
+
 @cli.command()
 @click.argument("dst", type=click.Path(writable=True))
+@click.option(
+    "--compression",
+    type=click.Choice(["deflate", "auto"]),
+    default="deflate",
+    help="deflate: compress all members; auto: store members that are already compressed, "
+    "based on extension, encodingFormat and a sampled compressibility test.",
+)
+@click.option("--compression-level", type=click.IntRange(0, 9), help="DEFLATE compression level.")
+@click.option("--stats", is_flag=True, help="Print the compression ratio and time for each method.")
 @OPTION_CRATE_PATH
-def write_zip(crate_dir, dst):
+def write_zip(crate_dir, dst, compression, compression_level, stats):
     crate = ROCrate(crate_dir, init=False, gen_preview=False)
-    crate.write_zip(dst)
+    if compression == "auto":
+        policy = CompressionPolicy(compresslevel=compression_level)
+    else:
+        policy = CompressionPolicy(
+            compresslevel=compression_level, stored_extensions=(), stored_formats=(), stored_format_prefixes=(),
+            sample_size=0
+        )
+    crate.write_zip(dst, compression_policy=policy)
+    if stats:
+        click.echo(policy.report())
 
 
 if __name__ == "__main__":
@@ -0,0 +1,129 @@
+# Copyright 2019-2026 The University of Manchester, UK
+# Copyright 2020-2026 Vlaams Instituut voor Biotechnologie (VIB), BE
+# Copyright 2020-2026 Barcelona Supercomputing Center (BSC), ES
+# Copyright 2020-2026 Center for Advanced Studies, Research and Development in Sardinia (CRS4), IT
+# Copyright 2022-2026 École Polytechnique Fédérale de Lausanne, CH
+# Copyright 2024-2026 Data Centre, SciLifeLab, SE
+# Copyright 2024-2026 National Institute of Informatics (NII), JP
+# Copyright 2025-2026 Senckenberg Society for Nature Research (SGN), DE
+# Copyright 2025-2026 European Molecular Biology Laboratory (EMBL), Heidelberg, DE
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import importlib
+import json
+import os
+import warnings
+
+
+BACKEND_ENV_VAR = "ROCRATE_JSON_BACKEND"
+BACKENDS = ("json", "orjson", "ujson", "simdjson")
+
+
+def _has_floats(obj):
+    if isinstance(obj, float):
+        return True
+    if isinstance(obj, dict):
+        return any(_has_floats(_) for _ in obj.values())
+    if isinstance(obj, list):
+        return any(_has_floats(_) for _ in obj)
+    return False
+
+
+class JSONBackend:
+    """\
+    Standard library backend.
+    """
+    name = "json"
+    can_dump = False
+
+    def loads(self, data):
+        return json.loads(data)
+
+    def dumps_compact(self, obj, sort_keys=False):
+        """\
+        Return a compact (no whitespace) JSON representation of obj, or None
+        if the backend does not support dumping obj. The output is only
+        required to be equivalent to the one of json.dumps.
+        """
+        return None
+
+
+class _ModuleBackend(JSONBackend):
+
+    def __init__(self, module):
+        self.module = module
+        self.name = module.__name__
+
+    def loads(self, data):
+        try:
+            return self.module.loads(data)
+        except ValueError:
+            # e.g. NaN or very large integers, accepted by the json module
+            return json.loads(data)
+
+
+class _OrjsonBackend(_ModuleBackend):
+
+    can_dump = True
+
+    def dumps_compact(self, obj, sort_keys=False):
+        try:
+            s = self.module.dumps(obj, option=self.module.OPT_SORT_KEYS if sort_keys else 0).decode("utf-8")
+        except TypeError:
+            return None
+        # NaN and infinity, written as null by orjson
+        if "null" in s and _has_floats(obj):
+            return None
+        return s
+
+
+_BACKEND_CLASSES = {"orjson": _OrjsonBackend, "ujson": _ModuleBackend, "simdjson": _ModuleBackend}
+
+
+def get_backend(name=None):
+    """\
+    Get the JSON backend with the given name ("json", "orjson", "ujson",
+    "simdjson" or "auto"). If name is None, it's taken from the
+    ROCRATE_JSON_BACKEND environment variable, defaulting to "json" (the
+    standard library module). "auto" selects the first installed library in
+    the above order. If the requested library is not installed, fall back to
+    the json module.
+
+    Third party libraries are used for parsing and, if supported (currently
+    only orjson), for serializing the metadata in the compact formats. The
+    default ("pretty") format is always produced by the json module, so that
+    the output is the same with all backends.
+    """
+    if isinstance(name, JSONBackend):
+        return name
+    if name is None:
+        name = os.environ.get(BACKEND_ENV_VAR) or "json"
+    if name == "auto":
+        candidates = BACKENDS[1:]
+    elif name in BACKENDS:
+        candidates = [name]
+    else:
+        raise ValueError(f"unknown JSON backend: {name!r}")
+    for c in candidates:
+        if c == "json":
+            break
+        try:
+            module = importlib.import_module(c)
+        except ImportError:
+            continue
+        return _BACKEND_CLASSES[c](module)
+    else:
+        if name != "auto":
+            warnings.warn(f"JSON backend {name!r} not available, falling back to json")
+    return JSONBackend()
@@ -20,6 +20,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from collections import deque
 from io import RawIOBase
 
 
@@ -27,27 +28,73 @@ class MemoryBuffer(RawIOBase):
     """
     A buffer class that supports reading and writing binary data.
     The buffer automatically resets upon reading to make sure all data is read only once.
+
+    Written data is kept as a queue of chunks, so that both appending and
+    consuming data from the front take time proportional to the amount of
+    data involved, rather than to the total amount of buffered data.
     """
 
     def __init__(self):
-        self._buffer = b''
+        self._chunks = deque()
+        self._offset = 0  # position of the first unread byte in _chunks[0]
+        self._size = 0
+
+    def readable(self):
+        return True
+
+    def writable(self):
+        return True
 
     def write(self, data):
         if self.closed:
             raise ValueError('write to closed file')
-        self._buffer += data
+        # copy the data, since the caller is free to reuse its buffer
+        data = bytes(data)
+        if data:
+            self._chunks.append(data)
+            self._size += len(data)
         return len(data)
 
+    def _pop_views(self, size):
+        """\
+        Remove up to size bytes from the front of the buffer, returning them
+        as a list of memoryviews on the stored chunks (no copies are made).
+        """
+        views = []
+        while size > 0 and self._chunks:
+            chunk = self._chunks[0]
+            available = len(chunk) - self._offset
+            view = memoryview(chunk)[self._offset:]
+            if available <= size:
+                self._chunks.popleft()
+                self._offset = 0
+            else:
+                view = view[:size]
+                self._offset += size
+            views.append(view)
+            self._size -= len(view)
+            size -= len(view)
+        return views
+
     def read(self, size=-1):
         if self.closed:
             raise ValueError('read from closed file')
-        if size < 0:
-            data = self._buffer
-            self._buffer = b''
-        else:
-            data = self._buffer[:size]
-            self._buffer = self._buffer[size:]
-        return data
+        if size is None or size < 0:
+            size = self._size
+        views = self._pop_views(size)
+        if len(views) == 1:
+            return views[0].tobytes()
+        return b''.join(views)
+
+    def readinto(self, b):
+        if self.closed:
+            raise ValueError('read from closed file')
+        out = memoryview(b).cast("B")
+        pos = 0
+        for view in self._pop_views(len(out)):
+            out[pos:pos + len(view)] = view
+            pos += len(view)
+        return pos
 
     def __len__(self):
-        return len(self._buffer)
+        return self._size
@@ -21,29 +21,179 @@
 # limitations under the License.
 
 import json
+import re
 import warnings
+import zipfile
 
+from .json_backend import get_backend
 from .model.metadata import BASENAME, LEGACY_BASENAME
 
 
-def read_metadata(metadata_path):
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+def _make_scanner():
+    # json's scanner shares identical keys within a single document, but its
+    # memo is cleared after each call: keep one across all entries instead
+    memo = {}
+
+    def object_pairs_hook(pairs):
+        return {memo.setdefault(k, k): v for k, v in pairs}
+
+    return json.JSONDecoder(object_pairs_hook=object_pairs_hook).scan_once
+
+
+class _JSONStream:
+    """\
+    Minimal pull parser over a text stream, used to decode JSON values one at
+    a time without loading the whole document in memory.
+    """
+
+    def __init__(self, f, chunk_size=65536):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self.scan_once = _make_scanner()
+
+    def _fill(self, size=None):
+        chunk = self.f.read(size or self.chunk_size)
+        if not chunk:
+            self.eof = True
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+
+    def peek(self):
+        """\
+        Skip whitespace and return the next character ("" at EOF).
+        """
+        while True:
+            self.pos = _WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf) or self.eof:
+                return self.buf[self.pos:self.pos + 1]
+            self._fill()
+
+    def expect(self, chars):
+        """\
+        Consume the next character, which must be one of chars. If chars is
+        empty, check that only whitespace is left instead.
+        """
+        c = self.peek()
+        if not chars:
+            if c:
+                raise ValueError(f"unexpected data after the end of the document: {c!r}")
+            return c
+        if not c or c not in chars:
+            raise ValueError(f"expected one of {chars!r}, found {c!r}")
+        self.pos += 1
+        return c
+
+    def decode(self):
+        """\
+        Decode the next JSON value, reading more data as needed.
+        """
+        self.peek()
+        size = self.chunk_size
+        while True:
+            try:
+                value, end = self.scan_once(self.buf, self.pos)
+            except (StopIteration, json.JSONDecodeError) as e:
+                if self.eof:
+                    if isinstance(e, StopIteration):
+                        raise json.JSONDecodeError("Expecting value", self.buf, e.value)
+                    raise
+            else:
+                # a number at the end of the buffer could be incomplete
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return value
+            self._fill(size)
+            size *= 2
+
+
+def iter_graph(f, metadata=None, chunk_size=65536):
+    """\
+    Incrementally parse RO-Crate metadata from a text stream.
+
+    Yield the entries of the top-level @graph array one at a time, so that
+    the full JSON document never needs to be held in memory. If a metadata
+    dictionary is provided, all other top-level members (e.g. @context) are
+    stored into it; the @graph key is also set, to an empty list, if the
+    document contains a graph. Raise ValueError if the document is not a
+    single JSON object.
+    """
+    if metadata is None:
+        metadata = {}
+    stream = _JSONStream(f, chunk_size=chunk_size)
+    stream.expect("{")
+    if stream.peek() == "}":
+        stream.pos += 1
+        stream.expect("")
+        return
+    while True:
+        key = stream.decode()
+        stream.expect(":")
+        if key == "@graph":
+            metadata["@graph"] = []
+            stream.expect("[")
+            if stream.peek() == "]":
+                stream.pos += 1
+            else:
+                while True:
+                    yield stream.decode()
+                    if stream.expect(",]") == "]":
+                        break
+        else:
+            metadata[key] = stream.decode()
+        if stream.expect(",}") == "}":
+            break
+    stream.expect("")
+
+
+def read_metadata(metadata_path, backend=None, incremental=False):
     """\
     Read an RO-Crate metadata file.
 
     Return a tuple of two elements: the context; a dictionary that maps entity
     ids to the entities themselves.
+
+    metadata_path can also be a zipfile.Path pointing to the metadata file
+    inside a zip archive, or a dictionary holding the already parsed metadata.
+    The file is parsed with the given JSON backend (see
+    rocrate.json_backend). If incremental is True, it's parsed with
+    iter_graph instead, adding each @graph entry to the returned dictionary as
+    soon as it's decoded: this avoids holding the whole JSON text in memory
+    together with the parsed entities, at the cost of slower parsing.
     """
+    if backend is None:
+        backend = get_backend()
+    entities = None
     if isinstance(metadata_path, dict):
         metadata = metadata_path
+    elif not incremental:
+        if isinstance(metadata_path, zipfile.Path):
+            f = metadata_path.open('rb')
+        else:
+            f = open(metadata_path, 'rb')
+        with f:
+            metadata = backend.loads(f.read())
     else:
-        with open(metadata_path, 'r', encoding='utf-8') as f:
-            metadata = json.load(f)
+        metadata = {}
+        if isinstance(metadata_path, zipfile.Path):
+            f = metadata_path.open('r', encoding='utf-8')
+        else:
+            f = open(metadata_path, 'r', encoding='utf-8')
+        with f:
+            entities = {_["@id"]: _ for _ in iter_graph(f, metadata)}
     try:
         context = metadata['@context']
         graph = metadata['@graph']
     except KeyError:
         raise ValueError(f"{metadata_path} must have a @context and a @graph")
-    return context, {_["@id"]: _ for _ in graph}
+    if entities is None:
+        entities = {_["@id"]: _ for _ in graph}
+    return context, entities
 
 
 def _check_descriptor(descriptor, entities):
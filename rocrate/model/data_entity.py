@@ -24,11 +24,12 @@
 
 
 from .entity import Entity
+from ..utils import iterate_in_thread
 
 
 class DataEntity(Entity):
 
-    def write(self, base_path):
+    def write(self, base_path, context=None):
         pass
 
     def stream(self, chunk_size=8192):
@@ -41,3 +42,12 @@ class DataEntity(Entity):
         openend.
         """
         yield from ()
+
+    async def astream(self, chunk_size=8192):
+        """\
+        Asynchronous version of stream. Blocking operations (reading files,
+        fetching remote data) are run in worker threads, so the event loop
+        is not blocked.
+        """
+        async for path, chunk in iterate_in_thread(self.stream(chunk_size=chunk_size)):
+            yield path, chunk
@@ -25,16 +25,24 @@
 import errno
 import os
 import warnings
+import zipfile
 from pathlib import Path
-from urllib.request import urlopen
 from urllib.parse import unquote
 
 from .file_or_dir import FileOrDir
+from ..remote import check_url, iter_url
 from ..utils import is_url, iso_now, Mode
 
 
 class Dataset(FileOrDir):
 
+    def __init__(self, crate, source=None, dest_path=None, fetch_remote=False,
+                 validate_url=False, properties=None, record_size=False, record_checksums=()):
+        if record_checksums:
+            raise ValueError("record_checksums is only supported for files")
+        super().__init__(crate, source, dest_path, fetch_remote, validate_url,
+                         properties=properties, record_size=record_size)
+
     def _empty(self):
         val = {
             "@id": self.id,
@@ -43,13 +51,21 @@ class Dataset(FileOrDir):
         return val
 
     # SHOULD end with /
-    def format_id(self, identifier):
+    @classmethod
+    def format_id(cls, identifier):
         return identifier.rstrip("/") + "/"
 
+    def _update_from_headers(self, headers):
+        """\
+        Update the entity's properties after checking its URL.
+        """
+        if not self.fetch_remote:
+            self._jsonld['sdDatePublished'] = iso_now()
+
     def _write_from_url(self, base_path):
         if self.validate_url and not self.fetch_remote:
-            with urlopen(self.source) as _:
-                self._jsonld['sdDatePublished'] = iso_now()
+            check_url(self.crate.http_session, self.source)
+            self._update_from_headers({})
         if self.fetch_remote:
             out_file_path, out_file = None, None
             for rel_path, chunk in self._stream_folder_from_url():
@@ -64,26 +80,31 @@ class Dataset(FileOrDir):
             if out_file:
                 out_file.close()
 
-    def _copy_folder(self, base_path):
+    def _source_exists(self):
+        if isinstance(self.source, zipfile.Path):
+            return self.source.exists()
+        return Path(self.source).exists()
+
+    def _copy_folder(self, base_path, context=None):
         abs_out_path = base_path / unquote(self.id)
         if self.source is None:
             abs_out_path.mkdir(parents=True, exist_ok=True)
         else:
             path = self.source
-            if not Path(path).exists():
+            if not self._source_exists():
                 raise FileNotFoundError(
-                    errno.ENOENT, os.strerror(errno.ENOENT), path
+                    errno.ENOENT, os.strerror(errno.ENOENT), str(path)
                 )
             abs_out_path.mkdir(parents=True, exist_ok=True)
             if self.crate.mode == Mode.CREATE:
-                self.crate._copy_unlisted(path, abs_out_path)
+                self.crate._copy_unlisted(path, abs_out_path, context)
 
-    def write(self, base_path):
+    def write(self, base_path, context=None):
         base_path = Path(base_path)
         if is_url(str(self.source)):
             self._write_from_url(base_path)
         else:
-            self._copy_folder(base_path)
+            self._copy_folder(base_path, context)
 
     def stream(self, chunk_size=8192):
         if self.source is None:
@@ -95,7 +116,7 @@ class Dataset(FileOrDir):
 
     def _stream_folder_from_path(self, chunk_size=8192):
         path = self.source
-        if not Path(path).exists():
+        if not self._source_exists():
             raise FileNotFoundError(
                 errno.ENOENT, os.strerror(errno.ENOENT), str(path)
             )
@@ -118,26 +139,30 @@ class Dataset(FileOrDir):
     def _stream_folder_from_url(self, chunk_size=8192):
         if not self.fetch_remote:
             if self.validate_url:
-                with urlopen(self.source) as _:
-                    self._jsonld['sdDatePublished'] = iso_now()
+                check_url(self.crate.http_session, self.source)
+                self._update_from_headers({})
         else:
-            base = self.source.rstrip("/")
             for entry in self._jsonld.get("hasPart", []):
-                try:
-                    part = entry["@id"]
-                    if is_url(part) or part.startswith("/"):
-                        raise RuntimeError(f"'{self.source}': part '{part}' is not a relative path")
-                    part_uri = f"{base}/{part}"
-                    rel_out_path = Path(self.id) / part
-
-                    is_empty = True
-                    with urlopen(part_uri) as response:
-                        while chunk := response.read(chunk_size):
-                            is_empty = False
-                            yield str(rel_out_path), chunk
-
-                    # yield once for an empty file
-                    if is_empty:
-                        yield str(rel_out_path), b""
-                except KeyError:
-                    warnings.warn(f"'hasPart' entry in {self.id} is missing '@id'. Skipping.")
+                yield from self._stream_part_from_url(entry, chunk_size)
+
+    def _stream_part_from_url(self, entry, chunk_size=8192):
+        try:
+            part = entry["@id"]
+            if is_url(part) or part.startswith("/"):
+                raise RuntimeError(f"'{self.source}': part '{part}' is not a relative path")
+            part_uri = f"{self.source.rstrip('/')}/{part}"
+            rel_out_path = Path(self.id) / part
+
+            is_empty = True
+            for chunk in iter_url(
+                    self.crate.http_session, part_uri, chunk_size, cache=self.crate.remote_cache,
+                    downloader=self.crate.downloader
+            ):
+                is_empty = False
+                yield str(rel_out_path), chunk
+
+            # yield once for an empty file
+            if is_empty:
+                yield str(rel_out_path), b""
+        except KeyError:
+            warnings.warn(f"'hasPart' entry in {self.id} is missing '@id'. Skipping.")
@@ -37,6 +37,7 @@ class Entity(MutableMapping):
             self.__id = self.format_id(identifier)
         else:
             self.__id = f"#{uuid.uuid4()}"
+        self.__canonical_id = None
         self._jsonld = self._empty()
         if properties:
             for name, value in properties.items():
@@ -52,7 +53,8 @@ class Entity(MutableMapping):
 
     # Format the given ID with rules appropriate for this type.
     # For example, Dataset (directory) data entities SHOULD end with /
-    def format_id(self, identifier):
+    @classmethod
+    def format_id(cls, identifier):
         return str(identifier)
 
     def __repr__(self):
@@ -72,7 +74,10 @@ class Entity(MutableMapping):
         return "Thing"
 
     def canonical_id(self):
-        return self.crate.resolve_id(self.id)
+        # the id can't change, so the resolved one is computed only once
+        if self.__canonical_id is None:
+            self.__canonical_id = self.crate.resolve_id(self.id)
+        return self.__canonical_id
 
     def __hash__(self):
         return hash(self.canonical_id())
@@ -88,6 +93,13 @@ class Entity(MutableMapping):
         v = self._jsonld[key]
         if v is None or key.startswith("@"):
             return v
+        return self._deref(v)
+
+    def _deref(self, v):
+        """\
+        Replace references in the property value v with the corresponding
+        entities, if they are in the crate.
+        """
         values = v if isinstance(v, list) else [v]
         deref_values = []
         for entry in values:
@@ -105,6 +117,17 @@ class Entity(MutableMapping):
     def __setitem__(self, key: str, value):
         if key.startswith("@"):
             raise KeyError(f"cannot set '{key}'")
+        ref_values = self._ref_values(value)
+        old_value = self._jsonld.get(key)
+        self._jsonld[key] = ref_values if isinstance(value, list) else ref_values[0]
+        self.crate._update_refs(self, key, old_value, ref_values)
+
+    @staticmethod
+    def _ref_values(value):
+        """\
+        Convert the value to be set for a property to a list of JSON-LD
+        values, replacing entities with references.
+        """
         values = value if isinstance(value, list) else [value]
         for i, v in enumerate(values):
             if isinstance(v, dict) and "@id" not in v:
@@ -113,13 +136,13 @@ class Entity(MutableMapping):
                     values[i] = v["@value"]
                 else:
                     raise ValueError(f"no @id in {v}")
-        ref_values = [{"@id": _.id} if isinstance(_, Entity) else _ for _ in values]
-        self._jsonld[key] = ref_values if isinstance(value, list) else ref_values[0]
+        return [{"@id": _.id} if isinstance(_, Entity) else _ for _ in values]
 
     def __delitem__(self, key: str):
         if key.startswith("@"):
             raise KeyError(f"cannot delete '{key}'")
-        del self._jsonld[key]
+        old_value = self._jsonld.pop(key)
+        self.crate._update_refs(self, key, old_value)
 
     def popitem(self):
         raise NotImplementedError
@@ -142,12 +165,17 @@ class Entity(MutableMapping):
     def __eq__(self, other):
         if not isinstance(other, Entity):
             return NotImplemented
-        return self.id == other.id and self._jsonld == other._jsonld
+        return self.id == other.id and self.properties() == other.properties()
 
     @property
     def type(self):
         return self._jsonld['@type']
 
+    @type.setter
+    def type(self, value):
+        self._jsonld['@type'] = value
+        self.crate._update_type_index(self)
+
     @property
     def datePublished(self):
         d = self.get('datePublished')
@@ -161,8 +189,8 @@ class Entity(MutableMapping):
             pass
         self['datePublished'] = value
 
-    def delete(self):
-        self.crate.delete(self)
+    def delete(self, cascade=False):
+        self.crate.delete(self, cascade=cascade)
 
     def append_to(self, key: str, value, compact=False):
         if key.startswith("@"):
@@ -172,6 +200,8 @@ class Entity(MutableMapping):
             current_value = self._jsonld[key] = [current_value]
         if not isinstance(value, list):
             value = [value]
-        current_value.extend([{"@id": _.id} if isinstance(_, Entity) else _ for _ in value])
+        ref_values = [{"@id": _.id} if isinstance(_, Entity) else _ for _ in value]
+        current_value.extend(ref_values)
+        self.crate._update_refs(self, key, new_value=ref_values)
         if compact and len(current_value) == 1:
             self._jsonld[key] = current_value[0]
@@ -23,16 +23,19 @@
 # limitations under the License.
 
 from pathlib import Path
-import requests
+import hashlib
 import shutil
-import urllib.request
 import warnings
+import zipfile
 from io import BytesIO, StringIO
 from urllib.parse import unquote
 
 from .file_or_dir import FileOrDir
+from ..remote import is_http, iter_url
 from ..utils import is_url, iso_now
 
+COPY_BUFSIZE = 1024 * 1024
+
 
 class File(FileOrDir):
 
@@ -63,14 +66,56 @@ class File(FileOrDir):
             for _, chunk in self.stream():
                 out_file.write(chunk)
 
-    def _copy_file(self, path, out_file_path):
+    def _new_hashers(self):
+        return [hashlib.new(_) for _ in self.record_checksums]
+
+    def _set_checksums(self, hashers):
+        for h in hashers:
+            self._jsonld[h.name] = h.hexdigest()
+
+    @staticmethod
+    def _copy_fileobj(in_file, out_file, hashers):
+        """\
+        Copy in_file to out_file, feeding the data to the hashers on the way.
+        """
+        if not hashers:
+            return shutil.copyfileobj(in_file, out_file)
+        while chunk := in_file.read(COPY_BUFSIZE):
+            for h in hashers:
+                h.update(chunk)
+            out_file.write(chunk)
+
+    def _copy_file(self, path, out_file_path, context=None):
         out_file_path.parent.mkdir(parents=True, exist_ok=True)
-        if not out_file_path.exists() or not out_file_path.samefile(path):
-            shutil.copy(path, out_file_path)
+        hashers = self._new_hashers()
+        hashed = False
+        if isinstance(path, zipfile.Path):
+            with path.open('rb') as in_file, open(out_file_path, 'wb') as out_file:
+                self._copy_fileobj(in_file, out_file, hashers)
+            hashed = True
+        elif not out_file_path.exists() or not out_file_path.samefile(path):
+            if hashers:
+                def copy(src, dst):
+                    nonlocal hashed
+                    with open(src, 'rb') as in_file, open(dst, 'wb') as out_file:
+                        self._copy_fileobj(in_file, out_file, hashers)
+                    shutil.copymode(src, dst)
+                    hashed = True
+            else:
+                copy = shutil.copy
+            self.crate._copy_file(path, out_file_path, copy, context)
+        if hashers:
+            if not hashed:
+                # the data was not read (e.g., linked or up to date): read it now
+                with open(path, 'rb') as in_file:
+                    while chunk := in_file.read(COPY_BUFSIZE):
+                        for h in hashers:
+                            h.update(chunk)
+            self._set_checksums(hashers)
         if self.record_size:
             self._jsonld['contentSize'] = str(out_file_path.stat().st_size)
 
-    def write(self, base_path):
+    def write(self, base_path, context=None):
         out_file_path = Path(base_path) / unquote(self.id)
         if isinstance(self.source, (BytesIO, StringIO)) or is_url(str(self.source)):
             self._write_from_stream(out_file_path)
@@ -78,7 +123,7 @@ class File(FileOrDir):
             # Allows to record a File entity whose @id does not exist, see #73
             warnings.warn(f"No source for {self.id}")
         else:
-            self._copy_file(self.source, out_file_path)
+            self._copy_file(self.source, out_file_path, context)
 
     def _stream_from_stream(self, stream):
         size = 0
@@ -95,36 +140,62 @@ class File(FileOrDir):
         if self.record_size:
             self._jsonld['contentSize'] = str(size)
 
+    def _update_from_headers(self, headers):
+        """\
+        Update the entity's properties with the HTTP headers returned for
+        its URL.
+        """
+        for key, header in ('contentSize', 'Content-Length'), ('encodingFormat', 'Content-Type'):
+            if headers.get(header) is not None:
+                self._jsonld[key] = headers[header]
+        if not self.fetch_remote:
+            date_published = headers.get("Last-Modified", iso_now())
+            self._jsonld['sdDatePublished'] = date_published
+
     def _stream_from_url(self, url, chunk_size=8192):
         if self.fetch_remote or self.validate_url:
             if self.validate_url:
                 if url.startswith("http"):
-                    with requests.head(url) as response:
-                        self._jsonld.update({
-                            'contentSize': response.headers.get('Content-Length'),
-                            'encodingFormat': response.headers.get('Content-Type')
-                        })
-                    if not self.fetch_remote:
-                        date_published = response.headers.get("Last-Modified", iso_now())
-                        self._jsonld['sdDatePublished'] = date_published
+                    cache = self.crate.remote_cache
+                    record = cache.get_fresh(url) if cache is not None else None
+                    if record is not None:
+                        headers = cache.headers(record)
+                    else:
+                        with self.crate.http_session.head(url, allow_redirects=True) as response:
+                            headers = response.headers
+                    self._update_from_headers(headers)
             if self.fetch_remote:
                 size = 0
                 self._jsonld['contentUrl'] = str(url)
-                with urllib.request.urlopen(url) as response:
-                    while chunk := response.read(chunk_size):
-                        yield self.id, chunk
-                        size += len(chunk)
+                for chunk in iter_url(
+                        self.crate.http_session, url, chunk_size, cache=self.crate.remote_cache,
+                        downloader=self.crate.downloader
+                ):
+                    yield self.id, chunk
+                    size += len(chunk)
 
                 # yield once for an empty file
                 if size == 0:
                     yield self.id, b""
 
+                self._update_from_cache(url)
                 if self.record_size:
                     self._jsonld['contentSize'] = str(size)
 
+    def _update_from_cache(self, url):
+        """\
+        Set contentSize and sdDatePublished from the remote cache's record
+        for url (the one just served or stored), if any.
+        """
+        cache = self.crate.remote_cache
+        record = cache.get(url) if cache is not None and is_http(url) else None
+        if record is not None:
+            self._jsonld['contentSize'] = str(record['size'])
+            self._jsonld['sdDatePublished'] = cache.date_published(record)
+
     def _stream_from_file(self, path, chunk_size=8192):
         size = 0
-        with open(path, 'rb') as f:
+        with (path.open('rb') if isinstance(path, zipfile.Path) else open(path, 'rb')) as f:
             while chunk := f.read(chunk_size):
                 yield unquote(self.id), chunk
                 size += len(chunk)
@@ -137,6 +208,19 @@ class File(FileOrDir):
             self._jsonld['contentSize'] = str(size)
 
     def stream(self, chunk_size=8192):
+        hashers = self._new_hashers()
+        if not hashers:
+            yield from self._stream(chunk_size)
+            return
+        for path, chunk in self._stream(chunk_size):
+            for h in hashers:
+                h.update(chunk)
+            yield path, chunk
+        # no content for remote files that are not fetched
+        if self._has_writeable_stream():
+            self._set_checksums(hashers)
+
+    def _stream(self, chunk_size=8192):
         if isinstance(self.source, (BytesIO, StringIO)):
             yield from self._stream_from_stream(self.source)
         elif is_url(str(self.source)):
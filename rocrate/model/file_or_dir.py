@@ -22,7 +22,9 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import hashlib
 import os
+import zipfile
 from pathlib import Path
 from urllib.parse import quote
 
@@ -33,12 +35,18 @@ from ..utils import is_url, Mode
 class FileOrDir(DataEntity):
 
     def __init__(self, crate, source=None, dest_path=None, fetch_remote=False,
-                 validate_url=False, properties=None, record_size=False):
+                 validate_url=False, properties=None, record_size=False, record_checksums=()):
         if properties is None:
             properties = {}
         self.fetch_remote = fetch_remote
         self.validate_url = validate_url
         self.record_size = record_size
+        if isinstance(record_checksums, str):
+            record_checksums = (record_checksums,)
+        for algorithm in record_checksums:
+            if algorithm not in hashlib.algorithms_available:
+                raise ValueError(f"unsupported checksum algorithm: {algorithm!r}")
+        self.record_checksums = tuple(record_checksums)
         self.source = source
         if dest_path:
             dest_path = Path(dest_path)
@@ -48,7 +56,7 @@ class FileOrDir(DataEntity):
             if not crate.mode == Mode.READ:
                 identifier = quote(identifier)
         else:
-            if not isinstance(source, (str, Path)):
+            if not isinstance(source, (str, Path, zipfile.Path)):
                 raise ValueError("dest_path must be provided if source is not a path or URI")
             if is_url(str(source)):
                 identifier = os.path.basename(source) if fetch_remote else source
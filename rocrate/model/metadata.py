@@ -23,6 +23,7 @@
 # limitations under the License.
 
 import json
+from itertools import islice
 from pathlib import Path
 
 from .file import File
@@ -35,12 +36,34 @@ SUPPORTED_VERSIONS = {
     "1.2", "1.2-DRAFT"
 }
 DEFAULT_VERSION = "1.2"
+# pretty: indented, sorted keys; compact: no whitespace, keys in insertion
+# order; sorted-compact: no whitespace, sorted keys
+METADATA_FORMATS = ("pretty", "compact", "sorted-compact")
 BASENAME = "ro-crate-metadata.json"
 LEGACY_BASENAME = "ro-crate-metadata.jsonld"
 
 WORKFLOW_PROFILE = "https://w3id.org/workflowhub/workflow-ro-crate/1.0"
 
 
+class _Graph(list):
+    """\
+    Stand-in for the list of entity properties in the crate's @graph, which
+    are produced only when iterating over it. This allows the JSON encoder
+    (whose pure Python implementation, used when indent is set, only calls
+    bool() and iter() on lists) to serialize them one at a time.
+    """
+
+    def __init__(self, crate):
+        super().__init__()
+        self.crate = crate
+
+    def __bool__(self):
+        return True
+
+    def __iter__(self):
+        return (_.properties() for _ in self.crate.get_entities())
+
+
 class Metadata(File):
     """\
     RO-Crate metadata file.
@@ -78,24 +101,65 @@ class Metadata(File):
         graph = []
         for entity in self.crate.get_entities():
             graph.append(entity.properties())
+        return {'@context': self._context(), '@graph': graph}
+
+    def _context(self):
         context = [f'{self.profile}/context']
         context.extend(self.extra_contexts)
         if self.extra_terms:
             context.append(self.extra_terms)
         if len(context) == 1:
             context = context[0]
-        return {'@context': context, '@graph': graph}
-
-    def stream(self, chunk_size=8192):
-        content = self.generate()
-        yield self.id, str.encode(json.dumps(content, indent=4, sort_keys=True), encoding='utf-8')
+        return context
+
+    def _iter_compact(self, sort_keys=False):
+        """\
+        Serialize the output of generate() entity by entity, without any
+        whitespace.
+        """
+        backend = self.crate.json_backend
+        encoder = json.JSONEncoder(separators=(",", ":"), sort_keys=sort_keys)
+        yield '{"@context":' + encoder.encode(self._context()) + ',"@graph":['
+        sep = ""
+        for entity in self.crate.get_entities():
+            properties = entity.properties()
+            s = backend.dumps_compact(properties, sort_keys=sort_keys) if backend.can_dump else None
+            if s is None:
+                s = encoder.encode(properties)
+            yield sep + s
+            sep = ","
+        yield "]}"
+
+    def stream(self, chunk_size=8192, metadata_format="pretty"):
+        # in the default (pretty) format, same output as
+        # json.dumps(self.generate(), indent=4, sort_keys=True), but the graph
+        # is serialized one entity at a time
+        if metadata_format != "pretty":
+            pieces = self._iter_compact(sort_keys=(metadata_format == "sorted-compact"))
+        else:
+            content = {'@context': self._context(), '@graph': _Graph(self.crate)}
+            encoded = json.JSONEncoder(indent=4, sort_keys=True).iterencode(content)
+            # the encoder's output consists of many small pieces: join them
+            # in batches to keep the per-piece overhead low
+            pieces = iter(lambda: "".join(islice(encoded, 256)), "")
+        buf, size = [], 0
+        for s in pieces:
+            buf.append(s)
+            size += len(s)
+            if size >= chunk_size:
+                yield self.id, "".join(buf).encode("utf-8")
+                buf, size = [], 0
+        if buf:
+            yield self.id, "".join(buf).encode("utf-8")
 
     def _has_writeable_stream(self):
         return True
 
-    def write(self, dest_base):
-        write_path = Path(dest_base) / self.id
-        super()._write_from_stream(write_path)
+    def write(self, dest_base, context=None):
+        metadata_format = context.metadata_format if context is not None else "pretty"
+        with open(Path(dest_base) / self.id, 'wb') as out_file:
+            for _, chunk in self.stream(metadata_format=metadata_format):
+                out_file.write(chunk)
 
     @property
     def root(self) -> Dataset:
@@ -100,6 +100,6 @@ class Preview(File):
     def _has_writeable_stream(self):
         return True
 
-    def write(self, dest_base):
+    def write(self, dest_base, context=None):
         write_path = Path(dest_base) / self.id
         super()._write_from_stream(write_path)
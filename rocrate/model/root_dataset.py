@@ -22,15 +22,31 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import itertools
+
 from .dataset import Dataset
+from .entity import Entity
 from ..utils import iso_now
 
 
 class RootDataset(Dataset):
+    """\
+    The root data entity. Its hasPart is kept apart from the other
+    properties, in an ordered mapping from positions to JSON-LD values,
+    together with the positions of each referenced entity (by canonical id),
+    so that data entities can be removed from it in constant time. The list
+    of values, including any repeated references, is built when the
+    properties are requested, e.g. when writing the metadata.
+    """
 
     def __init__(self, crate, source=None, dest_path=None, properties=None):
         if source is None and dest_path is None:
             dest_path = "./"
+        # position -> value
+        self._parts = {}
+        # canonical id -> positions of the references to it
+        self.__part_positions = {}
+        self.__next_position = itertools.count()
         super().__init__(
             crate,
             source=source,
@@ -47,3 +63,73 @@ class RootDataset(Dataset):
             "datePublished": iso_now(),
         }
         return val
+
+    def __add_parts(self, values):
+        for v in values:
+            position = next(self.__next_position)
+            self._parts[position] = v
+            if isinstance(v, dict) and "@id" in v:
+                self.__part_positions.setdefault(self.crate.resolve_id(v["@id"]), []).append(position)
+
+    def __clear_parts(self):
+        self._parts = {}
+        self.__part_positions = {}
+
+    def _remove_part(self, key):
+        """\
+        Remove the references to the entity with canonical id key from
+        hasPart.
+        """
+        for position in self.__part_positions.pop(key, ()):
+            del self._parts[position]
+
+    def properties(self):
+        if not self._parts:
+            return self._jsonld
+        return {**self._jsonld, "hasPart": list(self._parts.values())}
+
+    def as_jsonld(self):
+        return self.properties()
+
+    def __getitem__(self, key):
+        if key != "hasPart":
+            return super().__getitem__(key)
+        if not self._parts:
+            raise KeyError(key)
+        return self._deref(list(self._parts.values()))
+
+    def __setitem__(self, key: str, value):
+        if key != "hasPart":
+            return super().__setitem__(key, value)
+        ref_values = self._ref_values(value)
+        old_value = list(self._parts.values())
+        self.__clear_parts()
+        self.__add_parts(ref_values)
+        self.crate._update_refs(self, key, old_value, ref_values)
+
+    def __delitem__(self, key: str):
+        if key != "hasPart":
+            return super().__delitem__(key)
+        if not self._parts:
+            raise KeyError(key)
+        old_value = list(self._parts.values())
+        self.__clear_parts()
+        self.crate._update_refs(self, key, old_value)
+
+    def __iter__(self):
+        return iter(list(self._jsonld) + (["hasPart"] if self._parts else []))
+
+    def __len__(self):
+        return len(self._jsonld) + bool(self._parts)
+
+    def __contains__(self, key):
+        return key in self._jsonld or (key == "hasPart" and bool(self._parts))
+
+    def append_to(self, key: str, value, compact=False):
+        if key != "hasPart":
+            return super().append_to(key, value, compact=compact)
+        if not isinstance(value, list):
+            value = [value]
+        ref_values = [{"@id": _.id} if isinstance(_, Entity) else _ for _ in value]
+        self.__add_parts(ref_values)
+        self.crate._update_refs(self, key, new_value=ref_values)
@@ -0,0 +1,481 @@
+# Copyright 2019-2026 The University of Manchester, UK
+# Copyright 2020-2026 Vlaams Instituut voor Biotechnologie (VIB), BE
+# Copyright 2020-2026 Barcelona Supercomputing Center (BSC), ES
+# Copyright 2020-2026 Center for Advanced Studies, Research and Development in Sardinia (CRS4), IT
+# Copyright 2022-2026 École Polytechnique Fédérale de Lausanne, CH
+# Copyright 2024-2026 Data Centre, SciLifeLab, SE
+# Copyright 2024-2026 National Institute of Informatics (NII), JP
+# Copyright 2025-2026 Senckenberg Society for Nature Research (SGN), DE
+# Copyright 2025-2026 European Molecular Biology Laboratory (EMBL), Heidelberg, DE
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import re
+import socket
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from tempfile import SpooledTemporaryFile
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+DEFAULT_POOL_SIZE = 16
+DEFAULT_PREFETCH_MEMORY = 64 * 1024 * 1024
+HTTP_SCHEMES = frozenset(("http", "https"))
+RETRY_STATUSES = frozenset((408, 429, 500, 502, 503, 504))
+_CONTENT_RANGE = re.compile(r"bytes (\d+)-(\d+)/(\d+|\*)")
+
+
+def new_session(pool_size=DEFAULT_POOL_SIZE):
+    """\
+    Create a requests session that keeps up to pool_size connections alive
+    per host, to be reused by all remote fetches. Content encoding is
+    disabled, so that downloaded bytes (and lengths) are those of the remote
+    resource as stored by the server.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers["Accept-Encoding"] = "identity"
+    return session
+
+
+def is_http(url):
+    return urlsplit(str(url)).scheme.lower() in HTTP_SCHEMES
+
+
+@contextmanager
+def _url_errors(url):
+    # raise the same exceptions as urllib.request.urlopen
+    try:
+        yield
+    except requests.HTTPError as e:
+        r = e.response
+        raise HTTPError(url, r.status_code, r.reason, r.headers, None) from e
+    except requests.RequestException as e:
+        raise URLError(e) from e
+
+
+def check_url(session, url):
+    """\
+    Raise an exception if url cannot be reached. HTTP(S) URLs are checked
+    with a HEAD request (following redirects), others by opening them.
+    """
+    if is_http(url):
+        with _url_errors(url), session.head(url, allow_redirects=True) as response:
+            response.raise_for_status()
+    else:
+        with urllib.request.urlopen(url):
+            pass
+
+
+def url_headers(session, url, timeout=None):
+    """\
+    Return the status code and headers of the response to a HEAD request
+    for url, following redirects. If the server does not support HEAD, a
+    GET request is sent instead (without reading the content). Non-HTTP
+    URLs are only checked for existence, with (None, {}) as the result.
+    """
+    if not is_http(url):
+        check_url(session, url)
+        return None, {}
+    with session.head(url, allow_redirects=True, timeout=timeout) as response:
+        if response.status_code not in (405, 501):
+            return response.status_code, response.headers
+    with session.get(url, stream=True, timeout=timeout) as response:
+        return response.status_code, response.headers
+
+
+def iter_url(session, url, chunk_size=8192, cache=None, downloader=None):
+    """\
+    Yield the content of url in chunks of (at most) chunk_size bytes.
+    HTTP(S) URLs are fetched via session with downloader (a Downloader,
+    which retries after errors), or from cache (a
+    rocrate.remote_cache.RemoteCache) if given; other schemes (e.g., ftp)
+    are opened with urllib. In all cases, errors are raised as
+    urllib.error.URLError.
+    """
+    if downloader is None:
+        downloader = DEFAULT_DOWNLOADER
+    if is_http(url) and cache is not None:
+        yield from cache.fetch(session, url, chunk_size, downloader=downloader)
+    elif is_http(url):
+        with _url_errors(url):
+            yield from downloader.iter(session, url, chunk_size)
+    else:
+        with urllib.request.urlopen(url) as response:
+            while chunk := response.read(chunk_size):
+                yield chunk
+
+
+def iter_url_range(session, url, start=0, chunk_size=8192, cache=None, downloader=None):
+    """\
+    Yield the content of url from byte start, as in iter_url. HTTP(S) URLs
+    that are not fetched from cache are requested with a Range header, so
+    that the preceding bytes are not downloaded (if the server supports
+    range requests: otherwise, they are skipped).
+    """
+    if downloader is None:
+        downloader = DEFAULT_DOWNLOADER
+    if is_http(url) and cache is None:
+        with _url_errors(url):
+            yield from downloader._iter_range(session, url, chunk_size, start=start)
+        return
+    skip = start
+    for chunk in iter_url(session, url, chunk_size, cache=cache, downloader=downloader):
+        if skip:
+            n = min(skip, len(chunk))
+            chunk, skip = chunk[n:], skip - n
+        if chunk:
+            yield chunk
+
+
+class _Spool:
+    """\
+    Buffer for the (path, chunk) items of a stream, kept in memory up to
+    max_size bytes and in a temporary file beyond that. The buffer is filled
+    by one thread (fill) and can be read by another one at the same time
+    (replay).
+    """
+
+    def __init__(self, max_size):
+        self.file = SpooledTemporaryFile(max_size=max_size)
+        self.cond = threading.Condition()
+        self.segments = []  # [path, size]
+        self.done = False
+        self.closed = False
+        self.error = None
+
+    def fill(self, stream):
+        try:
+            for path, chunk in stream:
+                with self.cond:
+                    if self.closed:
+                        break
+                    self.file.seek(0, os.SEEK_END)
+                    self.file.write(chunk)
+                    if self.segments and self.segments[-1][0] == path:
+                        self.segments[-1][1] += len(chunk)
+                    else:
+                        self.segments.append([path, len(chunk)])
+                    self.cond.notify_all()
+        except BaseException as e:
+            self.error = e
+        finally:
+            stream.close()
+            with self.cond:
+                self.done = True
+                self.cond.notify_all()
+
+    def __ready(self, index, offset):
+        # segment data is available at offset, or the segment is complete
+        if index >= len(self.segments):
+            return self.done
+        return offset < self.segments[index][1] or index < len(self.segments) - 1 or self.done
+
+    def replay(self, chunk_size):
+        index, offset, pos = 0, 0, 0
+        try:
+            while True:
+                with self.cond:
+                    while not self.__ready(index, offset):
+                        self.cond.wait()
+                    if index >= len(self.segments):
+                        break
+                    path, size = self.segments[index]
+                    if offset < size:
+                        self.file.seek(pos)
+                        chunk = self.file.read(min(chunk_size, size - offset))
+                        offset += len(chunk)
+                        pos += len(chunk)
+                    else:
+                        index, offset = index + 1, 0
+                        # yield once for an empty file
+                        if size > 0:
+                            continue
+                        chunk = b""
+                yield path, chunk
+            if self.error is not None:
+                raise self.error
+        finally:
+            self.close()
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.file.close()
+
+
+class Prefetcher:
+    """\
+    Run streams of (path, chunk) items ahead of time, so that remote data is
+    downloaded while earlier items are being consumed.
+
+    map(items, stream, predicate, chunk_size) yields (item, stream(item))
+    pairs in the order of items. For items that satisfy predicate, the
+    stream is run in advance on a pool of (at most) max_workers threads,
+    with its output spooled and replayed (in chunks of at most chunk_size
+    bytes) as it arrives; the others are run lazily by the consumer. At most
+    max_workers + 1 spools exist at any time, each of which holds up to
+    max_memory / (max_workers + 1) bytes in memory, the rest going to a
+    temporary file. Errors are raised where the stream would raise them.
+    Each stream must be consumed (or abandoned) before advancing to the next
+    item.
+    """
+
+    def __init__(self, max_workers, max_memory=DEFAULT_PREFETCH_MEMORY):
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
+        self.max_workers = max_workers
+        self.spool_size = max_memory // (max_workers + 1)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+    def map(self, items, stream, predicate, chunk_size=8192):
+        items = list(items)
+        ahead = [i for i, item in enumerate(items) if predicate(item)]
+        ahead.reverse()
+        spools = {}
+
+        def submit():
+            while ahead and len(spools) < self.max_workers:
+                i = ahead.pop()
+                spools[i] = _Spool(self.spool_size)
+                self.executor.submit(spools[i].fill, stream(items[i]))
+
+        current = None
+        try:
+            for i, item in enumerate(items):
+                if current is not None:
+                    # stop the download if the previous stream was not consumed
+                    current.close()
+                submit()
+                current = spools.pop(i, None)
+                if current is None:
+                    yield item, stream(item)
+                else:
+                    submit()
+                    yield item, current.replay(chunk_size)
+        finally:
+            for spool in [current, *spools.values()]:
+                if spool is not None:
+                    spool.close()
+
+
+class IncompleteDownload(requests.RequestException):
+    pass
+
+
+class ContentChanged(requests.RequestException):
+    pass
+
+
+def _is_permanent(error):
+    if isinstance(error, requests.HTTPError):
+        return error.response.status_code not in RETRY_STATUSES
+    # unknown host names
+    while error is not None:
+        if isinstance(error, socket.gaierror):
+            return True
+        error = error.__cause__ or error.__context__ or getattr(error, "reason", None)
+    return False
+
+
+class Downloader:
+    """\
+    Download the content of HTTP(S) URLs, recovering from errors.
+
+    Requests that fail with a connection error, a timeout (of timeout
+    seconds for connecting or between received bytes) or a status in
+    RETRY_STATUSES are retried up to retries times, waiting backoff,
+    2 * backoff, 4 * backoff, ... seconds (at most max_backoff) in between.
+    If the connection is lost during a download, it's resumed from the last
+    received byte, with a range request if the server supports it (checking
+    that the content has not changed via its ETag or Last-Modified date),
+    or by downloading the content again and skipping the bytes already
+    received otherwise.
+
+    If parallel is greater than 1, files of at least parallel_min_size
+    bytes (2 * part_size by default) on servers that support range requests
+    are downloaded in parts of part_size bytes, parallel parts at a time.
+    Parts are emitted in order: those downloaded ahead are buffered as in
+    Prefetcher, with up to parallel_memory bytes in memory.
+    """
+
+    def __init__(self, retries=5, backoff=0.5, max_backoff=60, timeout=60, parallel=1,
+                 part_size=64 * 1024 * 1024, parallel_min_size=None, parallel_memory=DEFAULT_PREFETCH_MEMORY):
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.parallel = parallel
+        self.part_size = part_size
+        self.parallel_min_size = 2 * part_size if parallel_min_size is None else parallel_min_size
+        self.parallel_memory = parallel_memory
+
+    def _retry(self, attempt, error):
+        """\
+        Wait before retrying after error, or raise it if attempt (the number
+        of the failed attempt) is the last one or the error is permanent.
+        """
+        if attempt > self.retries or _is_permanent(error):
+            raise error
+        time.sleep(min(self.backoff * 2 ** (attempt - 1), self.max_backoff))
+
+    def get(self, session, url, headers=None):
+        """\
+        Send a GET request for url, retrying after errors. The response is
+        not read: it must be closed by the caller. Responses with a
+        permanent error status (e.g., 404) are returned as they are.
+        """
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                response = session.get(url, stream=True, headers=headers, timeout=self.timeout)
+                if response.status_code in RETRY_STATUSES:
+                    response.close()
+                    response.raise_for_status()
+                return response
+            except (requests.ConnectionError, requests.Timeout, requests.HTTPError) as e:
+                self._retry(attempt, e)
+
+    def iter(self, session, url, chunk_size=8192):
+        """\
+        Yield the content of url in chunks of (at most) chunk_size bytes.
+        """
+        yield from self.iter_response(session, url, self.get(session, url), chunk_size)
+
+    def iter_response(self, session, url, response, chunk_size=8192):
+        """\
+        Yield the content of url in chunks of (at most) chunk_size bytes,
+        starting from response, the (unread) response to a GET request.
+        """
+        try:
+            response.raise_for_status()
+            headers = response.headers
+            validator = headers.get("ETag")
+            if not validator or validator.startswith("W/"):
+                validator = headers.get("Last-Modified")
+            size = headers.get("Content-Length")
+            size = int(size) if size and size.isdigit() else None
+            # with a content encoding, positions in the data received and
+            # in the content do not match
+            encoded = headers.get("Content-Encoding", "identity") != "identity"
+            if (self.parallel > 1 and size is not None and size >= self.parallel_min_size and not encoded
+                    and headers.get("Accept-Ranges") == "bytes"):
+                response.close()
+                response = None
+                yield from self.__iter_parallel(session, url, size, validator, chunk_size)
+                return
+        except BaseException:
+            if response is not None:
+                response.close()
+            raise
+        yield from self._iter_range(
+            session, url, chunk_size, end=size, validator=validator, response=response, resumable=not encoded
+        )
+
+    def __iter_parallel(self, session, url, size, validator, chunk_size):
+        parts = [(start, min(start + self.part_size, size)) for start in range(0, size, self.part_size)]
+
+        def stream(part):
+            start, end = part
+            for chunk in self._iter_range(session, url, chunk_size, start=start, end=end, validator=validator):
+                yield url, chunk
+
+        with Prefetcher(self.parallel, max_memory=self.parallel_memory) as prefetcher:
+            for _, part_stream in prefetcher.map(parts, stream, lambda part: True, chunk_size=chunk_size):
+                for _, chunk in part_stream:
+                    yield chunk
+
+    def _iter_range(self, session, url, chunk_size=8192, start=0, end=None, validator=None, response=None,
+                    resumable=True):
+        """\
+        Yield the content of url from byte start to byte end (excluded;
+        None for the end of the content), resuming after errors. response,
+        if given, is the response to a request for the whole content.
+        """
+        pos = start
+        attempt = 0
+        try:
+            while True:
+                try:
+                    skip = 0
+                    if response is None:
+                        headers = {}
+                        if pos > 0 or end is not None:
+                            headers["Range"] = f"bytes={pos}-{'' if end is None else end - 1}"
+                            if validator:
+                                headers["If-Range"] = validator
+                        response = self.get(session, url, headers=headers)
+                        response.raise_for_status()
+                        if response.status_code == 206:
+                            m = _CONTENT_RANGE.fullmatch(response.headers.get("Content-Range", ""))
+                            if not m or int(m[1]) != pos:
+                                raise IncompleteDownload(f"{url}: unexpected Content-Range in response")
+                        elif headers:
+                            # the server sent the whole content: skip the
+                            # bytes already received, if it has not changed
+                            if validator and validator not in (
+                                    response.headers.get("ETag"), response.headers.get("Last-Modified")
+                            ):
+                                raise ContentChanged(f"{url}: content changed during download")
+                            skip = pos
+                    for chunk in response.iter_content(chunk_size):
+                        if skip:
+                            n = min(skip, len(chunk))
+                            chunk, skip = chunk[n:], skip - n
+                        if end is not None:
+                            chunk = chunk[:end - pos]
+                        if not chunk:
+                            continue
+                        pos += len(chunk)
+                        attempt = 0
+                        yield chunk
+                        if end is not None and pos >= end:
+                            break
+                    if end is not None and pos < end:
+                        raise IncompleteDownload(f"{url}: got {pos} bytes out of {end}")
+                    return
+                except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError,
+                        IncompleteDownload) as e:
+                    # errors in sending the request have already been retried
+                    if not resumable or response is None:
+                        raise
+                    response.close()
+                    response = None
+                    attempt += 1
+                    self._retry(attempt, e)
+        finally:
+            if response is not None:
+                response.close()
+
+
+DEFAULT_DOWNLOADER = Downloader()
@@ -0,0 +1,254 @@
+# Copyright 2019-2026 The University of Manchester, UK
+# Copyright 2020-2026 Vlaams Instituut voor Biotechnologie (VIB), BE
+# Copyright 2020-2026 Barcelona Supercomputing Center (BSC), ES
+# Copyright 2020-2026 Center for Advanced Studies, Research and Development in Sardinia (CRS4), IT
+# Copyright 2022-2026 École Polytechnique Fédérale de Lausanne, CH
+# Copyright 2024-2026 Data Centre, SciLifeLab, SE
+# Copyright 2024-2026 National Institute of Informatics (NII), JP
+# Copyright 2025-2026 Senckenberg Society for Nature Research (SGN), DE
+# Copyright 2025-2026 European Molecular Biology Laboratory (EMBL), Heidelberg, DE
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from .remote import _url_errors, DEFAULT_DOWNLOADER
+
+
+DEFAULT_MAX_SIZE = 10 * 1024 ** 3
+DEFAULT_MAX_AGE = 3600
+
+
+class RemoteCache:
+    """\
+    On-disk cache for the content of remote (HTTP(S)) files.
+
+    Content is stored by SHA-256 checksum under blobs/, so URLs with the
+    same content share the stored data. For each URL, a small JSON record
+    (under urls/) holds the checksum, size, content type, ETag and
+    Last-Modified headers and the time of the last fetch. Entries fetched
+    less than max_age seconds ago (None for no limit) are served without
+    any network access; older ones are revalidated with a conditional GET
+    (If-None-Match / If-Modified-Since), and downloaded again only if they
+    have changed.
+
+    When the total size of the stored content exceeds max_size bytes, the
+    least recently used content is evicted. The number of hits (fresh and
+    revalidated), misses, bytes served from the cache and downloaded and
+    evictions are recorded in stats.
+    """
+
+    def __init__(self, path, max_size=DEFAULT_MAX_SIZE, max_age=DEFAULT_MAX_AGE):
+        self.path = Path(path)
+        self.max_size = max_size
+        self.max_age = max_age
+        self.blobs_dir = self.path / "blobs"
+        self.urls_dir = self.path / "urls"
+        self.tmp_dir = self.path / "tmp"
+        for d in self.blobs_dir, self.urls_dir, self.tmp_dir:
+            d.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.Lock()
+        self.size = sum(_.stat().st_size for _ in self.blobs_dir.glob("*/*"))
+        self.stats = dict.fromkeys(
+            ("hits", "revalidated", "misses", "hit_bytes", "fetched_bytes", "evicted_bytes"), 0
+        )
+
+    def __record_path(self, url):
+        h = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return self.urls_dir / h[:2] / f"{h}.json"
+
+    def __blob_path(self, checksum):
+        return self.blobs_dir / checksum[:2] / checksum
+
+    def __count(self, **kwargs):
+        with self.lock:
+            for k, v in kwargs.items():
+                self.stats[k] += v
+
+    def get(self, url):
+        """\
+        Return the record for url if its content is in the cache, else None.
+        Does not access the network and does not check freshness.
+        """
+        try:
+            with open(self.__record_path(url)) as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if record.get("url") != url or not self.__blob_path(record.get("sha256", "")).is_file():
+            return None
+        return record
+
+    def is_fresh(self, record):
+        return self.max_age is None or time.time() - record["fetched"] < self.max_age
+
+    def get_fresh(self, url):
+        """\
+        Return the record for url if its content is in the cache and does not
+        need revalidation, else None.
+        """
+        record = self.get(url)
+        if record is not None and self.is_fresh(record):
+            return record
+        return None
+
+    def date_published(self, record):
+        """\
+        The Last-Modified date of the record's content, or the date it was
+        fetched if the server did not send one.
+        """
+        if record.get("last_modified"):
+            return record["last_modified"]
+        return datetime.fromtimestamp(record["fetched"], timezone.utc).replace(microsecond=0).isoformat()
+
+    def headers(self, record):
+        """\
+        HTTP headers corresponding to the record, as returned by a HEAD
+        request.
+        """
+        return {
+            "Content-Length": str(record["size"]),
+            "Content-Type": record["content_type"],
+            "Last-Modified": self.date_published(record),
+        }
+
+    def __write_record(self, record):
+        path = self.__record_path(record["url"])
+        path.parent.mkdir(exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.tmp_dir)
+        with os.fdopen(fd, "w") as f:
+            json.dump(record, f)
+        os.replace(tmp, path)
+
+    def __read_blob(self, record, chunk_size):
+        path = self.__blob_path(record["sha256"])
+        # the modification time is used for LRU eviction
+        os.utime(path)
+        with open(path, "rb") as f:
+            while chunk := f.read(chunk_size):
+                yield chunk
+
+    def fetch(self, session, url, chunk_size=8192, downloader=None):
+        """\
+        Yield the content of url in chunks of (at most) chunk_size bytes,
+        from the cache if possible. Downloads are done with downloader (a
+        rocrate.remote.Downloader).
+        """
+        if downloader is None:
+            downloader = DEFAULT_DOWNLOADER
+        record = self.get(url)
+        if record is not None and self.is_fresh(record):
+            self.__count(hits=1, hit_bytes=record["size"])
+            yield from self.__read_blob(record, chunk_size)
+            return
+        headers = {}
+        if record is not None:
+            if record.get("etag"):
+                headers["If-None-Match"] = record["etag"]
+            if record.get("last_modified"):
+                headers["If-Modified-Since"] = record["last_modified"]
+        with _url_errors(url):
+            response = downloader.get(session, url, headers=headers)
+            if response.status_code == 304 and record is not None:
+                response.close()
+                record["fetched"] = time.time()
+                self.__write_record(record)
+                self.__count(revalidated=1, hit_bytes=record["size"])
+                yield from self.__read_blob(record, chunk_size)
+                return
+            record = {
+                "url": url,
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "content_type": response.headers.get("Content-Type"),
+                "fetched": time.time(),
+            }
+            yield from self.__download(record, downloader.iter_response(session, url, response, chunk_size))
+
+    def __download(self, record, chunks):
+        h = hashlib.sha256()
+        size = 0
+        fd, tmp = tempfile.mkstemp(dir=self.tmp_dir)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    h.update(chunk)
+                    size += len(chunk)
+                    yield chunk
+            self.__count(misses=1, fetched_bytes=size)
+            if size > self.max_size:
+                return
+            record.update(sha256=h.hexdigest(), size=size)
+            self.__store(tmp, record)
+        finally:
+            chunks.close()
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+
+    def __store(self, tmp, record):
+        blob = self.__blob_path(record["sha256"])
+        blob.parent.mkdir(exist_ok=True)
+        with self.lock:
+            if not blob.is_file():
+                os.replace(tmp, blob)
+                self.size += record["size"]
+            else:
+                os.utime(blob)
+        self.__write_record(record)
+        if self.size > self.max_size:
+            self.evict(self.max_size, keep=blob)
+
+    def evict(self, max_size=0, keep=None):
+        """\
+        Delete the least recently used content until the total size is at
+        most max_size bytes. Records whose content is gone are ignored.
+        """
+        with self.lock:
+            blobs = []
+            for path in self.blobs_dir.glob("*/*"):
+                try:
+                    st = path.stat()
+                except FileNotFoundError:
+                    continue
+                blobs.append((st.st_mtime_ns, st.st_size, path))
+            self.size = sum(_[1] for _ in blobs)
+            blobs.sort()
+            for _, size, path in blobs:
+                if self.size <= max_size:
+                    break
+                if path == keep:
+                    continue
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    continue
+                self.size -= size
+                self.stats["evicted_bytes"] += size
+
+    def report(self):
+        """\
+        Return a summary of the statistics.
+        """
+        s = self.stats
+        return (
+            f"hits: {s['hits']} fresh, {s['revalidated']} revalidated ({s['hit_bytes']} bytes); "
+            f"misses: {s['misses']} ({s['fetched_bytes']} bytes); evicted: {s['evicted_bytes']} bytes"
+        )
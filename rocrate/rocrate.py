@@ -20,22 +20,34 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import asyncio
 import errno
+import io
+import hashlib
+import itertools
+import json
 from typing import cast
+import threading
+import time
 import uuid
+import weakref
 import zipfile
 import atexit
 import os
 import re
+import requests
 import shutil
 import tempfile
 import warnings
 
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from pathlib import Path
 from urllib.parse import urljoin, unquote
 
 from .memory_buffer import MemoryBuffer
+from .zip_writer import ZipWriter, ParallelZipWriter, ZipPlan
 from .model import (
     ComputationalWorkflow,
     ComputerLanguage,
@@ -55,18 +67,29 @@ from .model import (
     TestSuite,
     WorkflowDescription,
 )
-from .model.metadata import WORKFLOW_PROFILE, TESTING_EXTRA_TERMS, DEFAULT_VERSION, BASENAME, LEGACY_BASENAME
+from .model.metadata import (
+    WORKFLOW_PROFILE, TESTING_EXTRA_TERMS, DEFAULT_VERSION, BASENAME, LEGACY_BASENAME, METADATA_FORMATS
+)
 from .model.computationalworkflow import galaxy_to_abstract_cwl
 from .model.computerlanguage import get_lang
 from .model.testservice import get_service
 from .model.softwareapplication import get_app
 
-from .utils import is_url, subclasses, get_norm_value, walk, as_list, Mode
+from .utils import (
+    is_url, subclasses, get_norm_value, walk, scan_tree, as_list, copy_file, iterate_in_thread, Mode, LINK_MODES
+)
 from .metadata import read_metadata, find_root_entity_id
+from .json_backend import get_backend
+from .remote import new_session, is_http, url_headers, iter_url_range, Downloader, Prefetcher, DEFAULT_PREFETCH_MEMORY
+from .remote_cache import RemoteCache
 
 
 DATA_ENTITY_TYPES = {"File", "Dataset"}
 PRE_1_2 = re.compile(r"1\.[01].*")
+RESOLVE_ID_CACHE_SIZE = 2 ** 20
+# timestamp of zip members without a modification time (see zip_plan)
+_ZIP_EPOCH = (1980, 1, 1, 0, 0, 0)
+WRITE_MANIFEST_BASENAME = ".ro-crate-write-manifest.json"
 
 
 def is_data_entity(entity):
@@ -116,6 +139,264 @@ def get_version(metadata_properties):
     return None
 
 
+class WriteError(RuntimeError):
+    """\
+    Raised by ROCrate.write, in parallel mode, when one or more files could
+    not be written. The errors attribute holds a list of (key, exception)
+    tuples, where key is the id of the entity or the destination path of the
+    file that could not be written.
+    """
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__("\n".join(
+            [f"failed to write {len(errors)} item(s):"] + [f"  {k}: {e!r}" for k, e in errors]
+        ))
+
+
+class _WritePool:
+    """\
+    Thread pool used by ROCrate.write to run file copies and entity writes
+    concurrently. Each task has a key (entity id or destination path), and
+    tasks whose key has already been scheduled are skipped. Errors are
+    collected rather than raised.
+    """
+
+    def __init__(self, max_workers):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.scheduled = set()
+        self.pending = []
+        self.errors = []
+
+    def schedule(self, key, fn, *args):
+        if key in self.scheduled:
+            return
+        self.scheduled.add(key)
+        self.pending.append((key, self.executor.submit(fn, *args)))
+
+    def wait(self):
+        """\
+        Wait for all scheduled tasks to complete, recording their errors.
+        """
+        pending, self.pending = self.pending, []
+        for key, future in pending:
+            exc = future.exception()
+            if exc is not None:
+                self.errors.append((key, exc))
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+
+def _sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(1 << 20):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class _WriteManifest:
+    """\
+    Record of the files written to base_path by incremental writes. For each
+    destination path (relative to base_path), the manifest stores the source
+    path, size and mtime_ns at the time of the last copy, the mtime_ns of the
+    destination and, optionally, the SHA-256 checksum of the content. Files
+    for which all of these still match are not copied again; if checksum is
+    True, files whose mtime has changed but whose content has not are also
+    skipped.
+    """
+
+    def __init__(self, base_path, checksum=False):
+        self.base_path = base_path
+        self.path = base_path / WRITE_MANIFEST_BASENAME
+        self.checksum = checksum
+        try:
+            with open(self.path) as f:
+                self.entries = json.load(f)["files"]
+        except (OSError, ValueError, KeyError, TypeError):
+            self.entries = {}
+        self.new_entries = {}
+        self.lock = threading.Lock()
+        self.stats = dict.fromkeys(("copied_files", "copied_bytes", "skipped_files", "skipped_bytes"), 0)
+
+    def __key(self, dest):
+        return Path(os.path.relpath(dest, self.base_path)).as_posix()
+
+    def __record(self, key, entry, skipped):
+        prefix = "skipped" if skipped else "copied"
+        with self.lock:
+            self.new_entries[key] = entry
+            self.stats[f"{prefix}_files"] += 1
+            self.stats[f"{prefix}_bytes"] += entry["size"]
+
+    def __up_to_date(self, entry, dest, source, source_stat):
+        try:
+            dest_stat = os.stat(dest)
+        except FileNotFoundError:
+            return False
+        if (entry.get("source") != source or entry.get("size") != source_stat.st_size
+                or dest_stat.st_size != source_stat.st_size
+                or dest_stat.st_mtime_ns != entry.get("dest_mtime_ns")):
+            return False
+        if entry.get("mtime_ns") == source_stat.st_mtime_ns:
+            return True
+        return self.checksum and entry.get("sha256") == _sha256(source)
+
+    def copy(self, source, dest, copy):
+        """\
+        Copy source to dest with copy(source, dest), unless dest is up to date.
+        """
+        key, source = self.__key(dest), os.path.abspath(source)
+        source_stat = os.stat(source)
+        entry = self.entries.get(key)
+        if entry and self.__up_to_date(entry, dest, source, source_stat):
+            self.__record(key, dict(entry, mtime_ns=source_stat.st_mtime_ns), True)
+            return
+        copy(source, dest)
+        entry = {
+            "source": source,
+            "size": source_stat.st_size,
+            "mtime_ns": source_stat.st_mtime_ns,
+            "dest_mtime_ns": os.stat(dest).st_mtime_ns,
+        }
+        if self.checksum:
+            entry["sha256"] = _sha256(dest)
+        self.__record(key, entry, False)
+
+    def write_entity(self, entity, dest, context):
+        """\
+        Write entity (a file generated by the library, such as the metadata
+        file) to dest, unless its content is the same as in the last write.
+        """
+        key = self.__key(dest)
+        h, size = hashlib.sha256(), 0
+        if isinstance(entity, Metadata):
+            chunks = entity.stream(metadata_format=context.metadata_format)
+        else:
+            chunks = entity.stream()
+        for _, chunk in chunks:
+            h.update(chunk)
+            size += len(chunk)
+        entry = self.entries.get(key)
+        try:
+            dest_stat = os.stat(dest)
+        except FileNotFoundError:
+            dest_stat = None
+        if (entry and dest_stat and entry.get("sha256") == h.hexdigest()
+                and entry.get("dest_mtime_ns") == dest_stat.st_mtime_ns and dest_stat.st_size == size):
+            self.__record(key, entry, True)
+            return
+        entity.write(self.base_path, context)
+        entry = {"size": size, "dest_mtime_ns": os.stat(dest).st_mtime_ns, "sha256": h.hexdigest()}
+        self.__record(key, entry, False)
+
+    def save(self):
+        tmp_path = self.path.with_name(f"{self.path.name}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({"files": self.new_entries}, f)
+        os.replace(tmp_path, self.path)
+
+
+class _WriteContext:
+    """\
+    Options and state of a single ROCrate.write call, which are passed to the
+    entities being written rather than stored in the crate, so that
+    concurrent writes of the same crate do not interfere with each other.
+    manifest is the _WriteManifest of an incremental write, pool the
+    _WritePool of a parallel one (None otherwise).
+    """
+
+    def __init__(self, link_mode="copy", metadata_format="pretty", manifest=None, pool=None):
+        self.link_mode = link_mode
+        self.metadata_format = metadata_format
+        self.manifest = manifest
+        self.pool = pool
+
+
+class _EntityIndex:
+    """\
+    Ordered sets of entity keys (canonical ids), grouped by category and by
+    type, that allow to look up entities without scanning the whole crate.
+    Dictionaries with None values are used as ordered sets, whose keys are
+    kept in the same order as the crate's entities.
+    """
+
+    CATEGORIES = ("default", "data", "contextual", "subcrate")
+
+    def __init__(self):
+        self.by_category = {_: {} for _ in self.CATEGORIES}
+        self.by_type = {}
+        # key -> (position, categories, types)
+        self.entries = {}
+        self.__positions = itertools.count()
+        # sets that got a key out of order, sorted on the next lookup
+        self.__unordered = set()
+
+    def add(self, key, categories, types):
+        """\
+        Index key under the given categories and types, replacing any
+        previous indexing. Keys that are already indexed keep their position.
+        """
+        types = frozenset(_ for _ in as_list(types) if isinstance(_, str))
+        try:
+            position, old_categories, old_types = self.entries[key]
+        except KeyError:
+            position, old_categories, old_types = next(self.__positions), (), frozenset()
+        self.entries[key] = (position, categories, types)
+        for c in old_categories:
+            if c not in categories:
+                del self.by_category[c][key]
+        for c in categories:
+            if key not in self.by_category[c]:
+                self.__insert(("category", c), self.by_category[c], key, position)
+        for t in old_types - types:
+            self._discard_type(t, key)
+        for t in types - old_types:
+            self.__insert(("type", t), self.by_type.setdefault(t, {}), key, position)
+
+    def __insert(self, name, keys, key, position):
+        if keys and self.entries[next(reversed(keys))][0] > position:
+            self.__unordered.add(name)
+        keys[key] = None
+
+    def __ordered(self, name, keys):
+        if name in self.__unordered:
+            items = sorted(keys, key=lambda _: self.entries[_][0])
+            keys.clear()
+            keys.update(dict.fromkeys(items))
+            self.__unordered.discard(name)
+        return keys
+
+    def category(self, category):
+        """\
+        Return the keys in the given category, in the crate's order.
+        """
+        return self.__ordered(("category", category), self.by_category[category])
+
+    def type(self, type_):
+        """\
+        Return the keys of the entities of the given type, in the crate's
+        order.
+        """
+        keys = self.by_type.get(type_)
+        return {} if keys is None else self.__ordered(("type", type_), keys)
+
+    def remove(self, key):
+        _, categories, types = self.entries.pop(key, (None, (), frozenset()))
+        for c in categories:
+            del self.by_category[c][key]
+        for t in types:
+            self._discard_type(t, key)
+
+    def _discard_type(self, type_, key):
+        keys = self.by_type[type_]
+        del keys[key]
+        if not keys:
+            del self.by_type[type_]
+            self.__unordered.discard(("type", type_))
+
+
 class ROCrate():
 
     def __init__(self,
@@ -123,12 +404,41 @@ class ROCrate():
                  gen_preview=False,
                  init=False, exclude=None,
                  version=DEFAULT_VERSION,
-                 load_subcrates=False):
+                 load_subcrates=False,
+                 extract_zip=True,
+                 lazy=False,
+                 incremental_read=False,
+                 json_backend=None,
+                 http_session=None,
+                 remote_cache=None,
+                 downloader=None):
         self.mode = None
         self.source = source
         self.exclude = exclude
         self.load_subcrates = load_subcrates
+        self.extract_zip = extract_zip
+        # if True, entities read from the metadata are built on first access
+        self.lazy = lazy
+        # if True, the metadata file is parsed one @graph entry at a time
+        self.incremental_read = incremental_read
+        self.json_backend = get_backend(json_backend)
+        # shared by all remote fetches, so that connections are reused
+        self.http_session = http_session if http_session is not None else new_session()
+        # RemoteCache for the content of remote files, or None
+        if remote_cache is not None and not isinstance(remote_cache, RemoteCache):
+            remote_cache = RemoteCache(remote_cache)
+        self.remote_cache = remote_cache
+        # Downloader for the content of remote files (retries, resumption)
+        self.downloader = downloader if downloader is not None else Downloader()
         self.__entity_map = {}
+        self.__lazy_keys = set()
+        self.__index = _EntityIndex()
+        # closes the zip archive read with extract_zip=False
+        self.__close_zip = None
+        # target key -> {(referrer key, property): None}
+        self.__referrers = {}
+        # bounded cache of canonical ids, see resolve_id
+        self.__resolved_ids = OrderedDict()
         # TODO: add this as @base in the context? At least when loading
         # from zip
         self.uuid = uuid.uuid4()
@@ -147,7 +457,8 @@ class ROCrate():
         else:
             self.mode = Mode.READ
             source = self.__read(source, gen_preview=gen_preview)
-        # in the zip case, self.source is the extracted dir
+        # in the zip case, self.source is the extracted dir, or a
+        # zipfile.Path pointing to the archive's root if extract_zip is False
         self.source = source
 
     def __init_from_tree(self, top_dir, gen_preview=False, version=DEFAULT_VERSION):
@@ -173,25 +484,49 @@ class ROCrate():
         if isinstance(source, dict):
             metadata_path = source
         else:
-            source = Path(source)
-            if not source.exists():
-                raise FileNotFoundError(errno.ENOENT, f"'{source}' not found")
-            if zipfile.is_zipfile(source):
-                zip_path = tempfile.mkdtemp(prefix="rocrate_")
-                atexit.register(shutil.rmtree, zip_path)
-                with zipfile.ZipFile(source, "r") as zf:
-                    zf.extractall(zip_path)
-                source = Path(zip_path)
+            if not isinstance(source, zipfile.Path):
+                source = Path(source)
+                if not source.exists():
+                    raise FileNotFoundError(errno.ENOENT, f"'{source}' not found")
+            if isinstance(source, Path) and zipfile.is_zipfile(source):
+                if self.extract_zip:
+                    zip_path = tempfile.mkdtemp(prefix="rocrate_")
+                    atexit.register(shutil.rmtree, zip_path)
+                    with zipfile.ZipFile(source, "r") as zf:
+                        zf.extractall(zip_path)
+                    source = Path(zip_path)
+                else:
+                    # read members on demand, without extracting the archive
+                    zf = zipfile.ZipFile(source, "r")
+                    self.__close_zip = weakref.finalize(self, zf.close)
+                    source = zipfile.Path(zf)
             metadata_path = source / BASENAME
             if not metadata_path.is_file():
                 metadata_path = source / LEGACY_BASENAME
             if not metadata_path.is_file():
                 raise ValueError(f"Not a valid RO-Crate: missing {BASENAME}")
-        _, entities = read_metadata(metadata_path)
+        _, entities = read_metadata(
+            metadata_path, backend=self.json_backend, incremental=self.incremental_read
+        )
         self.__read_data_entities(entities, source, gen_preview)
         self.__read_contextual_entities(entities)
         return source
 
+    def close(self):
+        """\
+        Close the zip archive the crate was read from with extract_zip=False
+        (otherwise, do nothing). The contents of data entities in the archive
+        cannot be read after this.
+        """
+        if self.__close_zip is not None:
+            self.__close_zip()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
     def __read_data_entities(self, entities, source, gen_preview):
         if isinstance(source, dict):
             source = Path("")
@@ -230,24 +565,32 @@ class ROCrate():
             assert id_ == entity.pop('@id')
             cls = pick_type(entity, type_map, fallback=DataEntity, load_subcrates=self.load_subcrates)
 
+            # the id the entity gets when built (same as in FileOrDir)
+            entity_id = id_
             if cls is Subcrate:
 
                 if is_url(id_):
-                    instance = Subcrate(self, source=id_, properties=entity)
+                    factory = partial(Subcrate, self, source=id_, properties=entity)
                 else:
-                    instance = Subcrate(self, source=source / unquote(id_), properties=entity)
+                    subcrate_source = source / unquote(id_)
+                    factory = partial(Subcrate, self, source=subcrate_source, properties=entity)
+                    entity_id = os.path.basename(str(subcrate_source).rstrip("/"))
 
             elif cls is DataEntity:
-                instance = DataEntity(self, identifier=id_, properties=entity)
+                factory = partial(DataEntity, self, identifier=id_, properties=entity)
 
             else:
                 # cls is either a File or a Dataset (Directory)
                 if is_url(id_):
-                    instance = cls(self, id_, properties=entity)
+                    factory = partial(cls, self, id_, properties=entity)
                 else:
-                    instance = cls(self, source / unquote(id_), id_, properties=entity)
-            self.add(instance)
-            if instance.type == "Dataset":
+                    factory = partial(cls, self, source / unquote(id_), id_, properties=entity)
+                    entity_id = Path(id_).as_posix()
+            if self.lazy:
+                self.__add_lazy(cls.format_id(entity_id), factory, entity, data_entity=True)
+            else:
+                self.add(factory())
+            if entity.get("@type") == "Dataset":
                 # for Subcrate, type is currently Dataset too,
                 # but the hasPart is not populated yet only once accessing a subcrate element (lazy loading)
                 self.__add_parts(as_list(entity.get("hasPart", [])), entities, source)
@@ -262,30 +605,71 @@ class ROCrate():
                 else:
                     warnings.warn(f"'{id_}' looks like a data entity but it's not listed in the root dataset's hasPart")
             assert identifier == entity.pop('@id')
-            cls = pick_type(entity, type_map, fallback=ContextEntity)
-            self.add(cls(self, identifier, entity))
+            if self.lazy:
+                factory = partial(self.__new_contextual_entity, identifier, entity, type_map)
+                self.__add_lazy(identifier, factory, entity)
+            else:
+                self.add(self.__new_contextual_entity(identifier, entity, type_map))
+
+    def __new_contextual_entity(self, identifier, entity, type_map):
+        cls = pick_type(entity, type_map, fallback=ContextEntity)
+        return cls(self, identifier, entity)
+
+    def __add_lazy(self, identifier, factory, properties, data_entity=False):
+        """\
+        Add a placeholder for an entity, to be built by calling factory on
+        first access. The placeholder takes the same position in the crate as
+        the entity itself would, and is indexed according to the given
+        (JSON-LD) properties.
+        """
+        key = self.resolve_id(identifier)
+        if data_entity:
+            if key not in self.__entity_map:
+                self.root_dataset.append_to("hasPart", {"@id": identifier})
+            categories = ("data", "subcrate") if factory.func is Subcrate else ("data",)
+        else:
+            categories = ("contextual",)
+        self.__unindex_refs(key)
+        self.__entity_map[key] = factory
+        self.__lazy_keys.add(key)
+        self.__index.add(key, categories, properties.get("@type"))
+        self.__index_refs(key, properties)
+
+    def __materialize(self, key):
+        e = self.__entity_map[key]
+        if key in self.__lazy_keys:
+            e = self.__entity_map[key] = e()
+            self.__lazy_keys.discard(key)
+        return e
+
+    @staticmethod
+    def __categories(e):
+        if isinstance(e, (RootDataset, Metadata, Preview)):
+            return ("default",)
+        if isinstance(e, Subcrate):
+            return ("data", "subcrate")
+        if hasattr(e, "write"):
+            return ("data",)
+        return ("contextual",)
+
+    def __by_category(self, category):
+        return [self.__materialize(_) for _ in list(self.__index.category(category))]
 
     @property
     def default_entities(self):
-        return [e for e in self.__entity_map.values()
-                if isinstance(e, (RootDataset, Metadata, Preview))]
+        return self.__by_category("default")
 
     @property
     def data_entities(self):
-        return [e for e in self.__entity_map.values()
-                if not isinstance(e, (RootDataset, Metadata, Preview))
-                and hasattr(e, "write")]
+        return self.__by_category("data")
 
     @property
     def contextual_entities(self):
-        return [e for e in self.__entity_map.values()
-                if not isinstance(e, (RootDataset, Metadata, Preview))
-                and not hasattr(e, "write")]
+        return self.__by_category("contextual")
 
     @property
     def subcrate_entities(self):
-        return [e for e in self.__entity_map.values()
-                if isinstance(e, Subcrate)]
+        return self.__by_category("subcrate")
 
     @property
     def name(self):
@@ -403,11 +787,22 @@ class ROCrate():
         return list(set(mentions + about))  # remove any duplicate refs
 
     def resolve_id(self, id_):
-        if not is_url(id_):
-            id_ = urljoin(self.arcp_base_uri, id_)  # also does path normalization
-        return id_.rstrip("/")
+        try:
+            return self.__resolved_ids[id_]
+        except KeyError:
+            pass
+        canonical_id = id_
+        if not is_url(canonical_id):
+            canonical_id = urljoin(self.arcp_base_uri, canonical_id)  # also does path normalization
+        canonical_id = canonical_id.rstrip("/")
+        if len(self.__resolved_ids) >= RESOLVE_ID_CACHE_SIZE:
+            self.__resolved_ids.popitem(last=False)
+        self.__resolved_ids[id_] = canonical_id
+        return canonical_id
 
     def get_entities(self):
+        for key in list(self.__lazy_keys):
+            self.__materialize(key)
         return self.__entity_map.values()
 
     def _get_root_jsonld(self):
@@ -421,7 +816,7 @@ class ROCrate():
         canonical_id = self.resolve_id(entity_id)
 
         if canonical_id in self.__entity_map:
-            return self.__entity_map[canonical_id]
+            return self.__materialize(canonical_id)
 
         for subcrate_entity in self.subcrate_entities:
 
@@ -442,11 +837,100 @@ class ROCrate():
     get = dereference
 
     def get_by_type(self, type_, exact=False):
+        """\
+        Get all entities that have all of the given types. If exact is True,
+        only return entities that have no other type.
+
+        Entities are returned in the same order as in get_entities(). They
+        are looked up in a type index, which is updated when entities are
+        added or deleted and when their type is set via the Entity.type
+        property. In-place changes to an entity's type list (e.g.,
+        entity.type.append("Foo")) are not tracked: set the type again
+        afterwards (entity.type = entity.type) to update the index.
+        """
         type_ = set(as_list(type_))
+        if type_:
+            candidates = min((self.__index.type(_) for _ in type_), key=len)
+        else:
+            candidates = self.__entity_map
+        entities = (self.__materialize(_) for _ in list(candidates))
         if exact:
-            return [_ for _ in self.get_entities() if type_ == set(as_list(_.type))]
+            return [_ for _ in entities if type_ == set(as_list(_.type))]
         else:
-            return [_ for _ in self.get_entities() if type_ <= set(as_list(_.type))]
+            return [_ for _ in entities if type_ <= set(as_list(_.type))]
+
+    def _update_type_index(self, entity):
+        """\
+        Update the type index after a change to the type of entity.
+        """
+        key = entity.canonical_id()
+        if self.__entity_map.get(key) is entity:
+            self.__index.add(key, self.__categories(entity), entity.type)
+
+    def __ref_targets(self, value):
+        if isinstance(value, dict):
+            value = [value]
+        elif not isinstance(value, list):
+            return ()
+        return {
+            self.resolve_id(_["@id"]) for _ in value
+            if isinstance(_, dict) and isinstance(_.get("@id"), str)
+        }
+
+    def __add_refs(self, key, prop, value):
+        for t in self.__ref_targets(value):
+            referrers = self.__referrers.get(t)
+            if referrers is None:
+                referrers = self.__referrers[t] = {}
+            referrers[(key, prop)] = None
+
+    def __discard_refs(self, key, prop, targets):
+        for t in targets:
+            referrers = self.__referrers.get(t)
+            if referrers is not None:
+                referrers.pop((key, prop), None)
+                if not referrers:
+                    del self.__referrers[t]
+
+    def __index_refs(self, key, jsonld):
+        for prop, value in jsonld.items():
+            if isinstance(value, (dict, list)) and not prop.startswith("@"):
+                self.__add_refs(key, prop, value)
+
+    def __unindex_refs(self, key):
+        """\
+        Remove the references from the entity currently stored under key, if
+        any, from the index.
+        """
+        if key not in self.__entity_map:
+            return
+        for prop, value in self.__materialize(key).properties().items():
+            if isinstance(value, (dict, list)) and not prop.startswith("@"):
+                self.__discard_refs(key, prop, self.__ref_targets(value))
+
+    def _update_refs(self, entity, prop, old_value=None, new_value=None):
+        """\
+        Update the reference index after a change to property prop of entity
+        from old_value to new_value. Either can be None: when appending to a
+        property, new_value should contain only the appended values.
+        """
+        key = entity.canonical_id()
+        if self.__entity_map.get(key) is not entity:
+            return
+        if old_value is not None:
+            self.__discard_refs(key, prop, self.__ref_targets(old_value))
+        if new_value is not None:
+            self.__add_refs(key, prop, new_value)
+
+    def referrers(self, entity):
+        """\
+        Get the entities that reference the given entity (or id).
+
+        Return a list of (referrer, property) tuples, one for each property
+        that contains at least one reference to the entity.
+        """
+        key = entity.canonical_id() if isinstance(entity, Entity) else self.resolve_id(entity)
+        return [(self.__materialize(k), p) for k, p in list(self.__referrers.get(key, ()))]
 
     def add_file(
             self,
@@ -455,7 +939,8 @@ class ROCrate():
             fetch_remote=False,
             validate_url=False,
             properties=None,
-            record_size=False
+            record_size=False,
+            record_checksums=()
     ):
         return self.add(File(
             self,
@@ -464,7 +949,8 @@ class ROCrate():
             fetch_remote=fetch_remote,
             validate_url=validate_url,
             properties=properties,
-            record_size=record_size
+            record_size=record_size,
+            record_checksums=record_checksums
         ))
 
     def add_dataset(
@@ -542,16 +1028,24 @@ class ROCrate():
             elif hasattr(e, "write"):
                 if key not in self.__entity_map:
                     self.root_dataset.append_to("hasPart", e)
+            self.__unindex_refs(key)
             self.__entity_map[key] = e
+            self.__lazy_keys.discard(key)
+            self.__index.add(key, self.__categories(e), e.type)
+            self.__index_refs(key, e.properties())
         return entities[0] if len(entities) == 1 else entities
 
-    def delete(self, *entities):
+    def delete(self, *entities, cascade=False):
         """\
         Delete one or more entities from this RO-Crate.
 
-        Note that the crate could be left in an inconsistent state as a result
-        of calling this method, since neither entities pointing to the deleted
-        ones nor entities pointed to by the deleted ones are modified.
+        Note that, unless cascade is True, the crate could be left in an
+        inconsistent state as a result of calling this method, since entities
+        pointing to the deleted ones are not modified (except for the root
+        dataset's hasPart). If cascade is True, all references to the deleted
+        entities are removed from their referrers (properties left with no
+        values are deleted). In both cases, entities pointed to by the deleted
+        ones are not modified.
         """
         for e in entities:
             if not isinstance(e, Entity):
@@ -562,92 +1056,556 @@ class ROCrate():
                 raise ValueError("cannot delete the root data entity")
             if e is self.metadata:
                 raise ValueError("cannot delete the metadata entity")
+            key = e.canonical_id()
             if e is self.preview:
                 self.preview = None
             elif hasattr(e, "write"):
-                self.root_dataset["hasPart"] = [_ for _ in self.root_dataset.get("hasPart", []) if _ != e]
-                if not self.root_dataset["hasPart"]:
-                    del self.root_dataset._jsonld["hasPart"]
-            self.__entity_map.pop(e.canonical_id(), None)
+                self.root_dataset._remove_part(key)
+                self.__discard_refs(self.root_dataset.canonical_id(), "hasPart", [key])
+            if cascade:
+                for ref_key, prop in list(self.__referrers.get(key, ())):
+                    if ref_key != key:
+                        self.__remove_refs(self.__materialize(ref_key), prop, key)
+            self.__unindex_refs(key)
+            self.__entity_map.pop(key, None)
+            self.__lazy_keys.discard(key)
+            self.__index.remove(key)
+
+    def __remove_refs(self, entity, prop, target):
+        """\
+        Remove all references to target from property prop of entity.
+        """
+        if entity is self.root_dataset and prop == "hasPart":
+            entity._remove_part(target)
+            self.__discard_refs(entity.canonical_id(), prop, [target])
+            return
+        value = entity._jsonld.get(prop)
+        kept = [_ for _ in as_list(value) if target not in self.__ref_targets(_)]
+        if not kept:
+            del entity._jsonld[prop]
+        elif isinstance(value, list):
+            entity._jsonld[prop] = kept
+        self.__discard_refs(entity.canonical_id(), prop, [target])
+
+    def _walk_zip(self, top):
+        """\
+        Iterate through the files in a zip-backed directory.
 
-    def _copy_unlisted(self, top, base_path):
-        for root, dirs, files in walk(top, exclude=self.exclude):
-            root = Path(root)
-            for name in dirs:
-                source = root / name
-                dest = base_path / source.relative_to(top)
+        Yield (rel_path, zip_path) tuples, where zip_path is a zipfile.Path
+        pointing to the archive member and rel_path is its path relative to
+        top, skipping any files or directories listed in self.exclude.
+        """
+        exclude = frozenset(self.exclude or [])
+        prefix = top.at
+        for name in top.root.namelist():
+            if name.endswith("/") or not name.startswith(prefix):
+                continue
+            rel = name[len(prefix):]
+            if exclude and exclude.intersection(rel.split("/")):
+                continue
+            yield rel, zipfile.Path(top.root, name)
+
+    def _is_listed(self, rel_path):
+        """\
+        Same as rel_path in self, for a path relative to the crate's root.
+
+        For plain relative paths, which make up the bulk of a crate's files,
+        the canonical id is simply the path appended to the base URI: this
+        avoids the cost of urljoin, as well as filling the id cache with the
+        paths of all unlisted files.
+        """
+        if ":" in rel_path or not rel_path.isprintable() or rel_path != rel_path.strip():
+            return rel_path in self
+        return self.arcp_base_uri + rel_path in self.__entity_map
+
+    def _copy_unlisted(self, top, base_path, context=None):
+        if context is None:
+            context = _WriteContext()
+        if isinstance(top, zipfile.Path):
+            for rel, source in self._walk_zip(top):
+                dest = base_path / rel
+                dest.parent.mkdir(parents=True, exist_ok=True)
+                if not self._is_listed(rel):
+                    with source.open("rb") as in_file, open(dest, "wb") as out_file:
+                        shutil.copyfileobj(in_file, out_file)
+            return
+        for rel, entry in scan_tree(top, exclude=self.exclude):
+            dest = base_path / rel
+            if entry.is_dir():
                 dest.mkdir(parents=True, exist_ok=True)
-            for name in files:
-                source = root / name
-                rel = source.relative_to(top)
-                if str(rel) not in self:
-                    dest = base_path / rel
-                    if not dest.exists() or not dest.samefile(source):
-                        shutil.copyfile(source, dest)
+                continue
+            if entry.name == WRITE_MANIFEST_BASENAME or self._is_listed(rel):
+                continue
+            source = Path(entry.path)
+            if not dest.exists() or not dest.samefile(source):
+                if context.pool:
+                    context.pool.schedule(str(dest), self._copy_file, source, dest, shutil.copyfile, context)
+                else:
+                    self._copy_file(source, dest, context=context)
+
+    def _copy_file(self, source, dest, copy_function=shutil.copyfile, context=None):
+        """\
+        Copy the local file source to dest, according to the options of the
+        write described by context (link mode, incremental).
+        """
+        if context is None:
+            context = _WriteContext()
+        copy = partial(copy_file, link_mode=context.link_mode, copy_function=copy_function)
+        if context.manifest is None:
+            copy(source, dest)
+        else:
+            context.manifest.copy(source, dest, copy)
 
-    def write(self, base_path):
+    def validate_urls(self, max_workers=16, timeout=30):
+        """\
+        Check the URLs of all remote data entities, sending (at most)
+        max_workers HEAD requests at a time, each with the given timeout in
+        seconds. URLs of files in the crate's remote cache (if fresh) are not
+        requested. Entities whose URL can be reached are updated as in
+        writing the crate with validate_url=True (e.g., contentSize and
+        encodingFormat are set for files from the corresponding headers, if
+        present), regardless of their validate_url setting. Non-HTTP URLs are
+        only checked for existence.
+
+        Return a dictionary that maps each URL to a report with the ids of
+        the corresponding entities, the status code of the response (None
+        for non-HTTP URLs and cached responses, which count as successful),
+        the response's Content-Length, Content-Type and Last-Modified
+        headers, and the error message (None if the URL could be reached).
+
+        For best performance, the crate's http_session should have a
+        connection pool of at least max_workers connections per host (see
+        rocrate.remote.new_session).
+        """
+        entities = {}
+        for entity in self.data_entities:
+            if isinstance(entity, FileOrDir) and is_url(str(entity.source)):
+                entities.setdefault(str(entity.source), []).append(entity)
+
+        def check(url):
+            cache = self.remote_cache
+            record = cache.get_fresh(url) if cache is not None else None
+            if record is not None:
+                return None, cache.headers(record), None
+            try:
+                status, headers = url_headers(self.http_session, url, timeout=timeout)
+            except (requests.RequestException, OSError) as e:
+                return None, {}, str(e)
+            if status is not None and status >= 400:
+                return status, headers, f"HTTP status {status}"
+            return status, headers, None
+
+        report = {}
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for url, (status, headers, error) in zip(entities, executor.map(check, entities)):
+                report[url] = {
+                    "entities": [_.id for _ in entities[url]],
+                    "status": status,
+                    "content_length": headers.get("Content-Length"),
+                    "content_type": headers.get("Content-Type"),
+                    "last_modified": headers.get("Last-Modified"),
+                    "error": error,
+                }
+                if error is None and is_http(url):
+                    for entity in entities[url]:
+                        entity._update_from_headers(headers)
+        return report
+
+    def write(self, base_path, max_workers=None, link_mode="copy", incremental=False, checksum=False,
+              metadata_format="pretty"):
+        """\
+        Write the crate to the base_path directory.
+
+        If max_workers is not None, file copies and remote fetches are run
+        concurrently on a pool of (at most) max_workers threads. Local
+        datasets are processed first, then all other data entities; the
+        metadata file and the preview are written last, only if all data
+        entities have been written successfully. Failures do not stop the
+        other tasks: they are collected and raised together as a WriteError.
+
+        link_mode controls how local files are materialized in base_path:
+        "copy" (the default), "reflink", "hardlink", "symlink" or "auto" (see
+        rocrate.utils.copy_file). Unsupported operations fall back to copying.
+
+        If incremental is True, a manifest of the written files is kept in
+        base_path, and local files that have not changed since the last
+        (incremental) write are not copied again. Files are considered
+        unchanged if the size and modification time of both the source and
+        the destination match the manifest or, when checksum is True, if the
+        source's content matches the SHA-256 checksum recorded in the
+        manifest. Likewise, the metadata file and the preview are only
+        rewritten if their content has changed. In this mode, a dictionary
+        with the number of files and bytes copied and skipped is returned.
+        Remote and in-memory sources are always written.
+
+        metadata_format controls the serialization of the metadata file:
+        "pretty" (the default) indents it and sorts the keys of each object,
+        "compact" leaves out all whitespace (and does not sort the keys),
+        "sorted-compact" leaves out all whitespace and sorts the keys. The
+        compact formats are smaller and faster to write, and are meant for
+        crates consumed by programs rather than people.
+        """
+        if link_mode not in LINK_MODES:
+            raise ValueError(f"unknown link mode: {link_mode!r}")
+        if metadata_format not in METADATA_FORMATS:
+            raise ValueError(f"unknown metadata format: {metadata_format!r}")
         base_path = Path(base_path)
         base_path.mkdir(parents=True, exist_ok=True)
-        if self.source and not isinstance(self.source, dict):
-            self._copy_unlisted(self.source, base_path)
-        for writable_entity in self.data_entities + self.default_entities:
-            writable_entity.write(base_path)
+        manifest = _WriteManifest(base_path, checksum=checksum) if incremental else None
+        context = _WriteContext(link_mode=link_mode, metadata_format=metadata_format, manifest=manifest)
+        if max_workers is None:
+            if self.source and not isinstance(self.source, dict):
+                self._copy_unlisted(self.source, base_path, context)
+            for writable_entity in self.data_entities:
+                writable_entity.write(base_path, context)
+        else:
+            self.__write_parallel(base_path, max_workers, context)
+        self.__write_default_entities(base_path, context)
+        if manifest:
+            manifest.save()
+            return manifest.stats
+
+    def __write_parallel(self, base_path, max_workers, context):
+        pool = context.pool = _WritePool(max_workers)
+        try:
+            # datasets (and unlisted files) may overlap with other data
+            # entities, so they must be written before the latter
+            if self.source and not isinstance(self.source, dict):
+                self._copy_unlisted(self.source, base_path, context)
+            entities = []
+            for e in self.data_entities:
+                if isinstance(e, Dataset) and not is_url(str(e.source)):
+                    try:
+                        e.write(base_path, context)
+                    except Exception as exc:
+                        pool.errors.append((e.id, exc))
+                else:
+                    entities.append(e)
+            pool.wait()
+            for e in entities:
+                pool.schedule(e.id, e.write, base_path, context)
+            pool.wait()
+        finally:
+            context.pool = None
+            pool.shutdown()
+        if pool.errors:
+            raise WriteError(pool.errors)
+
+    def __write_default_entities(self, base_path, context):
+        for writable_entity in self.default_entities:
+            if context.manifest and isinstance(writable_entity, (Metadata, Preview)):
+                context.manifest.write_entity(writable_entity, base_path / writable_entity.id, context)
+            else:
+                writable_entity.write(base_path, context)
 
     write_crate = write  # backwards compatibility
 
-    def write_zip(self, out_path):
+    def write_zip(self, out_path, max_workers=None, compression_policy=None, prefetch=None,
+                  prefetch_memory=DEFAULT_PREFETCH_MEMORY):
+        """\
+        Write the crate to a zip file at out_path. If max_workers is not
+        None, members are compressed on a pool of (at most) max_workers
+        threads (see rocrate.zip_writer.ParallelZipWriter).
+
+        compression_policy chooses the compression method and level of each
+        member (see rocrate.zip_writer.CompressionPolicy): by default, all
+        members are compressed with DEFLATE.
+
+        If prefetch is not None, up to prefetch upcoming remote entities
+        (those with fetch_remote or validate_url set) are fetched
+        concurrently while earlier members are being compressed. Their data
+        is buffered in memory, up to a total of prefetch_memory bytes, and
+        in temporary files beyond that (see rocrate.remote.Prefetcher). The
+        archive is the same as without prefetching.
+        """
         out_path = Path(out_path)
         with open(out_path, "wb") as f:
-            for chunk in self._stream_zip(out_path=out_path):
+            for chunk in self._stream_zip(
+                    out_path=out_path, max_workers=max_workers, compression_policy=compression_policy,
+                    prefetch=prefetch, prefetch_memory=prefetch_memory
+            ):
                 f.write(chunk)
         return out_path
 
-    def stream_zip(self, chunk_size=8192):
-        """ Create a stream of bytes representing the RO-Crate as a ZIP file. """
-        yield from self._stream_zip(chunk_size=chunk_size)
+    def stream_zip(self, chunk_size=8192, max_workers=None, compression_policy=None, range=None, plan=None,
+                   prefetch=None, prefetch_memory=DEFAULT_PREFETCH_MEMORY):
+        """\
+        Create a stream of bytes representing the RO-Crate as a ZIP file.
+        max_workers, compression_policy, prefetch and prefetch_memory are as
+        in write_zip.
+
+        If range, a (start, end) tuple, or plan (as returned by zip_plan) is
+        given, the archive is laid out according to the plan (computed on the
+        fly if not given), with all members stored without compression, and
+        only the bytes from start (included) to end (excluded, None for the
+        end of the archive) are streamed. In this case, max_workers,
+        compression_policy, prefetch and prefetch_memory are ignored.
+        """
+        if range is not None or plan is not None:
+            if plan is None:
+                plan = self.zip_plan()
+            start, end = range or (0, None)
+            yield from plan.stream(start, end, chunk_size=chunk_size)
+            return
+        yield from self._stream_zip(
+            chunk_size=chunk_size, max_workers=max_workers, compression_policy=compression_policy,
+            prefetch=prefetch, prefetch_memory=prefetch_memory
+        )
+
+    async def astream_zip(self, chunk_size=8192, max_workers=None, compression_policy=None, range=None, plan=None,
+                          prefetch=None, prefetch_memory=DEFAULT_PREFETCH_MEMORY):
+        """\
+        Asynchronous version of stream_zip. Reading the data and compressing
+        it are done in worker threads, so the event loop is not blocked and
+        multiple crates can be streamed concurrently.
+        """
+        stream = self.stream_zip(
+            chunk_size=chunk_size, max_workers=max_workers, compression_policy=compression_policy, range=range, plan=plan,
+            prefetch=prefetch, prefetch_memory=prefetch_memory
+        )
+        async for chunk in iterate_in_thread(stream):
+            yield chunk
+
+    async def awrite(self, base_path, **kwargs):
+        """\
+        Asynchronous version of write (which accepts the same arguments), run
+        in a worker thread.
+        """
+        return await asyncio.to_thread(self.write, base_path, **kwargs)
+
+    def zip_plan(self):
+        """\
+        Compute the layout of a zip archive of the crate whose members are all
+        stored without compression (see rocrate.zip_writer.ZipPlan). The
+        total size of the archive (plan.size) and the offsets of all members
+        are computed without reading the data: local files are stat'ed, while
+        remote files fetched on the fly must have a contentSize. Generated
+        members, such as the metadata file, are rendered in memory, after the
+        sizes of files added with record_size have been recorded. Files
+        added with record_checksums must already have the checksums (e.g.,
+        from a previous write), since computing them requires reading the
+        data. Byte ranges of remote files are requested with HTTP range
+        requests, where supported.
+
+        The archive's content is the same as the one produced by
+        stream_zip(), and it's the same each time the plan is computed, as
+        long as the crate and its files don't change: timestamps are taken
+        from the files' modification times (1980-01-01 for generated and
+        remote members). Thus, byte ranges of the same archive can be
+        requested separately, e.g. to resume or parallelize an HTTP download.
+        Ranges that include a member's data descriptor or the central
+        directory need the CRCs of the corresponding data: the first range
+        that reaches the end of the archive reads the whole crate. The CRCs
+        are stored in the plan, so reuse it for all ranges of the archive.
+        Raise ValueError if the size of a member cannot be determined, or if
+        checksums are missing.
+        """
+        members = []
+        names = set()
+        for writeable_entity in self.data_entities + self.default_entities:
+            for member in self.__zip_plan_members(writeable_entity):
+                if member[0] not in names:
+                    names.add(member[0])
+                    members.append(member)
+        for rel, source in self._stream_zip_unlisted():
+            if rel not in names:
+                names.add(rel)
+                members.append((rel,) + self.__zip_plan_file(source))
+        return ZipPlan(members)
+
+    @staticmethod
+    def __zip_plan_file(source):
+        if isinstance(source, zipfile.Path):
+            info = source.root.getinfo(source.at)
+            return info.file_size, source, info.date_time
+        st = os.stat(source)
+        return st.st_size, source, time.localtime(st.st_mtime)[:6]
+
+    def __zip_plan_members(self, entity):
+        """\
+        Yield (name, size, source, date_time) tuples for the zip members
+        corresponding to entity (see ZipPlan).
+        """
+        missing = [_ for _ in getattr(entity, "record_checksums", ()) if _ not in entity]
+        if missing and isinstance(entity, File):
+            raise ValueError(f"{entity.id}: {', '.join(missing)} checksum not recorded")
+        for member in self.__zip_plan_entity_members(entity):
+            if getattr(entity, "record_size", False) and isinstance(entity, File):
+                # as recorded by stream_zip
+                entity._jsonld["contentSize"] = str(member[1])
+            yield member
+
+    def __zip_plan_entity_members(self, entity):
+        source = getattr(entity, "source", None)
+        if isinstance(source, (io.BytesIO, io.StringIO)):
+            # not consumed, so that the plan can be computed again
+            data = source.getvalue()
+            if isinstance(data, str):
+                data = data.encode("utf-8")
+            yield entity.id, len(data), data, _ZIP_EPOCH
+        elif source is None or isinstance(source, dict) or isinstance(entity, Metadata):
+            # in-memory or generated content
+            rendered = {}
+            for path, chunk in entity.stream():
+                rendered.setdefault(path, []).append(chunk)
+            for path, chunks in rendered.items():
+                data = b"".join(chunks)
+                yield path, len(data), data, _ZIP_EPOCH
+        elif is_url(str(source)):
+            if not entity.fetch_remote:
+                return
+            if isinstance(entity, Dataset):
+                raise ValueError(f"{entity.id}: sizes of remote dataset parts are unknown")
+            try:
+                size = int(entity["contentSize"])
+            except (KeyError, TypeError, ValueError):
+                raise ValueError(f"{entity.id}: remote file without a valid contentSize")
+            yield entity.id, size, partial(self.__remote_chunks, str(source)), _ZIP_EPOCH
+        elif isinstance(entity, Dataset):
+            if self.mode != Mode.CREATE:
+                return
+            if isinstance(entity, Subcrate):
+                raise ValueError(f"{entity.id}: subcrates are not supported")
+            prefix = unquote(entity.id).rstrip("/")
+            for rel, dir_entry in scan_tree(source):
+                if not dir_entry.is_dir():
+                    yield (f"{prefix}/{rel}",) + self.__zip_plan_file(dir_entry.path)
+        else:
+            yield (unquote(entity.id),) + self.__zip_plan_file(source)
 
-    def _stream_zip(self, chunk_size=8192, out_path=None):
+    def __remote_chunks(self, url, offset=0):
+        return iter_url_range(
+            self.http_session, url, offset, cache=self.remote_cache, downloader=self.downloader
+        )
+
+    def _stream_zip(self, chunk_size=8192, out_path=None, max_workers=None, compression_policy=None, prefetch=None,
+                    prefetch_memory=DEFAULT_PREFETCH_MEMORY):
         """ Create a stream of bytes representing the RO-Crate as a ZIP file.
         The out_path argument is used to exclude the file from the ZIP stream if the output is inside the crate folder
         and can be omitted if the stream is not written into a file inside the crate dir.
         """
         with MemoryBuffer() as buffer:
             with zipfile.ZipFile(buffer, mode='w', compression=zipfile.ZIP_DEFLATED) as archive:
-                for writeable_entity in self.data_entities + self.default_entities:
-                    current_file_path, current_out_file = None, None
-                    for path, chunk in writeable_entity.stream(chunk_size=chunk_size):
-                        if path != current_file_path:
-                            if current_out_file:
-                                current_out_file.close()
-                            current_file_path = path
-                            current_out_file = archive.open(path, mode='w', force_zip64=True)
-                        current_out_file.write(chunk)
+                if max_workers is None:
+                    writer = ZipWriter(archive, policy=compression_policy)
+                else:
+                    writer = ParallelZipWriter(archive, max_workers=max_workers, policy=compression_policy)
+                with writer:
+                    for path, chunk, encoding_formats in self._zip_members(
+                            chunk_size=chunk_size, out_path=out_path, prefetch=prefetch, prefetch_memory=prefetch_memory
+                    ):
+                        writer.write(path, chunk, encoding_formats)
                         while len(buffer) >= chunk_size:
                             yield buffer.read(chunk_size)
-                    if current_out_file:
-                        current_out_file.close()
-
-                # add additional unlisted files to stream
-                listed_files = [archived_file for archived_file in archive.namelist()]
-                for root, dirs, files in walk(str(self.source), exclude=self.exclude):
-                    for name in files:
-                        source = Path(root) / name
-
-                        # ignore out_path to not include a zip in itself
-                        if out_path and out_path.samefile(source):
-                            continue
-
-                        rel = source.relative_to(self.source)
-                        if str(rel) not in self and not str(rel) in listed_files:
-                            with archive.open(str(rel), mode='w') as out_file, open(source, 'rb') as in_file:
-                                while chunk := in_file.read(chunk_size):
-                                    out_file.write(chunk)
-                                    while len(buffer) >= chunk_size:
-                                        yield buffer.read(chunk_size)
+                    writer.close()
+                    while len(buffer) >= chunk_size:
+                        yield buffer.read(chunk_size)
 
             while chunk := buffer.read(chunk_size):
                 yield chunk
 
+    def _zip_members(self, chunk_size=8192, out_path=None, prefetch=None, prefetch_memory=DEFAULT_PREFETCH_MEMORY):
+        """\
+        Yield (path, chunk, encoding_formats) tuples for the content of all
+        members of the crate's zip archive: data entities, default entities
+        and unlisted files, in this order. encoding_formats holds the
+        encodingFormat values of the corresponding file entity, if any.
+        """
+        listed_files = set()
+        entities = self.data_entities + self.default_entities
+        # computed in advance, since streams can change the entity (e.g., a
+        # validate_url one sets encodingFormat from the HTTP headers)
+        all_encoding_formats = {}
+        for writeable_entity in entities:
+            encoding_formats = ()
+            if not isinstance(writeable_entity, Dataset):
+                try:
+                    encoding_formats = tuple(get_norm_value(writeable_entity._jsonld, "encodingFormat"))
+                except ValueError:
+                    pass
+            all_encoding_formats[writeable_entity.id] = encoding_formats
+        for writeable_entity, stream in self.__entity_streams(entities, chunk_size, prefetch, prefetch_memory):
+            encoding_formats = all_encoding_formats[writeable_entity.id]
+            for path, chunk in stream:
+                listed_files.add(path)
+                yield path, chunk, encoding_formats
+
+        # add additional unlisted files to stream
+        for rel, source in self._stream_zip_unlisted(out_path=out_path):
+            if rel not in listed_files:
+                with source.open('rb') as in_file:
+                    # yield once for an empty file
+                    yield rel, in_file.read(chunk_size), ()
+                    while chunk := in_file.read(chunk_size):
+                        yield rel, chunk, ()
+
+    def __entity_streams(self, entities, chunk_size, prefetch, prefetch_memory):
+        """\
+        Yield (entity, stream) pairs for the given entities, in order. If
+        prefetch is not None, the streams of remote entities are run ahead.
+        """
+        if prefetch is None:
+            for entity in entities:
+                yield entity, entity.stream(chunk_size=chunk_size)
+            return
+        # (entity, stream function) items; the parts of remote datasets are
+        # fetched separately, so that they can be prefetched concurrently
+        items = []
+        for entity in entities:
+            if self.__is_remote(entity) and isinstance(entity, Dataset) and entity.fetch_remote:
+                items.extend(
+                    (entity, partial(entity._stream_part_from_url, entry, chunk_size=chunk_size))
+                    for entry in entity._jsonld.get("hasPart", [])
+                )
+            else:
+                items.append((entity, partial(entity.stream, chunk_size=chunk_size)))
+        with Prefetcher(prefetch, max_memory=prefetch_memory) as prefetcher:
+            for (entity, _), stream in prefetcher.map(
+                    items, self.__call_stream, self.__is_remote_item, chunk_size=chunk_size
+            ):
+                yield entity, stream
+
+    @staticmethod
+    def __is_remote(entity):
+        return (isinstance(entity, FileOrDir) and not isinstance(entity, Subcrate)
+                and (entity.fetch_remote or entity.validate_url) and is_url(str(entity.source)))
+
+    @classmethod
+    def __is_remote_item(cls, item):
+        return cls.__is_remote(item[0])
+
+    @staticmethod
+    def __call_stream(item):
+        return item[1]()
+
+    def _stream_zip_unlisted(self, out_path=None):
+        """\
+        Yield (rel_path, source) tuples for all files in the crate's source
+        directory that are not listed in the crate, where source can be a
+        Path or a zipfile.Path.
+        """
+        if isinstance(self.source, zipfile.Path):
+            for rel, source in self._walk_zip(self.source):
+                if not self._is_listed(rel):
+                    yield rel, source
+            return
+        if self.source is None or isinstance(self.source, dict):
+            return
+        # ignore out_path to not include a zip in itself
+        out_stat = None
+        if out_path:
+            try:
+                out_stat = os.stat(out_path)
+            except OSError:
+                pass
+        for rel, entry in scan_tree(self.source, exclude=self.exclude):
+            if entry.name == WRITE_MANIFEST_BASENAME or entry.is_dir() or self._is_listed(rel):
+                continue
+            # the inode number is usually known without a stat call
+            if out_stat and entry.inode() == out_stat.st_ino and os.path.samestat(entry.stat(), out_stat):
+                continue
+            yield rel, Path(entry.path)
+
     def _all_streams(self, chunk_size=8192):
         for writeable_entity in self.data_entities + self.default_entities:
             yield from writeable_entity.stream(chunk_size=chunk_size)
@@ -655,11 +1613,12 @@ class ROCrate():
     def add_workflow(
             self, source=None, dest_path=None, fetch_remote=False, validate_url=False, properties=None,
             main=False, lang="cwl", lang_version=None, gen_cwl=False, cls=ComputationalWorkflow,
-            record_size=False
+            record_size=False, record_checksums=()
     ):
         workflow = self.add(cls(
             self, source=source, dest_path=dest_path, fetch_remote=fetch_remote,
-            validate_url=validate_url, properties=properties, record_size=record_size
+            validate_url=validate_url, properties=properties, record_size=record_size,
+            record_checksums=record_checksums
         ))
         if isinstance(lang, ComputerLanguage):
             assert lang.crate is self
@@ -680,7 +1639,8 @@ class ROCrate():
             cwl_dest_path = Path(source).with_suffix(".cwl").name
             cwl_workflow = self.add_workflow(
                 source=cwl_source, dest_path=cwl_dest_path, fetch_remote=fetch_remote, properties=properties,
-                main=False, lang="cwl", gen_cwl=False, cls=WorkflowDescription, record_size=record_size
+                main=False, lang="cwl", gen_cwl=False, cls=WorkflowDescription, record_size=record_size,
+                record_checksums=record_checksums
             )
             workflow.subjectOf = cwl_workflow
         return workflow
@@ -719,12 +1679,13 @@ class ROCrate():
 
     def add_test_definition(
             self, suite, source=None, dest_path=None, fetch_remote=False, validate_url=False, properties=None,
-            engine="planemo", engine_version=None, record_size=False
+            engine="planemo", engine_version=None, record_size=False, record_checksums=()
     ):
         suite = self.__validate_suite(suite)
         definition = self.add(
             TestDefinition(self, source=source, dest_path=dest_path, fetch_remote=fetch_remote,
-                           validate_url=validate_url, properties=properties, record_size=record_size)
+                           validate_url=validate_url, properties=properties, record_size=record_size,
+                           record_checksums=record_checksums)
         )
         if isinstance(engine, SoftwareApplication):
             assert engine.crate is self
@@ -840,7 +1801,12 @@ class ROCrate():
         if not entity:
             raise ValueError(f"entity {entity_id} does not exist in the RO-Crate")
         jsonld = {k: v for k, v in jsonld.items() if not k.startswith('@')}
+        if isinstance(entity, RootDataset) and "hasPart" in jsonld:
+            entity["hasPart"] = jsonld.pop("hasPart")
+        old_values = {k: entity._jsonld.get(k) for k in jsonld}
         entity._jsonld.update(jsonld)
+        for k, v in jsonld.items():
+            self._update_refs(entity, k, old_values[k], v)
         return entity
 
     def add_or_update_jsonld(self, jsonld):
@@ -877,7 +1843,7 @@ class ROCrate():
 class Subcrate(Dataset):
 
     def __init__(self, crate, source=None, dest_path=None, fetch_remote=False,
-                 validate_url=False, properties=None, record_size=False):
+                 validate_url=False, properties=None, record_size=False, record_checksums=()):
         """
         Data-entity representing a subcrate inside another RO-Crate.
 
@@ -885,7 +1851,8 @@ class Subcrate(Dataset):
         :param source: The relative path to the subcrate, or its URL
         """
         super().__init__(crate, source, dest_path, fetch_remote,
-                         validate_url, properties=properties, record_size=record_size)
+                         validate_url, properties=properties, record_size=record_size,
+                         record_checksums=record_checksums)
 
         self._crate = None
         """
@@ -917,12 +1884,23 @@ class Subcrate(Dataset):
         """
         if self._crate is None:
             # load_subcrates=True to load further nested RO-Crate (on-demand / lazily too)
-            self._crate = ROCrate(self.source, load_subcrates=True)
+            self._crate = ROCrate(
+                self.source, load_subcrates=True, incremental_read=self.crate.incremental_read,
+                json_backend=self.crate.json_backend,
+                http_session=self.crate.http_session, remote_cache=self.crate.remote_cache,
+                downloader=self.crate.downloader
+            )
 
-    def write(self, base_path):
-        super().write(base_path)
+    def write(self, base_path, context=None):
+        super().write(base_path, context)
         if self.crate.mode == Mode.CREATE:
-            self.get_crate().write(base_path / unquote(self.id))
+            if context is None:
+                context = _WriteContext()
+            self.get_crate().write(
+                base_path / unquote(self.id),
+                link_mode=context.link_mode,
+                metadata_format=context.metadata_format,
+            )
 
     def stream(self, chunk_size=8192):
         yield from super().stream(chunk_size=chunk_size)
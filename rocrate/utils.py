@@ -23,10 +23,57 @@
 # limitations under the License.
 
 from enum import Enum
+import asyncio
+import errno
 import os
+import shutil
+import threading
 from datetime import datetime, timezone
 from urllib.parse import urlsplit
 
+try:
+    import fcntl
+except ImportError:  # not available on Windows
+    fcntl = None
+
+
+LINK_MODES = ("copy", "reflink", "hardlink", "symlink", "auto")
+FICLONE = 0x40049409  # from linux/fs.h
+
+
+async def iterate_in_thread(iterable, batch_size=16):
+    """\
+    Asynchronously iterate over a blocking iterable (e.g., a generator that
+    reads files or URLs), advancing it in worker threads (as with
+    asyncio.to_thread) so that the event loop is never blocked. To limit the
+    overhead of switching threads, items are fetched batch_size at a time.
+    Each step may run in a different thread, but never two at once. When
+    iteration stops early, the iterable is closed (if it's a generator),
+    after any step in progress has completed.
+    """
+    it = iter(iterable)
+    lock = threading.Lock()
+
+    def step():
+        with lock:
+            batch = []
+            for item in it:
+                batch.append(item)
+                if len(batch) >= batch_size:
+                    break
+            return batch
+
+    def close():
+        with lock:
+            getattr(it, "close", lambda: None)()
+
+    try:
+        while batch := await asyncio.to_thread(step):
+            for item in batch:
+                yield item
+    finally:
+        await asyncio.to_thread(close)
+
 
 def as_list(value):
     if isinstance(value, list):
@@ -80,6 +127,111 @@ def walk(top, topdown=True, onerror=None, followlinks=False, exclude=None):
         yield root, dirs, files
 
 
+def scan_tree(top, exclude=None):
+    """\
+    Recursively list the contents of the top directory in a single pass.
+
+    Yield (rel_path, entry) tuples, where entry is an os.DirEntry and
+    rel_path is its path relative to top, with "/" as the separator.
+    Directories are yielded before their contents. As with walk, symlinks to
+    directories are listed but not followed, errors are ignored and entries
+    whose name is in exclude (together with their contents) are skipped.
+    Unlike walk, no path objects are created and file types are taken from
+    the directory listing, so this is considerably faster on large trees.
+    """
+    exclude = frozenset(exclude or [])
+    stack = [(os.fspath(top), "")]
+    while stack:
+        path, prefix = stack.pop()
+        try:
+            scandir_it = os.scandir(path)
+        except OSError:
+            continue
+        subdirs = []
+        with scandir_it:
+            for entry in scandir_it:
+                if entry.name in exclude:
+                    continue
+                rel_path = prefix + entry.name
+                yield rel_path, entry
+                try:
+                    if entry.is_dir() and not entry.is_symlink():
+                        subdirs.append((entry.path, rel_path + "/"))
+                except OSError:
+                    pass
+        stack.extend(reversed(subdirs))
+
+
+def _reflink(src, dst):
+    if fcntl is None:
+        raise OSError(errno.ENOTSUP, os.strerror(errno.ENOTSUP), str(src))
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+
+
+def _copy_range(src, dst):
+    # in-kernel copy: can be offloaded to the file system or to the server
+    # (e.g., NFS 4.2 server-side copy)
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        remaining = os.fstat(fsrc.fileno()).st_size
+        while remaining > 0:
+            n = os.copy_file_range(fsrc.fileno(), fdst.fileno(), remaining)
+            if n == 0:
+                break
+            remaining -= n
+
+
+def _hardlink(src, dst):
+    os.link(src, dst)
+
+
+def _symlink(src, dst):
+    os.symlink(os.path.abspath(src), dst)
+
+
+_LINK_FUNCTIONS = {
+    "copy": (),
+    "reflink": (_reflink,),
+    "hardlink": (_hardlink,),
+    "symlink": (_symlink,),
+    "auto": (_reflink, _copy_range),
+}
+
+
+def copy_file(src, dst, link_mode="copy", copy_function=shutil.copyfile):
+    """\
+    Materialize the src file as dst according to link_mode:
+
+    * copy: copy the file with copy_function
+    * reflink: clone the file (copy-on-write), on file systems that support
+      it (e.g., Btrfs, XFS)
+    * hardlink: create a hard link to the file
+    * symlink: create a symbolic link to the file (absolute path)
+    * auto: try cloning, then an in-kernel copy, then a regular copy
+
+    If the requested operation is not supported (e.g., hard linking across
+    file systems), fall back to copying the file with copy_function. Note
+    that, with hardlink and symlink, modifying dst also modifies src.
+
+    With copy, an existing dst is overwritten in place by copy_function (as
+    with shutil.copy). With the other modes, it's replaced, so that links
+    created by a previous run are not written through.
+    """
+    if link_mode not in LINK_MODES:
+        raise ValueError(f"unknown link mode: {link_mode!r}")
+    if link_mode != "copy" and os.path.lexists(dst):
+        os.unlink(dst)
+    for f in _LINK_FUNCTIONS[link_mode]:
+        try:
+            f(src, dst)
+        except (OSError, AttributeError):  # no os.copy_file_range on non-Linux
+            if os.path.lexists(dst):
+                os.unlink(dst)
+        else:
+            return
+    copy_function(src, dst)
+
+
 class Mode(Enum):
     READ = 1
     INIT = 2
@@ -0,0 +1,569 @@
+# Copyright 2019-2026 The University of Manchester, UK
+# Copyright 2020-2026 Vlaams Instituut voor Biotechnologie (VIB), BE
+# Copyright 2020-2026 Barcelona Supercomputing Center (BSC), ES
+# Copyright 2020-2026 Center for Advanced Studies, Research and Development in Sardinia (CRS4), IT
+# Copyright 2022-2026 École Polytechnique Fédérale de Lausanne, CH
+# Copyright 2024-2026 Data Centre, SciLifeLab, SE
+# Copyright 2024-2026 National Institute of Informatics (NII), JP
+# Copyright 2025-2026 Senckenberg Society for Nature Research (SGN), DE
+# Copyright 2025-2026 European Molecular Biology Laboratory (EMBL), Heidelberg, DE
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import struct
+import threading
+import time
+import zipfile
+import zlib
+from bisect import bisect_right
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import PurePosixPath
+
+
+BLOCK_SIZE = 1 << 20
+# size of the DEFLATE window: each block is compressed using the previous
+# 32 KiB of data as a preset dictionary, as pigz does
+_WINDOW_SIZE = 1 << 15
+# final, empty (fixed Huffman) DEFLATE block
+_FINAL_BLOCK = b"\x03\x00"
+_DD_SIGNATURE = b"PK\x07\x08"
+_MASK_USE_DATA_DESCRIPTOR = 0x08
+_MASK_UTF_FILENAME = 0x800
+
+# extensions and media types of formats that are already compressed
+COMPRESSED_EXTENSIONS = frozenset([
+    ".gz", ".tgz", ".bgz", ".bz2", ".xz", ".lz4", ".zst", ".zip", ".7z", ".rar", ".jar", ".whl",
+    ".bam", ".cram", ".bcf", ".parquet", ".npz",
+    ".png", ".jpg", ".jpeg", ".gif", ".webp", ".heic", ".avif",
+    ".mp3", ".ogg", ".flac", ".mp4", ".mkv", ".webm", ".avi", ".mov",
+    ".docx", ".xlsx", ".pptx", ".odt", ".ods", ".odp",
+])
+COMPRESSED_FORMATS = frozenset([
+    "application/gzip", "application/x-gzip", "application/x-bzip2", "application/x-xz",
+    "application/zstd", "application/zip", "application/x-7z-compressed",
+    "application/vnd.apache.parquet",
+    "image/png", "image/jpeg", "image/gif", "image/webp",
+])
+COMPRESSED_FORMAT_PREFIXES = ("audio/", "video/")
+
+
+def _deflate_block(data, zdict, level):
+    start = time.perf_counter()
+    if zdict:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS, zdict=zdict)
+    else:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    # the sync flush terminates the output at a byte boundary without marking
+    # it as the last block, so that the outputs of consecutive blocks can be
+    # concatenated
+    out = compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    return out, time.perf_counter() - start
+
+
+class CompressionPolicy:
+    """\
+    Choose the compression method and level of each zip member.
+
+    Members are stored without compression if their extension is in
+    stored_extensions, if their encodingFormat is in stored_formats (or
+    starts with one of stored_format_prefixes), or if compressing the first
+    sample_size bytes of their data (with DEFLATE, at the fastest level)
+    saves less than min_saving of their size. All other members are
+    compressed with DEFLATE at the given compresslevel. Set sample_size to
+    0 to disable the sampling test.
+
+    The policy also keeps statistics of the members written with each
+    method (see report).
+    """
+
+    def __init__(self, compresslevel=None, stored_extensions=COMPRESSED_EXTENSIONS,
+                 stored_formats=COMPRESSED_FORMATS, stored_format_prefixes=COMPRESSED_FORMAT_PREFIXES,
+                 sample_size=65536, min_saving=0.05):
+        self.compresslevel = compresslevel
+        self.stored_extensions = stored_extensions
+        self.stored_formats = stored_formats
+        self.stored_format_prefixes = tuple(stored_format_prefixes)
+        self.sample_size = sample_size
+        self.min_saving = min_saving
+        # compress_type -> {"members", "file_size", "compress_size", "time"}
+        self.stats = {}
+
+    def is_compressed(self, name, encoding_formats=()):
+        """\
+        Tell whether the member's data is known to be already compressed.
+        """
+        if PurePosixPath(name).suffix.lower() in self.stored_extensions:
+            return True
+        for f in encoding_formats:
+            f = f.lower()
+            if f in self.stored_formats or f.startswith(self.stored_format_prefixes):
+                return True
+        return False
+
+    def __call__(self, name, sample, encoding_formats=()):
+        """\
+        Return the compression method and level for the member with the given
+        name and encodingFormat values, whose data starts with sample.
+        """
+        if self.is_compressed(name, encoding_formats):
+            return zipfile.ZIP_STORED, None
+        if self.sample_size:
+            sample = sample[:self.sample_size]
+            if len(zlib.compress(sample, 1)) > (1 - self.min_saving) * len(sample):
+                return zipfile.ZIP_STORED, None
+        return zipfile.ZIP_DEFLATED, self.compresslevel
+
+    def record(self, zinfo, seconds):
+        """\
+        Update the statistics with a member that has been written.
+        """
+        s = self.stats.setdefault(zinfo.compress_type, {"members": 0, "file_size": 0, "compress_size": 0, "time": 0.0})
+        s["members"] += 1
+        s["file_size"] += zinfo.file_size
+        s["compress_size"] += zinfo.compress_size
+        s["time"] += seconds
+
+    def report(self):
+        """\
+        Return a summary of the statistics: for each compression method, the
+        number of members, total size, compressed size, compression ratio
+        and time spent compressing.
+        """
+        lines = []
+        for compress_type, s in sorted(self.stats.items()):
+            method = zipfile.compressor_names.get(compress_type, str(compress_type))
+            ratio = s["compress_size"] / s["file_size"] if s["file_size"] else 1.0
+            lines.append(
+                f"{method}: {s['members']} members, {s['file_size']} -> {s['compress_size']} bytes "
+                f"(ratio {ratio:.3f}), {s['time']:.2f}s"
+            )
+        return "\n".join(lines)
+
+
+class ZipWriter:
+    """\
+    Write members to a zipfile.ZipFile opened in "w" mode, one chunk at a
+    time. Consecutive chunks with the same name are added to the same
+    member.
+
+    If a policy (such as a CompressionPolicy) is given, it's called with the
+    member's name, the first policy.sample_size bytes of its data and its
+    encoding formats to choose the compression method and level; otherwise,
+    the archive's defaults are used. If the policy has a record method, it's
+    called with the ZipInfo of each written member and the time spent
+    writing (i.e., compressing) its data.
+    """
+
+    def __init__(self, archive, policy=None):
+        self.archive = archive
+        self.policy = policy
+        self.name = None
+        self._sample_size = getattr(policy, "sample_size", 0)
+        self._record = getattr(policy, "record", None)
+        # data buffered until the compression method is chosen
+        self._sample = None
+        self._encoding_formats = ()
+        self._out = None
+        self._time = 0.0
+
+    def write(self, name, data, encoding_formats=()):
+        if name != self.name:
+            self._end_member()
+            self.name = name
+            self._encoding_formats = encoding_formats
+            self._sample = bytearray()
+        if self._sample is None:
+            self._write(data)
+            return
+        self._sample += data
+        if len(self._sample) >= self._sample_size:
+            self._begin_member()
+
+    def _begin_member(self):
+        sample, self._sample = bytes(self._sample), None
+        if self.policy:
+            compress_type, compresslevel = self.policy(self.name, sample, self._encoding_formats)
+        else:
+            compress_type, compresslevel = self.archive.compression, self.archive.compresslevel
+        self._start_member(self.name, compress_type, compresslevel)
+        self._write(sample)
+
+    def _start_member(self, name, compress_type, compresslevel):
+        # the archive's defaults are used for members opened by name
+        default = self.archive.compression, self.archive.compresslevel
+        self.archive.compression, self.archive.compresslevel = compress_type, compresslevel
+        try:
+            self._out = self.archive.open(name, mode="w", force_zip64=True)
+        finally:
+            self.archive.compression, self.archive.compresslevel = default
+        self._time = 0.0
+
+    def _write(self, data):
+        start = time.perf_counter()
+        self._out.write(data)
+        self._time += time.perf_counter() - start
+
+    def _end_member(self):
+        if self.name is None:
+            return
+        if self._sample is not None:
+            self._begin_member()
+        self._finish_member()
+        self.name = None
+
+    def _finish_member(self):
+        start = time.perf_counter()
+        self._out.close()
+        self._out = None
+        if self._record:
+            self._record(self.archive.filelist[-1], self._time + time.perf_counter() - start)
+
+    def close(self):
+        """\
+        Finish writing the current member.
+        """
+        self._end_member()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        # on errors, release the member's handle, so that the archive can be
+        # closed without masking the original exception
+        if exc_type is not None and self._out is not None:
+            self._out.close()
+            self._out = None
+
+
+class ParallelZipWriter(ZipWriter):
+    """\
+    ZipWriter that compresses the members' data on a pool of threads (zlib
+    releases the GIL while compressing). Only the ZIP_DEFLATED and
+    ZIP_STORED methods are supported.
+
+    Data is split into blocks of block_size bytes, which are compressed
+    independently and concatenated into a single DEFLATE stream, so large
+    members are also compressed in parallel. The compressed blocks are
+    written to the archive in the same order as the data, as soon as they
+    (and all the previous ones) are ready. At most two blocks per worker are
+    held in memory at any time. Like zipfile does when the output is not
+    seekable, CRCs and sizes are written to a data descriptor after each
+    member's data, so the output file object is never seeked.
+
+    Must be used as a context manager, which shuts down the thread pool.
+    """
+
+    def __init__(self, archive, max_workers=None, block_size=BLOCK_SIZE, policy=None):
+        super().__init__(archive, policy=policy)
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.block_size = block_size
+        self._executor = ThreadPoolExecutor(self.max_workers)
+        # header, data (future or bytes) and end records, in output order
+        self._queue = deque()
+        self._n_blocks = 0
+        self._zinfo = None
+        self._level = None
+        # member whose data is being written to the archive, and time spent
+        # compressing it
+        self._out_zinfo = None
+        self._out_time = 0.0
+        self._buf = bytearray()
+        self._zdict = None
+
+    def _start_member(self, name, compress_type, compresslevel):
+        if compress_type not in (zipfile.ZIP_DEFLATED, zipfile.ZIP_STORED):
+            raise ValueError(f"compression method {compress_type} not supported")
+        zinfo = zipfile.ZipInfo(name, date_time=time.localtime(time.time())[:6])
+        zinfo.compress_type = compress_type
+        zinfo.external_attr = 0o600 << 16  # same as zipfile.ZipFile.open
+        zinfo.flag_bits |= _MASK_USE_DATA_DESCRIPTOR
+        zinfo.file_size = zinfo.compress_size = zinfo.CRC = 0
+        self._zinfo = zinfo
+        self._level = -1 if compresslevel is None else compresslevel
+        self._zdict = None
+        # the header must be built now, while the CRC and sizes are zero
+        self._queue.append(("header", (zinfo, zinfo.FileHeader(zip64=True))))
+
+    def _write(self, data):
+        zinfo = self._zinfo
+        zinfo.CRC = zlib.crc32(data, zinfo.CRC)
+        zinfo.file_size += len(data)
+        if zinfo.compress_type == zipfile.ZIP_STORED:
+            if data:
+                self._queue.append(("data", bytes(data)))
+            self._drain()
+            return
+        self._buf += data
+        while len(self._buf) >= self.block_size:
+            self._submit(bytes(self._buf[:self.block_size]))
+            del self._buf[:self.block_size]
+            self._drain()
+
+    def _submit(self, block):
+        future = self._executor.submit(_deflate_block, block, self._zdict, self._level)
+        self._zdict = block[-_WINDOW_SIZE:]
+        self._queue.append(("data", future))
+        self._n_blocks += 1
+
+    def _finish_member(self):
+        if self._buf:
+            self._submit(bytes(self._buf))
+            self._buf.clear()
+        self._queue.append(("end", self._zinfo))
+        self._zinfo = self._zdict = None
+        self._drain()
+
+    def _drain(self, wait=False):
+        """\
+        Write the records at the front of the queue whose data is ready. If
+        wait is True or too many blocks are pending, wait for the data.
+        """
+        archive, fp = self.archive, self.archive.fp
+        while self._queue:
+            kind, item = self._queue[0]
+            if kind == "header":
+                zinfo, header = item
+                zinfo.header_offset = fp.tell()
+                fp.write(header)
+                self._out_zinfo, self._out_time = zinfo, 0.0
+            elif kind == "data":
+                if isinstance(item, bytes):
+                    data = item
+                else:
+                    if not (wait or item.done() or self._n_blocks > 2 * self.max_workers):
+                        break
+                    data, seconds = item.result()
+                    self._n_blocks -= 1
+                    self._out_time += seconds
+                self._out_zinfo.compress_size += len(data)
+                fp.write(data)
+            else:
+                if item.compress_type == zipfile.ZIP_DEFLATED:
+                    item.compress_size += len(_FINAL_BLOCK)
+                    fp.write(_FINAL_BLOCK)
+                fp.write(_DD_SIGNATURE + struct.pack("<LQQ", item.CRC, item.compress_size, item.file_size))
+                archive.start_dir = fp.tell()
+                archive.filelist.append(item)
+                archive.NameToInfo[item.filename] = item
+                # the archive's central directory is only written if it's
+                # marked as modified
+                archive._didModify = True
+                if self._record:
+                    self._record(item, self._out_time)
+            self._queue.popleft()
+
+    def close(self):
+        super().close()
+        self._drain(wait=True)
+
+    def __exit__(self, *exc_info):
+        self._executor.shutdown(cancel_futures=True)
+        super().__exit__(*exc_info)
+
+
+class ZipPlanMember:
+    """\
+    A member of a ZipPlan. offset is the position of the member's local
+    header in the archive, data_offset the position of its data.
+    """
+
+    def __init__(self, name, size, source, date_time, offset):
+        self.name = name
+        self.size = size
+        self.source = source
+        self.date_time = date_time
+        self.crc = None
+        self._crc_lock = threading.Lock()
+        try:
+            self.filename = name.encode("ascii")
+            self.flag_bits = _MASK_USE_DATA_DESCRIPTOR
+        except UnicodeEncodeError:
+            self.filename = name.encode("utf-8")
+            self.flag_bits = _MASK_USE_DATA_DESCRIPTOR | _MASK_UTF_FILENAME
+        self.offset = offset
+        self.header = self._local_header()
+        self.data_offset = offset + len(self.header)
+        # data descriptor (with zip64 sizes) right after the data
+        self.end = self.data_offset + size + 24
+
+    def _dos_date_time(self):
+        dt = self.date_time
+        if dt[0] < 1980:
+            dt = (1980, 1, 1, 0, 0, 0)
+        elif dt[0] > 2107:
+            dt = (2107, 12, 31, 23, 59, 59)
+        return (dt[0] - 1980) << 9 | dt[1] << 5 | dt[2], dt[3] << 11 | dt[4] << 5 | (dt[5] // 2)
+
+    def _local_header(self):
+        # same as zipfile for members written with a data descriptor and
+        # zip64 extensions: CRC and sizes are left out
+        dosdate, dostime = self._dos_date_time()
+        extra = struct.pack("<HHQQ", 1, 16, 0, 0)
+        return struct.pack(
+            zipfile.structFileHeader, zipfile.stringFileHeader, zipfile.ZIP64_VERSION, 0, self.flag_bits,
+            zipfile.ZIP_STORED, dostime, dosdate, 0, 0xffffffff, 0xffffffff, len(self.filename), len(extra)
+        ) + self.filename + extra
+
+    def data_descriptor(self):
+        return _DD_SIGNATURE + struct.pack("<LQQ", self.crc, self.size, self.size)
+
+    def central_dir_entry(self):
+        dosdate, dostime = self._dos_date_time()
+        extra = struct.pack("<HHQQQ", 1, 24, self.size, self.size, self.offset)
+        return struct.pack(
+            zipfile.structCentralDir, zipfile.stringCentralDir, zipfile.ZIP64_VERSION, 3, zipfile.ZIP64_VERSION, 0,
+            self.flag_bits, zipfile.ZIP_STORED, dostime, dosdate, self.crc, 0xffffffff, 0xffffffff,
+            len(self.filename), len(extra), 0, 0, 0, 0o644 << 16, 0xffffffff
+        ) + self.filename + extra
+
+    def read(self, offset=0, length=None, chunk_size=8192):
+        """\
+        Yield the member's data from offset, up to length bytes.
+        """
+        if length is None:
+            length = self.size - offset
+        source = self.source
+        if isinstance(source, bytes):
+            for i in range(offset, offset + length, chunk_size):
+                yield source[i:min(i + chunk_size, offset + length)]
+            return
+        if callable(source):
+            chunks = source(offset)
+            try:
+                yield from self._read_chunks(chunks, length)
+            finally:
+                # e.g. release the connection if the range ends early
+                getattr(chunks, "close", lambda: None)()
+            return
+        f = source.open("rb") if isinstance(source, zipfile.Path) else open(source, "rb")
+        chunks = iter(lambda: f.read(chunk_size), b"")
+        with f:
+            f.seek(offset)
+            yield from self._read_chunks(chunks, length)
+
+    def _read_chunks(self, chunks, length):
+        for chunk in chunks:
+            if len(chunk) >= length:
+                if chunk[:length]:
+                    yield chunk[:length]
+                return
+            yield chunk
+            length -= len(chunk)
+        if length:
+            raise RuntimeError(f"{self.name}: size changed since the zip plan was computed")
+
+    def compute_crc(self, chunk_size=8192):
+        # computed once, even if several threads need it at the same time
+        with self._crc_lock:
+            if self.crc is None:
+                crc = 0
+                for chunk in self.read(chunk_size=chunk_size):
+                    crc = zlib.crc32(chunk, crc)
+                self.crc = crc
+        return self.crc
+
+
+class ZipPlan:
+    """\
+    Layout of a zip archive whose members are all stored (not compressed),
+    fully determined by the members' names, sizes and timestamps. This
+    allows to know the size of the archive, and to produce any byte range of
+    it, without reading the data.
+
+    members is a sequence of (name, size, source, date_time) tuples, where
+    source can be a bytes object, a path, a zipfile.Path or a callable that
+    takes an offset and returns an iterable of the chunks of data from that
+    offset, and date_time is a six-element tuple as in
+    zipfile.ZipInfo. As with zipfile on non-seekable output, each member's
+    CRC is written in a data descriptor after its data, and again in the
+    central directory: producing these parts of the archive requires reading
+    the corresponding data, unless it has already been read. In particular,
+    the first range that reaches the central directory at the end of the
+    archive requires reading all members. The CRCs are kept in the plan, so
+    a plan that is reused for multiple ranges (possibly by several threads
+    at once) reads the data for each CRC only once.
+    """
+
+    def __init__(self, members):
+        self.members = []
+        offset = 0
+        for name, size, source, date_time in members:
+            member = ZipPlanMember(name, size, source, date_time, offset)
+            self.members.append(member)
+            offset = member.end
+        self._offsets = [_.offset for _ in self.members]
+        self.central_dir_offset = offset
+        self.central_dir_size = sum(46 + len(_.filename) + 28 for _ in self.members)
+        self.size = self.central_dir_offset + self.central_dir_size + 56 + 20 + 22
+        self._central_dir = None
+        self._lock = threading.Lock()
+
+    def _end_records(self):
+        n, cd_size, cd_offset = len(self.members), self.central_dir_size, self.central_dir_offset
+        zip64_end = struct.pack(
+            zipfile.structEndArchive64, zipfile.stringEndArchive64, 44, zipfile.ZIP64_VERSION,
+            zipfile.ZIP64_VERSION, 0, 0, n, n, cd_size, cd_offset
+        )
+        locator = struct.pack(
+            zipfile.structEndArchive64Locator, zipfile.stringEndArchive64Locator, 0, cd_offset + cd_size, 1
+        )
+        end = struct.pack(
+            zipfile.structEndArchive, zipfile.stringEndArchive, 0, 0,
+            min(n, 0xffff), min(n, 0xffff), min(cd_size, 0xffffffff), min(cd_offset, 0xffffffff), 0
+        )
+        return zip64_end + locator + end
+
+    def _tail(self, chunk_size):
+        # central directory and end records, which need all CRCs
+        with self._lock:
+            if self._central_dir is None:
+                for member in self.members:
+                    member.compute_crc(chunk_size=chunk_size)
+                self._central_dir = b"".join(_.central_dir_entry() for _ in self.members) + self._end_records()
+        return self._central_dir
+
+    def stream(self, start=0, end=None, chunk_size=8192):
+        """\
+        Yield the bytes of the archive from start (included) to end
+        (excluded, defaults to the end of the archive).
+        """
+        if end is None or end > self.size:
+            end = self.size
+        if start < 0 or start > end:
+            raise ValueError(f"invalid range: {start}-{end}")
+        i = max(bisect_right(self._offsets, start) - 1, 0)
+        for member in self.members[i:]:
+            if member.offset >= end:
+                return
+            if start < member.data_offset:
+                yield member.header[start - member.offset:end - member.offset]
+            data_start = max(start, member.data_offset) - member.data_offset
+            data_end = min(end, member.data_offset + member.size) - member.data_offset
+            if data_start < data_end:
+                if data_start == 0 and data_end == member.size and member.crc is None:
+                    crc = 0
+                    for chunk in member.read(0, member.size, chunk_size):
+                        crc = zlib.crc32(chunk, crc)
+                        yield chunk
+                    member.crc = crc
+                else:
+                    yield from member.read(data_start, data_end - data_start, chunk_size)
+            dd_offset = member.data_offset + member.size
+            if end > dd_offset and start < member.end:
+                member.compute_crc(chunk_size=chunk_size)
+                yield member.data_descriptor()[max(start - dd_offset, 0):end - dd_offset]
+            start = max(start, member.end)
+        if start < end:
+            yield self._tail(chunk_size)[start - self.central_dir_offset:end - self.central_dir_offset]
@@ -88,6 +88,7 @@ setup(
     install_requires=[required],
     extras_require={
         'ga2cwl': ['galaxy2cwl'],
+        'orjson': ['orjson'],
     },
     classifiers=[
         'Operating System :: OS Independent',
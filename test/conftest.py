@@ -20,8 +20,15 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import hashlib
 import json
+import re
 import shutil
+import sys
+import threading
+import time
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
 
 import pytest
@@ -100,3 +107,159 @@ def test_data_dir(tmpdir):
     d = tmpdir / TEST_DATA_NAME
     shutil.copytree(THIS_DIR / TEST_DATA_NAME, d)
     return d
+
+
+class _HTTPRequestHandler(SimpleHTTPRequestHandler):
+
+    protocol_version = "HTTP/1.1"  # keep-alive
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def handle_one_request(self):
+        self.in_flight = False
+        try:
+            super().handle_one_request()
+        finally:
+            if self.in_flight:
+                with self.server.lock:
+                    self.server.in_flight -= 1
+
+    def parse_request(self):
+        ok = super().parse_request()
+        if ok:
+            with self.server.lock:
+                self.server.requests.append((self.command, self.path, dict(self.headers)))
+                self.server.in_flight += 1
+                self.server.max_in_flight = max(self.server.max_in_flight, self.server.in_flight)
+            self.in_flight = True
+        return ok
+
+    def send_header(self, keyword, value):
+        if keyword.lower() in {_.lower() for _ in self.server.omit_headers}:
+            if keyword.lower() == "content-length":
+                # the end of the content is signalled by closing the connection
+                self.close_connection = True
+            return
+        super().send_header(keyword, value)
+
+    def _redirect(self):
+        location = self.server.redirects.get(self.path)
+        if location is not None:
+            self.send_response(302)
+            self.send_header("Location", location)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+        return location is not None
+
+    def do_GET(self):
+        time.sleep(self.server.delay)
+        if self._redirect():
+            return
+        with self.server.lock:
+            error = self.server.errors > 0
+            self.server.errors -= error
+        if error:
+            self.send_error(503)
+            return
+        path = Path(self.translate_path(self.path))
+        if path.is_file():
+            self._send_file(path)
+        else:
+            super().do_GET()
+
+    def _send_file(self, path):
+        data = path.read_bytes()
+        etag = f'"{hashlib.sha256(data).hexdigest()}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        start, end, status = 0, len(data), 200
+        m = re.fullmatch(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+        if m and self.server.ranges and self.headers.get("If-Range", etag) == etag:
+            start, status = int(m[1]), 206
+            end = min(int(m[2]) + 1, end) if m[2] else end
+        self.send_response(status)
+        self.send_header("Content-Type", self.guess_type(str(path)))
+        self.send_header("Content-Length", str(end - start))
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", self.date_time_string(int(path.stat().st_mtime)))
+        if self.server.ranges:
+            self.send_header("Accept-Ranges", "bytes")
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{end - 1}/{len(data)}")
+        self.end_headers()
+        with self.server.lock:
+            fail = self.server.failures > 0
+            self.server.failures -= fail
+        if fail:
+            # drop the connection after sending part of the content
+            self.wfile.write(data[start:min(start + self.server.fail_after, end)])
+            self.close_connection = True
+        else:
+            self.wfile.write(data[start:end])
+
+    def do_HEAD(self):
+        time.sleep(self.server.delay)
+        if not self._redirect():
+            super().do_HEAD()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class HTTPServer(ThreadingHTTPServer):
+    """\
+    Local HTTP server for the files in root, which keeps track of the number
+    of connections and of the requests it receives, including the peak number
+    of requests being handled at the same time (max_in_flight). Responses are
+    sent after delay seconds.
+
+    If ranges is True, range requests are supported. The next errors GET
+    requests fail with a 503 status, and the next failures GET responses
+    are cut short after fail_after bytes of content. Requests for the paths
+    in redirects are redirected to the corresponding locations, and the
+    headers in omit_headers are left out of all responses.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, root, handler_class=_HTTPRequestHandler):
+        super().__init__(("127.0.0.1", 0), partial(handler_class, directory=str(root)))
+        self.root = Path(root)
+        self.url = f"http://127.0.0.1:{self.server_port}"
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.delay = 0
+        self.ranges = False
+        self.errors = 0
+        self.failures = 0
+        self.fail_after = 0
+        self.redirects = {}
+        self.omit_headers = set()
+
+    def handle_error(self, request, client_address):
+        # clients closing the connection early are expected
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+@pytest.fixture
+def http_server(tmpdir):
+    root = tmpdir / "http_root"
+    root.mkdir()
+    server = HTTPServer(root)
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    thread.join()
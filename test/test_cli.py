@@ -20,6 +20,8 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 import json
+import os
+import zipfile
 
 import click
 from click.testing import CliRunner
@@ -318,6 +320,26 @@ def test_cli_add_test_metadata_explicit_ids(test_data_dir, helpers, monkeypatch)
     assert set(json_entities[def_id]["@type"]) == {"File", "TestDefinition"}
 
 
+@pytest.mark.parametrize("link_mode,metadata_format", [(None, None), ("hardlink", "compact")])
+def test_cli_write(test_data_dir, tmpdir, helpers, link_mode, metadata_format):
+    crate_dir = test_data_dir / "ro-crate-galaxy-sortchangecase"
+    out_path = tmpdir / "ro_crate_out"
+    args = ["write", "-c", str(crate_dir), str(out_path)]
+    if link_mode:
+        args.extend(["--link-mode", link_mode])
+    if metadata_format:
+        args.extend(["--metadata-format", metadata_format])
+    result = CliRunner().invoke(cli, args)
+    assert result.exit_code == 0, result.output
+    wf_path = out_path / "sort-and-change-case.ga"
+    assert wf_path.is_file()
+    assert wf_path.samefile(crate_dir / "sort-and-change-case.ga") is (link_mode == "hardlink")
+    assert (out_path / "test" / "test1" / "input.bed").is_file()
+    assert ROCrate(out_path).mainEntity is not None
+    metadata_lines = (out_path / helpers.METADATA_FILE_NAME).read_text().splitlines()
+    assert (len(metadata_lines) == 1) is (metadata_format == "compact")
+
+
 @pytest.mark.parametrize("cwd", [False, True])
 def test_cli_write_zip(test_data_dir, monkeypatch, cwd):
     crate_dir = test_data_dir / "ro-crate-galaxy-sortchangecase"
@@ -341,3 +363,17 @@ def test_cli_write_zip(test_data_dir, monkeypatch, cwd):
 
     crate = ROCrate(output_zip_path)
     assert crate.mainEntity is not None
+
+
+def test_cli_write_zip_compression(test_data_dir, tmpdir):
+    crate_dir = test_data_dir / "ro-crate-galaxy-sortchangecase"
+    (crate_dir / "random.gz").write_bytes(os.urandom(1000))
+    output_zip_path = tmpdir / "out.zip"
+    args = ["write-zip", "-c", str(crate_dir), "--compression", "auto", "--stats", str(output_zip_path)]
+    result = CliRunner().invoke(cli, args)
+    assert result.exit_code == 0, result.output
+    assert result.output.startswith("store: ")
+    assert "deflate: " in result.output
+    with zipfile.ZipFile(output_zip_path, "r") as zf:
+        assert zf.getinfo("random.gz").compress_type == zipfile.ZIP_STORED
+        assert zf.getinfo("sort-and-change-case.ga").compress_type == zipfile.ZIP_DEFLATED
@@ -0,0 +1,104 @@
+# Copyright 2019-2026 The University of Manchester, UK
+# Copyright 2020-2026 Vlaams Instituut voor Biotechnologie (VIB), BE
+# Copyright 2020-2026 Barcelona Supercomputing Center (BSC), ES
+# Copyright 2020-2026 Center for Advanced Studies, Research and Development in Sardinia (CRS4), IT
+# Copyright 2022-2026 École Polytechnique Fédérale de Lausanne, CH
+# Copyright 2024-2026 Data Centre, SciLifeLab, SE
+# Copyright 2024-2026 National Institute of Informatics (NII), JP
+# Copyright 2025-2026 Senckenberg Society for Nature Research (SGN), DE
+# Copyright 2025-2026 European Molecular Biology Laboratory (EMBL), Heidelberg, DE
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import gc
+import importlib
+import json
+
+import pytest
+
+from rocrate.json_backend import BACKEND_ENV_VAR, JSONBackend, get_backend
+from rocrate.rocrate import ROCrate
+
+
+def test_get_backend(monkeypatch):
+    monkeypatch.delenv(BACKEND_ENV_VAR, raising=False)
+    assert get_backend().name == "json"
+    assert get_backend("json").name == "json"
+    backend = get_backend("json")
+    assert get_backend(backend) is backend
+    with pytest.raises(ValueError):
+        get_backend("foo")
+    real_import_module = importlib.import_module
+
+    def import_module(name, *args, **kwargs):
+        if name in ("orjson", "ujson", "simdjson"):
+            raise ImportError(name)
+        return real_import_module(name, *args, **kwargs)
+    monkeypatch.setattr(importlib, "import_module", import_module)
+    with pytest.warns(UserWarning):
+        assert get_backend("ujson").name == "json"
+    assert get_backend("auto").name == "json"
+    monkeypatch.setenv(BACKEND_ENV_VAR, "simdjson")
+    with pytest.warns(UserWarning):
+        assert type(get_backend()) is JSONBackend
+
+
+def test_orjson_dumps():
+    pytest.importorskip("orjson")
+    backend = get_backend("orjson")
+    assert backend.name == "orjson"
+    assert backend.can_dump
+    objects = [
+        {"@id": "#a", "@type": ["Thing", "Person"], "name": "A", "knows": [{"@id": "#b"}], "empty": [], "obj": {}},
+        {"b": [1, -2, True, False, None, [[]], {"z": {}, "a": [{}]}], "a": "x"},
+        {"f": [1.5, 1e16, 1e-05, -0.0]},
+        {"s": "".join(chr(_) for _ in range(128)) + "è \U0001F600"},
+    ]
+    for obj in objects:
+        for sort_keys in False, True:
+            s = backend.dumps_compact(obj, sort_keys=sort_keys)
+            assert json.loads(s) == obj
+            assert (list(json.loads(s)) == sorted(obj)) or not sort_keys
+    # not supported by orjson: fall back to the json module
+    for x in float("nan"), float("inf"), 2 ** 70:
+        assert backend.dumps_compact({"x": x}) is None
+    assert backend.loads(b'{"x": NaN}')["x"] != 0
+
+
+def test_loads_gc():
+    pytest.importorskip("orjson")
+    backend = get_backend("orjson")
+    # the garbage collector's state is left alone
+    gc.disable()
+    try:
+        backend.loads(b'{"x": [1, 2]}')
+        assert not gc.isenabled()
+    finally:
+        gc.enable()
+    backend.loads(b'{"x": [1, 2]}')
+    assert gc.isenabled()
+
+
+@pytest.mark.filterwarnings("ignore:JSON backend")
+@pytest.mark.parametrize("name", ["orjson", "ujson", "simdjson"])
+def test_read_write(test_data_dir, tmpdir, helpers, name):
+    crate_dir = test_data_dir / "ro-crate-galaxy-sortchangecase"
+    crate = ROCrate(crate_dir)
+    crate.root_dataset["description"] = "non-ASCII (è), float: 1e-05"
+    crate.root_dataset["version"] = 1e-05
+    crate.write(tmpdir / "crate_json")
+    crate = ROCrate(tmpdir / "crate_json", json_backend=name)
+    assert crate.root_dataset["version"] == 1e-05
+    crate.write(tmpdir / "crate_backend")
+    metadata_name = helpers.METADATA_FILE_NAME
+    assert (tmpdir / "crate_backend" / metadata_name).read_bytes() == (tmpdir / "crate_json" / metadata_name).read_bytes()
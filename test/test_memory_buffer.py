@@ -0,0 +1,70 @@
+# Copyright 2019-2026 The University of Manchester, UK
+# Copyright 2020-2026 Vlaams Instituut voor Biotechnologie (VIB), BE
+# Copyright 2020-2026 Barcelona Supercomputing Center (BSC), ES
+# Copyright 2020-2026 Center for Advanced Studies, Research and Development in Sardinia (CRS4), IT
+# Copyright 2022-2026 École Polytechnique Fédérale de Lausanne, CH
+# Copyright 2024-2026 Data Centre, SciLifeLab, SE
+# Copyright 2024-2026 National Institute of Informatics (NII), JP
+# Copyright 2025-2026 Senckenberg Society for Nature Research (SGN), DE
+# Copyright 2025-2026 European Molecular Biology Laboratory (EMBL), Heidelberg, DE
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import zipfile
+
+import pytest
+
+from rocrate.memory_buffer import MemoryBuffer
+
+
+def test_memory_buffer():
+    buffer = MemoryBuffer()
+    assert len(buffer) == 0
+    assert buffer.read() == b""
+    assert buffer.write(b"foo") == 3
+    assert buffer.write(bytearray(b"bar")) == 3
+    assert buffer.write(memoryview(b"bazqux")) == 6
+    assert len(buffer) == 12
+    assert buffer.read(2) == b"fo"
+    assert buffer.read(5) == b"obarb"
+    assert len(buffer) == 5
+    out = bytearray(3)
+    assert buffer.readinto(out) == 3
+    assert out == b"azq"
+    assert buffer.read(100) == b"ux"
+    assert buffer.read() == b""
+    buffer.write(b"foo")
+    buffer.write(b"bar")
+    assert buffer.read() == b"foobar"
+    assert len(buffer) == 0
+    buffer.close()
+    with pytest.raises(ValueError):
+        buffer.write(b"foo")
+    with pytest.raises(ValueError):
+        buffer.read()
+
+
+def test_memory_buffer_zip(tmpdir):
+    members = {f"f{i}.txt": (f"{i}" * i).encode() for i in range(100)}
+    out_path = tmpdir / "out.zip"
+    with open(out_path, "wb") as f, MemoryBuffer() as buffer:
+        with zipfile.ZipFile(buffer, mode="w", compression=zipfile.ZIP_DEFLATED) as archive:
+            for name, content in members.items():
+                with archive.open(name, mode="w") as out_file:
+                    out_file.write(content)
+                while len(buffer) >= 64:
+                    f.write(buffer.read(64))
+        f.write(buffer.read())
+    with zipfile.ZipFile(out_path, "r") as zf:
+        assert not zf.testzip()
+        assert {_: zf.read(_) for _ in zf.namelist()} == members
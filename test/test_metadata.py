@@ -20,10 +20,13 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import io
+import json
 import pytest
+import tracemalloc
 from copy import deepcopy
 
-from rocrate.metadata import find_root_entity_id
+from rocrate.metadata import find_root_entity_id, iter_graph, read_metadata
 
 
 @pytest.mark.parametrize("root,basename", [
@@ -184,3 +187,63 @@ def test_find_root_multiple_types():
     entities["./"]["@type"] = "NotADataset"
     with pytest.raises(ValueError):
         find_root_entity_id(entities)
+
+
+@pytest.mark.parametrize("indent", [None, 4])
+def test_iter_graph(indent):
+    graph = [
+        {"@id": "./", "@type": "Dataset", "hasPart": [{"@id": "a.txt"}]},
+        {"@id": "a.txt", "@type": "File", "contentSize": 123456789, "name": "A [x], {y}"},
+        {"@id": "#n", "@type": "Thing", "value": -1.5e-10, "flags": [True, False, None]},
+    ]
+    doc = {"@graph": graph, "@context": "https://w3id.org/ro/crate/1.2/context", "n": 42}
+    text = json.dumps(doc, indent=indent)
+    metadata = {}
+    # a tiny chunk size checks that values spanning multiple chunks are decoded correctly
+    assert list(iter_graph(io.StringIO(text), metadata, chunk_size=3)) == graph
+    assert metadata == {"@graph": [], "@context": doc["@context"], "n": 42}
+    assert list(iter_graph(io.StringIO('{"@graph": [], "@context": {}}'))) == []
+    assert list(iter_graph(io.StringIO(' { } '))) == []
+    assert list(iter_graph(io.StringIO(text + " \n"))) == graph
+    for bad in (
+        '[]', '{"@graph": [{"@id": "./"} {"@id": "x"}]}', '{"@graph": [{"@id": "./"}', '{"n": 1',
+        text + "}", text + ' {"@graph": []}', "{} x",
+    ):
+        with pytest.raises(ValueError):
+            list(iter_graph(io.StringIO(bad)))
+
+
+def test_read_metadata(test_data_dir):
+    metadata_path = test_data_dir / "read_crate" / "ro-crate-metadata.json"
+    with open(metadata_path) as f:
+        doc = json.load(f)
+    context, entities = read_metadata(metadata_path)
+    assert context == doc["@context"]
+    assert entities == {_["@id"]: _ for _ in doc["@graph"]}
+    assert list(entities) == [_["@id"] for _ in doc["@graph"]]
+    assert read_metadata(doc) == (context, entities)
+    assert read_metadata(metadata_path, incremental=True) == (context, entities)
+    with pytest.raises(ValueError):
+        read_metadata({"@context": doc["@context"]})
+
+
+def test_read_metadata_incremental_memory(tmpdir):
+    graph = [{"@id": "./", "@type": "Dataset"}] + [
+        {"@id": f"{i}.txt", "@type": "File", "name": f"File {i}", "contentSize": i} for i in range(20000)
+    ]
+    metadata_path = tmpdir / "ro-crate-metadata.json"
+    metadata_path.write_text(json.dumps({"@context": {}, "@graph": graph}, indent=4))
+    text_size = metadata_path.stat().st_size
+    del graph
+    peaks = {}
+    for incremental in False, True:
+        tracemalloc.start()
+        try:
+            _, entities = read_metadata(metadata_path, incremental=incremental)
+            peaks[incremental] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        assert len(entities) == 20001
+        del entities
+    # the whole JSON text is never held in memory
+    assert peaks[True] < peaks[False] - text_size / 2
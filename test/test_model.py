@@ -21,6 +21,7 @@
 # limitations under the License.
 
 import datetime
+import io
 import json
 import sys
 import tempfile
@@ -106,7 +107,7 @@ def test_data_entities(test_data_dir):
     subcrate = crate.add(Subcrate(crate, test_data_dir / 'crate-1.0'))
     data_entity = crate.add(DataEntity(crate, '#mysterious'))
     assert set(crate.data_entities) == {file_, dataset, subcrate, data_entity}
-    part_ids = set(_["@id"] for _ in crate.root_dataset._jsonld["hasPart"])
+    part_ids = set(_["@id"] for _ in crate.root_dataset.properties()["hasPart"])
     assert set(_.id for _ in (file_, dataset, subcrate, data_entity)) <= part_ids
 
 
@@ -125,6 +126,26 @@ def test_data_entities_perf():
     ).timeit(500) < 0.1
 
 
+def test_canonical_id(monkeypatch):
+    crate = ROCrate()
+    person = crate.add(Person(crate, "#joe"))
+    dataset = crate.add_dataset(None, "a/b/")
+    assert person.canonical_id() == f"{crate.arcp_base_uri}#joe"
+    assert dataset.canonical_id() == f"{crate.arcp_base_uri}a/b"
+    assert crate.resolve_id("./a/../a/b//") == dataset.canonical_id()
+    assert crate.resolve_id("https://example.org/a/") == "https://example.org/a"
+
+    def fail(id_):
+        raise AssertionError("canonical id should not be recomputed")
+
+    monkeypatch.setattr(crate, "resolve_id", fail)
+    assert person.canonical_id() == f"{crate.arcp_base_uri}#joe"
+    assert hash(dataset) == hash(f"{crate.arcp_base_uri}a/b")
+    # each crate has its own base uri, so ids don't clash across crates
+    crate2 = ROCrate()
+    assert crate2.resolve_id("#joe") != person.canonical_id()
+
+
 def test_remote_data_entities():
     crate = ROCrate()
     file_uri = "https://www.rfc-editor.org/rfc/rfc3986.txt"
@@ -269,6 +290,74 @@ def test_delete(test_data_dir):
     crate.delete(john)  # no-op
 
 
+def test_delete_order():
+    crate = ROCrate()
+    files = [crate.add_file(None, f"f{i}.txt") for i in range(10)]
+    crate.root_dataset.append_to("hasPart", "https://example.org/remote.txt")
+    for f in files[::3]:
+        crate.delete(f)
+    crate.delete(files[4].id)
+    expected = [_ for i, _ in enumerate(files) if i % 3 and i != 4]
+    assert crate.root_dataset["hasPart"] == expected + ["https://example.org/remote.txt"]
+    assert crate.data_entities == expected
+    # delete and add back
+    crate.delete(files[1])
+    crate.add(files[1])
+    assert crate.root_dataset["hasPart"][-1] is files[1]
+    assert len(crate.root_dataset["hasPart"]) == len(expected) + 1
+    # the JSON-LD has the same references, in the same order
+    assert crate.root_dataset.properties()["hasPart"] == [
+        {"@id": _.id} for _ in expected if _ is not files[1]
+    ] + ["https://example.org/remote.txt", {"@id": files[1].id}]
+    # cascading deletion and replacement of the whole property
+    crate.delete(files[2], cascade=True)
+    assert files[2] not in crate.root_dataset["hasPart"]
+    crate.root_dataset["hasPart"] = [files[5]]
+    assert crate.root_dataset["hasPart"] == [files[5]]
+    assert crate.referrers(files[5]) == [(crate.root_dataset, "hasPart")]
+    assert crate.referrers(files[7]) == []
+    del crate.root_dataset["hasPart"]
+    assert "hasPart" not in crate.root_dataset
+    assert "hasPart" not in crate.root_dataset.properties()
+
+
+def test_has_part_duplicates(tmpdir, helpers):
+    crate = ROCrate()
+    f, g = crate.add_file(io.StringIO("f"), "f.txt"), crate.add_file(io.StringIO("g"), "g.txt")
+    crate.root_dataset["hasPart"] = [f, g, f]
+    assert crate.root_dataset["hasPart"] == [f, g, f]
+    crate.root_dataset.append_to("hasPart", [g, "https://example.org/remote.txt"])
+    expected = [{"@id": "f.txt"}, {"@id": "g.txt"}, {"@id": "f.txt"}, {"@id": "g.txt"}]
+    assert crate.root_dataset.properties()["hasPart"] == expected + ["https://example.org/remote.txt"]
+    out_path = tmpdir / "ro_crate_out"
+    crate.write(out_path)
+    json_entities = helpers.read_json_entities(out_path)
+    assert json_entities["./"]["hasPart"] == expected + ["https://example.org/remote.txt"]
+    # all references to a deleted entity are removed
+    crate.delete(f)
+    assert crate.root_dataset["hasPart"] == [g, g, "https://example.org/remote.txt"]
+    crate.delete(g)
+    assert crate.root_dataset["hasPart"] == ["https://example.org/remote.txt"]
+
+
+@pytest.mark.skipif(sys.platform == "darwin", reason="CI sometimes fails on macOS")
+def test_delete_perf():
+    """\
+    Test that deleting a data entity happens in constant time. The time
+    required for 500 deletions from a crate with 5000 files, each followed by
+    reading a property of the root dataset, should be ~0.01s if entities are
+    deleted in constant time, several seconds if hasPart is scanned for each
+    deletion.
+    """
+    crate = ROCrate()
+    crate.name = "test"
+    files = [crate.add_file(None, f"f{i}.txt") for i in range(5000)]
+    to_delete = iter(files[::10])
+    stmt = "crate.delete(next(to_delete)); crate.name"
+    assert timeit.Timer(stmt, globals=locals()).timeit(500) < 0.1
+    assert crate.root_dataset["hasPart"] == [_ for i, _ in enumerate(files) if i % 10]
+
+
 # FIXME: what to do with refs is still WIP
 def test_delete_refs(test_data_dir, tmpdir, helpers):
     def_path = "test/test1/sort-and-change-case-test.yml"
@@ -290,6 +379,69 @@ def test_delete_refs(test_data_dir, tmpdir, helpers):
     # or perhaps such an inconsistent state should not be allowed at all
 
 
+def test_delete_cascade(test_data_dir, tmpdir, helpers):
+    def_path = "test/test1/sort-and-change-case-test.yml"
+    crate = ROCrate(test_data_dir / 'ro-crate-galaxy-sortchangecase')
+    suite = crate.dereference("#test1")
+    definition = crate.dereference(def_path)
+    assert crate.referrers(definition) == [(crate.root_dataset, "hasPart"), (suite, "definition")]
+    assert crate.referrers(def_path) == crate.referrers(definition)
+    crate.delete(definition, cascade=True)
+    assert "definition" not in suite
+    assert crate.referrers(def_path) == []
+    out_path = tmpdir / "ro_crate_out"
+    crate.write(out_path)
+    json_entities = helpers.read_json_entities(out_path)
+    assert def_path not in json_entities
+    assert "definition" not in json_entities["#test1"]
+
+
+def test_referrers():
+    crate = ROCrate()
+    alice = crate.add(Person(crate, "#alice"))
+    bob = crate.add(Person(crate, "#bob"))
+    f = crate.add_file(None, "a.txt", properties={"author": [alice, bob]})
+    assert crate.referrers(alice) == [(f, "author")]
+    assert crate.referrers(f) == [(crate.root_dataset, "hasPart")]
+    crate.root_dataset["creator"] = alice
+    crate.root_dataset.append_to("contributor", bob)
+    assert crate.referrers(alice) == [(f, "author"), (crate.root_dataset, "creator")]
+    assert crate.referrers(bob) == [(f, "author"), (crate.root_dataset, "contributor")]
+    f["author"] = bob
+    assert crate.referrers(alice) == [(crate.root_dataset, "creator")]
+    del crate.root_dataset["creator"]
+    assert crate.referrers(alice) == []
+    crate.update_jsonld({"@id": "a.txt", "author": {"@id": "#alice"}})
+    assert crate.referrers(alice) == [(f, "author")]
+    crate.delete(bob, cascade=True)
+    assert crate.root_dataset.get("contributor") is None
+    assert f["author"] is alice
+    g = crate.add_file(None, "b.txt", properties={"author": [alice, bob]})
+    alice.delete(cascade=True)
+    assert "author" not in f
+    assert g._jsonld["author"] == [{"@id": "#bob"}]
+    f.delete(cascade=True)
+    assert crate.root_dataset["hasPart"] == [g]
+    assert crate.referrers(g) == [(crate.root_dataset, "hasPart")]
+
+
+@pytest.mark.skipif(sys.platform == "darwin", reason="CI sometimes fails on macOS")
+def test_delete_cascade_perf():
+    """\
+    Test that cascading deletion only visits the referrers of the deleted
+    entities. The time required for 500 deletions from a crate with 5000
+    files, each authored by a different person, should be ~0.01s if
+    referrers are looked up in the reference index, several seconds if all
+    entities are scanned for each deletion.
+    """
+    crate = ROCrate()
+    people = [crate.add(Person(crate, f"#p{i}")) for i in range(5000)]
+    files = [crate.add_file(None, f"f{i}.txt", properties={"author": p}) for i, p in enumerate(people)]
+    to_delete = iter(people[::10])
+    assert timeit.Timer("crate.delete(next(to_delete), cascade=True)", globals=locals()).timeit(500) < 0.1
+    assert sum(1 for _ in files if "author" in _) == 4500
+
+
 def test_delete_by_id(test_data_dir):
     crate = ROCrate()
     path = test_data_dir / "sample_file.txt"
@@ -453,6 +605,76 @@ def test_get_by_type(test_data_dir):
     assert crate.get_by_type(["File", "ComputationalWorkflow"]) == [wf]
     assert crate.get_by_type("Person") == []
     assert crate.get_by_type("Dataset") == [crate.root_dataset]
+    # type changes and deletions are reflected
+    f1.type = ["File", "SoftwareSourceCode"]
+    assert set(crate.get_by_type("File", exact=True)) == {f2}
+    assert set(crate.get_by_type("SoftwareSourceCode")) == {f1, wf}
+    crate.delete(f2)
+    assert crate.get_by_type("File", exact=True) == []
+    assert set(crate.get_by_type("File")) == {f1, wf}
+    # replacing an entity with one of a different category
+    alice = crate.add(Person(crate, "#alice"))
+    assert crate.get_by_type("Person") == [alice]
+    assert alice in crate.contextual_entities
+    alice_file = crate.add(DataEntity(crate, "#alice", properties={"@type": "File"}))
+    assert crate.get_by_type("Person") == []
+    assert alice_file in crate.data_entities
+    assert alice not in crate.contextual_entities
+    # placeholders for lazily loaded entities
+    crate = ROCrate(test_data_dir / "read_crate", lazy=True)
+    joe = crate.get_by_type("Person")
+    assert [_.id for _ in joe] == ["#joe"]
+    assert crate.get_by_type("Person") == joe
+    assert crate.get_by_type([]) == list(crate.get_entities())
+
+
+def test_get_by_type_order(test_data_dir):
+    crate = ROCrate()
+    files = [crate.add_file(test_data_dir / "sample_file.txt", f"{i}.txt") for i in range(4)]
+    files[2].type = ["File", "SoftwareSourceCode"]
+    files[0].type = ["File", "SoftwareSourceCode"]
+    # same order as in the graph, regardless of the order of type changes
+    assert crate.get_by_type("SoftwareSourceCode") == [files[0], files[2]]
+    assert crate.get_by_type("File") == files
+    # replacing an entity with one of a different category keeps its position
+    alice = crate.add(Person(crate, "#alice"))
+    bob = crate.add(Person(crate, "#bob"))
+    crate.add(DataEntity(crate, "#alice", properties={"@type": "Person"}))
+    crate.add(Person(crate, "#alice"))
+    assert [_.id for _ in crate.get_by_type("Person")] == [alice.id, bob.id]
+    assert [_.id for _ in crate.contextual_entities] == [alice.id, bob.id]
+    assert crate.get_by_type("Person") == [_ for _ in crate.get_entities() if _.type == "Person"]
+
+
+def test_get_by_type_in_place_change(test_data_dir):
+    crate = ROCrate()
+    f = crate.add_file(test_data_dir / "sample_file.txt")
+    f.type = ["File"]
+    # in-place changes to the type list are not tracked by the index
+    f.type.append("SoftwareSourceCode")
+    assert crate.get_by_type("SoftwareSourceCode") == []
+    f.type = f.type
+    assert crate.get_by_type("SoftwareSourceCode") == [f]
+    # removed types are never returned
+    f.type.remove("SoftwareSourceCode")
+    assert crate.get_by_type("SoftwareSourceCode") == []
+
+
+@pytest.mark.skipif(sys.platform == "darwin", reason="CI sometimes fails on macOS")
+def test_get_by_type_perf():
+    """\
+    Test that type queries take time proportional to the number of results
+    rather than to the number of entities in the crate. The time required
+    for 500 queries should be ~0.01s with the type index, ~1s without it.
+    """
+    crate = ROCrate()
+    for i in range(5000):
+        crate.add(Person(crate, f"#p{i}"))
+    app = crate.add(ContextEntity(crate, "#app", properties={"@type": "SoftwareApplication"}))
+    assert crate.get_by_type("SoftwareApplication") == [app]
+    assert timeit.Timer(
+        "crate.get_by_type('SoftwareApplication'); crate.data_entities", globals=locals()
+    ).timeit(500) < 0.1
 
 
 def test_context(helpers):
@@ -470,6 +692,19 @@ def test_context(helpers):
     assert jsonld["@context"] == [base_context, wfrun_ctx, {k: v}]
 
 
+@pytest.mark.parametrize("chunk_size", [1, 100, 8192])
+def test_metadata_stream(test_data_dir, chunk_size):
+    crate = ROCrate(test_data_dir / "ro-crate-galaxy-sortchangecase")
+    crate.metadata.extra_terms["runsOn"] = "https://w3id.org/ro/terms/test#runsOn"
+    crate.root_dataset["description"] = "multi\nline, non-ASCII (\u00e8) and \"quoted\""
+    expected = json.dumps(crate.metadata.generate(), indent=4, sort_keys=True).encode("utf-8")
+    chunks = [chunk for _, chunk in crate.metadata.stream(chunk_size=chunk_size)]
+    assert b"".join(chunks) == expected
+    if chunk_size < len(expected):
+        assert len(chunks) > 1
+        assert all(len(_) >= chunk_size for _ in chunks[:-1])
+
+
 def test_add_no_duplicates(test_data_dir, tmpdir):
     source = test_data_dir / "sample_file.txt"
     crate = ROCrate()
@@ -20,6 +20,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import gc
 import json
 import pytest
 import shutil
@@ -27,6 +28,7 @@ import uuid
 import zipfile
 from pathlib import Path
 
+from rocrate.metadata import iter_graph
 from rocrate.rocrate import ROCrate, Subcrate
 from rocrate.model import DataEntity, ContextEntity, File, Dataset
 
@@ -239,6 +241,164 @@ def test_crate_with_subcrates(test_data_dir):
     assert subcrate._crate is nested_crate
 
 
+@pytest.mark.parametrize("to_zip", [False, True])
+def test_zip_in_place(test_data_dir, tmpdir, helpers, monkeypatch, to_zip):
+    crate_dir = test_data_dir / 'read_crate'
+    zip_source = shutil.make_archive(tmpdir / "read_crate.crate", "zip", crate_dir)
+
+    def no_extract(*args, **kwargs):
+        raise AssertionError("zip archive should not be extracted")
+
+    monkeypatch.setattr(zipfile.ZipFile, "extractall", no_extract)
+    crate = ROCrate(zip_source, extract_zip=False)
+    monkeypatch.undo()
+    assert isinstance(crate.source, zipfile.Path)
+    assert crate.version == "1.2"
+    main_wf = crate.dereference('test_galaxy_wf.ga')
+    assert isinstance(main_wf.source, zipfile.Path)
+    assert set(main_wf.type) == helpers.WORKFLOW_TYPES
+    with open(crate_dir / main_wf.id, "rb") as f:
+        assert b"".join(_[1] for _ in main_wf.stream()) == f.read()
+
+    out_path = tmpdir / 'crate_read_out'
+    if to_zip:
+        zip_path = tmpdir / 'ro_crate_out.zip'
+        crate.write_zip(zip_path)
+        with zipfile.ZipFile(zip_path, "r") as zf:
+            zf.extractall(out_path)
+    else:
+        crate.write(out_path)
+    json_entities = helpers.read_json_entities(out_path)
+    helpers.check_crate(json_entities, data_entity_ids=[main_wf.id])
+    for rel in (
+        "test_galaxy_wf.ga",
+        "abstract_wf.cwl",
+        "with space.txt",
+        "a b/c d.txt",
+        "examples/README.txt",
+        "test/test-metadata.json",
+        helpers.LEGACY_METADATA_FILE_NAME,
+        helpers.PREVIEW_FILE_NAME,
+    ):
+        with open(crate_dir / rel, "rb") as f1, open(out_path / rel, "rb") as f2:
+            assert f1.read() == f2.read()
+
+
+def test_lazy(test_data_dir, tmpdir, helpers):
+    crate_dir = test_data_dir / 'read_crate'
+    crate = ROCrate(crate_dir, lazy=True)
+    pending = crate._ROCrate__lazy_keys
+    n_pending = len(pending)
+    assert n_pending > 0
+    assert "#joe" in crate
+    assert len(pending) == n_pending
+    joe = crate.dereference("#joe")
+    assert isinstance(joe, ContextEntity)
+    assert joe["name"] == "Joe Bloggs"
+    assert len(pending) == n_pending - 1
+    assert crate.dereference("#joe") is joe
+    main_wf = crate.mainEntity
+    assert main_wf.id == "test_galaxy_wf.ga"
+    assert len(pending) == n_pending - 2
+
+    eager_crate = ROCrate(crate_dir)
+    assert [_.id for _ in crate.data_entities] == [_.id for _ in eager_crate.data_entities]
+    assert not pending
+    assert [_.id for _ in crate.get_entities()] == [_.id for _ in eager_crate.get_entities()]
+    for e in crate.get_entities():
+        assert type(e) is type(eager_crate.dereference(e.id))
+        assert e.properties() == eager_crate.dereference(e.id).properties()
+
+    out_path = tmpdir / 'crate_read_out'
+    ROCrate(crate_dir, lazy=True).write(out_path)
+    eager_out_path = tmpdir / 'crate_read_out_eager'
+    eager_crate.write(eager_out_path)
+    json_entities = helpers.read_json_entities(out_path)
+    eager_json_entities = helpers.read_json_entities(eager_out_path)
+    del json_entities["./"]["datePublished"], eager_json_entities["./"]["datePublished"]
+    assert json_entities == eager_json_entities
+
+
+@pytest.mark.parametrize("lazy", [False, True])
+def test_incremental_read(test_data_dir, tmpdir, monkeypatch, lazy):
+    calls = []
+
+    def counting_iter_graph(*args, **kwargs):
+        calls.append(args)
+        return iter_graph(*args, **kwargs)
+
+    monkeypatch.setattr("rocrate.metadata.iter_graph", counting_iter_graph)
+    crate_dir = test_data_dir / 'read_crate'
+    eager_crate = ROCrate(crate_dir)
+    assert not calls
+    crate = ROCrate(crate_dir, lazy=lazy, incremental_read=True)
+    assert len(calls) == 1
+    assert [_.id for _ in crate.get_entities()] == [_.id for _ in eager_crate.get_entities()]
+    for e in crate.get_entities():
+        assert type(e) is type(eager_crate.dereference(e.id))
+        assert e.properties() == eager_crate.dereference(e.id).properties()
+    # from a zip archive, without extracting it
+    zip_path = tmpdir / "crate.zip"
+    eager_crate.write_zip(zip_path)
+    with ROCrate(zip_path, extract_zip=False, lazy=lazy, incremental_read=True) as zip_crate:
+        assert len(calls) == 2
+        assert [_.id for _ in zip_crate.get_entities()] == [_.id for _ in eager_crate.get_entities()]
+
+
+def test_lazy_ids(test_data_dir, tmpdir, helpers):
+    crate_dir = tmpdir / "crate"
+    shutil.copytree(test_data_dir / "crate_with_subcrates", crate_dir)
+    (crate_dir / "data").mkdir()
+    metadata_path = crate_dir / helpers.METADATA_FILE_NAME
+    metadata = json.loads(metadata_path.read_text())
+    entities = {_["@id"]: _ for _ in metadata["@graph"]}
+    # ids that do not follow the format of the corresponding entity class
+    entities["subcrate/"]["@id"] = "subcrate"
+    metadata["@graph"].append({"@id": "data", "@type": "Dataset"})
+    metadata["@graph"].append({"@id": "http://example.org/dir", "@type": "Dataset"})
+    entities["./"]["hasPart"] = [
+        {"@id": "file.txt"}, {"@id": "subcrate"}, {"@id": "subcrate2/"}, {"@id": "data"},
+        {"@id": "http://example.org/dir"},
+    ]
+    metadata_path.write_text(json.dumps(metadata))
+    ids = ["file.txt", "subcrate/", "subcrate2/", "data/", "http://example.org/dir/"]
+
+    out_paths = {}
+    for lazy in False, True:
+        crate = ROCrate(crate_dir, load_subcrates=True, lazy=lazy)
+        assert [_["@id"] for _ in crate.root_dataset.properties()["hasPart"]] == ids
+        out_paths[lazy] = tmpdir / f"out_{lazy}"
+        crate.write(out_paths[lazy])
+        assert [_.id for _ in crate.data_entities] == ids
+        assert crate.dereference("data/").id == "data/"
+    json_entities, lazy_json_entities = (helpers.read_json_entities(out_paths[_]) for _ in (False, True))
+    del json_entities["./"]["datePublished"], lazy_json_entities["./"]["datePublished"]
+    assert lazy_json_entities == json_entities
+
+
+def test_lazy_subcrates(test_data_dir):
+    crate = ROCrate(test_data_dir / "crate_with_subcrates", load_subcrates=True, lazy=True)
+    assert isinstance(crate.get("subcrate/subsubcrate/deepfile.txt"), File)
+    assert len(crate.subcrate_entities) == 2
+    assert crate._ROCrate__lazy_keys
+
+
+def test_zip_in_place_close(test_data_dir, tmpdir):
+    zip_source = shutil.make_archive(tmpdir / "read_crate.crate", "zip", test_data_dir / "read_crate")
+    with ROCrate(zip_source, extract_zip=False) as crate:
+        zf = crate.source.root
+        assert zf.fp is not None
+    assert zf.fp is None
+    crate.close()  # no-op if already closed
+    ROCrate(test_data_dir / "read_crate").close()  # no-op if not zipped in place
+
+    crate = ROCrate(zip_source, extract_zip=False)
+    zf = crate.source.root
+    del crate
+    gc.collect()
+    assert zf.fp is None
+
+
 @pytest.mark.parametrize("override", [False, True])
 def test_init(test_data_dir, tmpdir, helpers, override):
     crate_dir = test_data_dir / "ro-crate-galaxy-sortchangecase"
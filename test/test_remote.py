@@ -0,0 +1,252 @@
+# Copyright 2019-2026 The University of Manchester, UK
+# Copyright 2020-2026 Vlaams Instituut voor Biotechnologie (VIB), BE
+# Copyright 2020-2026 Barcelona Supercomputing Center (BSC), ES
+# Copyright 2020-2026 Center for Advanced Studies, Research and Development in Sardinia (CRS4), IT
+# Copyright 2022-2026 École Polytechnique Fédérale de Lausanne, CH
+# Copyright 2024-2026 Data Centre, SciLifeLab, SE
+# Copyright 2024-2026 National Institute of Informatics (NII), JP
+# Copyright 2025-2026 Senckenberg Society for Nature Research (SGN), DE
+# Copyright 2025-2026 European Molecular Biology Laboratory (EMBL), Heidelberg, DE
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import random
+import re
+import threading
+import time
+
+import pytest
+import requests
+from urllib.error import HTTPError
+from rocrate.remote import ContentChanged, Downloader, Prefetcher, iter_url, new_session
+from rocrate.remote_cache import RemoteCache
+
+
+def test_prefetcher():
+    lock = threading.Lock()
+    running = set()
+    max_running = 0
+    thread_ids = set()
+
+    def stream(i):
+        nonlocal max_running
+        thread_ids.add(threading.get_ident())
+        if i % 3 == 0:
+            # local: nothing is buffered
+            yield f"{i}", str(i).encode()
+            return
+        with lock:
+            running.add(i)
+            max_running = max(max_running, len(running))
+        time.sleep(random.random() / 100)
+        for j in range(i):
+            yield f"{i}", bytes(1000)
+        yield f"{i}/x", b""
+        with lock:
+            running.discard(i)
+
+    def is_remote(i):
+        return i % 3 != 0
+
+    expected = [(item, list(stream(item))) for item in range(20)]
+    thread_ids.clear()
+    with Prefetcher(4, max_memory=5000) as prefetcher:
+        got = [(item, list(s)) for item, s in prefetcher.map(range(20), stream, is_remote, chunk_size=3000)]
+    # same items, possibly in different chunks
+    assert [_[0] for _ in got] == [_[0] for _ in expected]
+    for (_, exp_chunks), (_, chunks) in zip(expected, got):
+        assert [(p, c) for p, c in exp_chunks if not c] == [(p, c) for p, c in chunks if not c]
+        assert b"".join(c for _, c in exp_chunks) == b"".join(c for _, c in chunks)
+        assert {p for p, _ in exp_chunks} == {p for p, _ in chunks}
+        assert all(len(c) <= 3000 for _, c in chunks)
+    assert 1 < max_running <= 4
+    assert len(thread_ids) > 1
+
+
+def test_prefetcher_errors():
+
+    def stream(i):
+        if i == 3:
+            raise RuntimeError("boom")
+        yield str(i), b"foo"
+
+    with Prefetcher(2) as prefetcher:
+        got = []
+        with pytest.raises(RuntimeError):
+            for i, s in prefetcher.map(range(6), stream, lambda i: True):
+                got.extend(s)
+    assert got == [("0", b"foo"), ("1", b"foo"), ("2", b"foo")]
+
+    # early stop: pending downloads are cancelled, running ones are stopped
+    started, completed = [], []
+
+    def slow_stream(i):
+        started.append(i)
+        for _ in range(100):
+            time.sleep(0.01)
+            yield str(i), b"foo"
+        completed.append(i)
+
+    with Prefetcher(2) as prefetcher:
+        for i, s in prefetcher.map(range(10), slow_stream, lambda i: True):
+            break
+    # the workers have been joined when the prefetcher is closed
+    assert 0 < len(started) <= 3
+    assert not completed
+
+    with pytest.raises(ValueError):
+        Prefetcher(0)
+
+
+def test_remote_cache(tmpdir, http_server):
+    for name in "abcd":
+        (http_server.root / name).write_bytes(name.encode() * 10000)
+    (http_server.root / "a2").write_bytes(b"a" * 10000)
+    session = new_session()
+    cache = RemoteCache(tmpdir / "cache", max_size=35000, max_age=None)
+
+    def fetch(name):
+        return b"".join(iter_url(session, f"{http_server.url}/{name}", chunk_size=3000, cache=cache))
+
+    assert fetch("a") == b"a" * 10000
+    assert len(http_server.requests) == 1
+    assert fetch("a") == b"a" * 10000
+    assert len(http_server.requests) == 1
+    assert cache.stats["hits"] == 1 and cache.stats["misses"] == 1
+    assert cache.stats["hit_bytes"] == cache.stats["fetched_bytes"] == 10000
+    # same content, different url: stored once
+    assert fetch("a2") == b"a" * 10000
+    assert cache.size == 10000
+    # the cache is persistent
+    cache = RemoteCache(tmpdir / "cache", max_size=35000, max_age=None)
+    assert cache.size == 10000
+    record = cache.get(f"{http_server.url}/a")
+    assert record["size"] == 10000
+    assert record["last_modified"] == cache.date_published(record)
+    assert fetch("a") == b"a" * 10000
+    assert len(http_server.requests) == 2
+
+    # partial downloads are not stored
+    stream = iter_url(session, f"{http_server.url}/b", chunk_size=3000, cache=cache)
+    next(stream)
+    stream.close()
+    assert cache.get(f"{http_server.url}/b") is None
+
+    # least recently used content is evicted
+    for name in "bcd":
+        time.sleep(0.01)
+        assert fetch(name) == name.encode() * 10000
+    assert cache.size <= 35000
+    assert cache.stats["evicted_bytes"] == 10000
+    assert cache.get(f"{http_server.url}/a") is None
+    assert cache.get(f"{http_server.url}/b") is not None
+    cache.evict()
+    assert cache.size == 0
+    assert cache.get(f"{http_server.url}/b") is None
+
+    # revalidation
+    cache = RemoteCache(tmpdir / "cache", max_age=0)
+    fetch("a")
+    n_requests = len(http_server.requests)
+    assert fetch("a") == b"a" * 10000
+    assert len(http_server.requests) == n_requests + 1
+    assert "If-Modified-Since" in http_server.requests[-1][2]
+    assert cache.stats["revalidated"] == 1
+    (http_server.root / "a").write_bytes(b"A" * 100)
+    mtime = time.time() + 10
+    os.utime(http_server.root / "a", (mtime, mtime))
+    assert fetch("a") == b"A" * 100
+    assert cache.stats["revalidated"] == 1
+    assert cache.stats["misses"] == 2
+    assert cache.report().startswith("hits: 0 fresh, 1 revalidated")
+
+
+@pytest.mark.parametrize("ranges", [False, True])
+def test_downloader(http_server, ranges):
+    data = random.Random(42).randbytes(100000)
+    (http_server.root / "data.bin").write_bytes(data)
+    url = f"{http_server.url}/data.bin"
+    session = new_session()
+    downloader = Downloader(backoff=0)
+    http_server.ranges = ranges
+
+    # connection lost during the download
+    http_server.failures, http_server.fail_after = 2, 30000
+    assert b"".join(downloader.iter(session, url, chunk_size=4096)) == data
+    gets = [_ for _ in http_server.requests if _[0] == "GET"]
+    assert len(gets) == 3
+    assert "Range" not in gets[0][2]
+    # resumed from the last chunk received
+    starts = [int(re.fullmatch(r"bytes=(\d+)-99999", _[2]["Range"])[1]) for _ in gets[1:]]
+    if ranges:
+        assert 0 < starts[0] <= 30000 < starts[1] <= 60000
+    else:
+        # the content is sent from the start, and cut again after 30000 bytes
+        assert 0 < starts[0] == starts[1] <= 30000
+    assert gets[2][2]["If-Range"].startswith('"')
+
+    # errors that are worth a retry
+    http_server.errors = 2
+    assert b"".join(downloader.iter(session, url)) == data
+    http_server.errors = 3
+    with pytest.raises(requests.HTTPError):
+        b"".join(Downloader(retries=2, backoff=0).iter(session, url))
+    http_server.errors = 1
+    with pytest.raises(HTTPError):
+        b"".join(iter_url(session, url, downloader=Downloader(retries=0)))
+    http_server.errors = 0
+    # and errors that are not
+    n_requests = len(http_server.requests)
+    with pytest.raises(requests.HTTPError):
+        b"".join(downloader.iter(session, f"{http_server.url}/missing.bin"))
+    assert len(http_server.requests) == n_requests + 1
+    http_server.failures = 1
+    with pytest.raises(requests.RequestException):
+        b"".join(Downloader(retries=0).iter(session, url))
+
+    # content changed before resuming
+    class ChangingDownloader(Downloader):
+        def _retry(self, attempt, error):
+            (http_server.root / "data.bin").write_bytes(data[::-1])
+            super()._retry(attempt, error)
+
+    http_server.failures = 1
+    with pytest.raises(ContentChanged if ranges else requests.RequestException):
+        b"".join(ChangingDownloader(backoff=0).iter(session, url))
+
+
+def test_downloader_parallel(http_server):
+    data = random.Random(42).randbytes(95000)
+    (http_server.root / "data.bin").write_bytes(data)
+    url = f"{http_server.url}/data.bin"
+    session = new_session()
+    downloader = Downloader(backoff=0, parallel=4, part_size=10000, parallel_memory=20000)
+    http_server.failures, http_server.fail_after = 3, 5000
+    # no range support: single download
+    assert b"".join(downloader.iter(session, url)) == data
+    assert len(http_server.requests) == 4
+    http_server.requests.clear()
+    http_server.ranges = True
+    http_server.failures = 3
+    chunks = list(downloader.iter(session, url, chunk_size=3000))
+    assert b"".join(chunks) == data
+    assert max(len(_) for _ in chunks) <= 3000
+    ranges = sorted(_[2]["Range"] for _ in http_server.requests if "Range" in _[2])
+    # 10 parts + 2 resumed (the first failure is for the initial request)
+    assert len(ranges) == 12
+    assert "bytes=90000-94999" in ranges
+    # small files are downloaded as a whole
+    http_server.requests.clear()
+    assert b"".join(Downloader(parallel=4, part_size=100000).iter(session, url)) == data
+    assert len(http_server.requests) == 1
@@ -20,9 +20,13 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import asyncio
+import os
+import shutil
+
 import pytest
 
-from rocrate.utils import subclasses, get_norm_value, is_url
+from rocrate.utils import subclasses, get_norm_value, is_url, copy_file, scan_tree, walk, iterate_in_thread, LINK_MODES
 
 
 class Pet:
@@ -66,3 +70,97 @@ def test_is_url():
     assert not is_url("/etc/")
     assert not is_url("/etc")
     assert not is_url("/")
+
+
+@pytest.mark.parametrize("link_mode", LINK_MODES)
+def test_copy_file(tmpdir, link_mode):
+    src, dst = tmpdir / "src.txt", tmpdir / "dst.txt"
+    src.write_text("foo")
+    copy_file(src, dst, link_mode=link_mode)
+    assert dst.read_text() == "foo"
+    assert dst.is_symlink() is (link_mode == "symlink")
+    if link_mode in ("hardlink", "symlink"):
+        assert dst.samefile(src)
+    else:
+        assert not dst.samefile(src)
+    # overwriting a link must not modify the source
+    other = tmpdir / "other.txt"
+    other.write_text("bar")
+    copy_file(other, dst, link_mode=link_mode)
+    assert dst.read_text() == "bar"
+    assert src.read_text() == "foo"
+    with pytest.raises(ValueError):
+        copy_file(src, dst, link_mode="foo")
+
+
+def test_copy_file_in_place(tmpdir):
+    src, dst = tmpdir / "src.txt", tmpdir / "dst.txt"
+    src.write_text("foo")
+    dst.write_text("bar")
+    dst.chmod(0o600)
+    dst_link = tmpdir / "dst_link.txt"
+    os.link(dst, dst_link)
+    ino = dst.stat().st_ino
+    copy_file(src, dst, copy_function=shutil.copyfile)
+    # the existing file is overwritten, as with a plain copy
+    assert dst.stat().st_ino == ino
+    assert dst_link.read_text() == "foo"
+    assert dst.stat().st_mode & 0o777 == 0o600
+
+
+def test_copy_file_fallback(tmpdir, monkeypatch):
+    def fail(*args):
+        raise OSError("not supported")
+    monkeypatch.setattr(os, "link", fail)
+    src, dst = tmpdir / "src.txt", tmpdir / "dst.txt"
+    src.write_text("foo")
+    copy_file(src, dst, link_mode="hardlink")
+    assert dst.read_text() == "foo"
+    assert not dst.samefile(src)
+
+
+def test_scan_tree(tmpdir):
+    top = tmpdir / "top"
+    for rel in "a/b/c.txt", "a/d.txt", "e.txt", "x/f.txt", "a/x/g.txt":
+        (top / rel).parent.mkdir(parents=True, exist_ok=True)
+        (top / rel).touch()
+    (top / "h").mkdir()
+    os.symlink(top / "a", top / "link")
+    entries = list(scan_tree(top, exclude=["x"]))
+    rel_paths = [rel for rel, _ in entries]
+    assert sorted(rel_paths) == ["a", "a/b", "a/b/c.txt", "a/d.txt", "e.txt", "h", "link"]
+    # directories come before their contents
+    assert rel_paths.index("a") < rel_paths.index("a/b") < rel_paths.index("a/b/c.txt")
+    assert {rel for rel, entry in entries if entry.is_dir()} == {"a", "a/b", "h", "link"}
+    # same files as walk
+    walked = set()
+    for root, dirs, files in walk(top, exclude=["x"]):
+        walked.update(os.path.relpath(os.path.join(root, _), top).replace(os.sep, "/") for _ in files)
+    assert walked == {rel for rel, entry in entries if not entry.is_dir()}
+    assert list(scan_tree(tmpdir / "missing")) == []
+
+
+def test_iterate_in_thread():
+    closed = []
+
+    def gen(n):
+        try:
+            for i in range(n):
+                yield i
+        finally:
+            closed.append(n)
+
+    async def main():
+        items = [_ async for _ in iterate_in_thread(gen(50), batch_size=8)]
+        async for i in iterate_in_thread(gen(100), batch_size=8):
+            if i == 20:
+                break
+        return items
+
+    assert asyncio.run(main()) == list(range(50))
+    assert closed == [50, 100]
+    assert asyncio.run(_collect(iterate_in_thread([1, 2, 3]))) == [1, 2, 3]
+
+
+async def _collect(aiterable):
+    return [_ async for _ in aiterable]
@@ -20,6 +20,8 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import asyncio
+import hashlib
 import io
 import json
 import pytest
@@ -29,10 +31,14 @@ import uuid
 import sys
 import zipfile
 from itertools import product
+from pathlib import Path
 from urllib.error import URLError
 
 from rocrate.model import Dataset, Person
-from rocrate.rocrate import ROCrate
+from rocrate.remote import Downloader
+from rocrate.rocrate import ROCrate, Subcrate, WriteError
+from rocrate.utils import copy_file
+from rocrate.zip_writer import CompressionPolicy
 
 
 @pytest.mark.parametrize("gen_preview,to_zip", [(False, False), (False, True), (True, False), (True, True)])
@@ -177,6 +183,274 @@ def test_remote_uri(tmpdir, helpers, fetch_remote, validate_url, to_zip):
             assert "sdDatePublished" in props
 
 
+def test_http_session(tmpdir, http_server):
+    n = 20
+    (http_server.root / "dir").mkdir()
+    for i in range(n):
+        (http_server.root / f"{i}.txt").write_text(f"file {i}\n")
+        (http_server.root / "dir" / f"{i}.txt").write_text(f"part {i}\n")
+    crate = ROCrate()
+    for i in range(n):
+        crate.add_file(f"{http_server.url}/{i}.txt", f"files/{i}.txt", fetch_remote=True, validate_url=True)
+    crate.add_dataset(f"{http_server.url}/dir/", "dir/", fetch_remote=True, properties={
+        "hasPart": [{"@id": f"{i}.txt"} for i in range(n)]
+    })
+    crate.add_dataset(f"{http_server.url}/dir/", validate_url=True)
+
+    out_path = tmpdir / "ro_crate_out"
+    crate.write(out_path)
+    for i in range(n):
+        assert (out_path / "files" / f"{i}.txt").read_text() == f"file {i}\n"
+        assert (out_path / "dir" / f"{i}.txt").read_text() == f"part {i}\n"
+    assert crate.dereference("files/0.txt")["contentSize"] == "7"
+    assert "sdDatePublished" in crate.dereference(f"{http_server.url}/dir/")
+    # 2n GET + n HEAD + 1 HEAD, all on the same connection
+    assert len(http_server.requests) == 3 * n + 1
+    assert http_server.connections == 1
+
+    with zipfile.ZipFile(io.BytesIO(b"".join(crate.stream_zip()))) as zf:
+        assert zf.read("dir/1.txt") == b"part 1\n"
+    assert http_server.connections == 1
+
+    # user-provided session
+    session = requests.Session()
+    session.headers["X-Test"] = "foo"
+    crate = ROCrate(http_session=session)
+    assert crate.http_session is session
+    crate.add_file(f"{http_server.url}/0.txt", fetch_remote=True)
+    crate.write(tmpdir / "ro_crate_out_2")
+    assert http_server.requests[-1][2]["X-Test"] == "foo"
+
+    # errors are raised as with urlopen
+    crate = ROCrate()
+    crate.add_file(f"{http_server.url}/{uuid.uuid4().hex}", "missing.txt", fetch_remote=True)
+    with pytest.raises(URLError):
+        crate.write(tmpdir / "ro_crate_out_3")
+
+
+def test_remote_cache(tmpdir, http_server):
+    n = 5
+    (http_server.root / "dir").mkdir()
+    for i in range(n):
+        (http_server.root / f"{i}.txt").write_text(f"file {i}\n")
+        (http_server.root / "dir" / f"{i}.txt").write_text(f"part {i}\n")
+    cache_dir = tmpdir / "cache"
+
+    def make_crate():
+        crate = ROCrate(remote_cache=cache_dir)
+        for i in range(n):
+            crate.add_file(f"{http_server.url}/{i}.txt", f"files/{i}.txt", fetch_remote=True, validate_url=True)
+        crate.add_dataset(f"{http_server.url}/dir/", "dir/", fetch_remote=True, properties={
+            "hasPart": [{"@id": f"{i}.txt"} for i in range(n)]
+        })
+        crate.add_file(f"{http_server.url}/0.txt", validate_url=True)
+        return crate
+
+    crate = make_crate()
+    crate.write(tmpdir / "ro_crate_out_1")
+    # n HEAD + 2n GET; the validate_url only file is already in the cache
+    assert len(http_server.requests) == 3 * n
+    assert crate.remote_cache.stats["misses"] == 2 * n
+
+    crate = make_crate()
+    crate.write(tmpdir / "ro_crate_out_2")
+    with zipfile.ZipFile(io.BytesIO(b"".join(crate.stream_zip(prefetch=2)))) as zf:
+        assert zf.read("dir/1.txt") == b"part 1\n"
+    assert len(http_server.requests) == 3 * n
+    assert crate.remote_cache.stats["hits"] == 4 * n
+    assert crate.remote_cache.stats["misses"] == 0
+    for i in range(n):
+        assert (tmpdir / "ro_crate_out_2" / "files" / f"{i}.txt").read_text() == f"file {i}\n"
+        assert (tmpdir / "ro_crate_out_2" / "dir" / f"{i}.txt").read_text() == f"part {i}\n"
+    assert crate.dereference("files/0.txt")["contentSize"] == "7"
+    remote_file = crate.dereference(f"{http_server.url}/0.txt")
+    assert remote_file["contentSize"] == "7"
+    assert remote_file["encodingFormat"] == "text/plain"
+    assert remote_file["sdDatePublished"] == make_crate().remote_cache.get(f"{http_server.url}/0.txt")["last_modified"]
+
+
+def test_remote_cache_properties(tmpdir, http_server):
+    (http_server.root / "data.txt").write_text("hello\n")
+    cache_dir = tmpdir / "cache"
+
+    def make_crate():
+        crate = ROCrate(remote_cache=cache_dir)
+        crate.add_file(f"{http_server.url}/data.txt", "data.txt", fetch_remote=True)
+        return crate
+
+    # stored in the cache
+    crate = make_crate()
+    crate.write(tmpdir / "ro_crate_out_1")
+    record = crate.remote_cache.get(f"{http_server.url}/data.txt")
+    assert record is not None
+    f = crate.dereference("data.txt")
+    assert f["contentSize"] == "6"
+    assert f["sdDatePublished"] == record["last_modified"]
+    n_requests = len(http_server.requests)
+    # served from the cache
+    crate = make_crate()
+    crate.write(tmpdir / "ro_crate_out_2")
+    assert len(http_server.requests) == n_requests
+    assert crate.remote_cache.stats["hits"] == 1
+    f = crate.dereference("data.txt")
+    assert f["contentSize"] == "6"
+    assert f["sdDatePublished"] == record["last_modified"]
+
+
+def test_validate_url_redirect(tmpdir, http_server):
+    (http_server.root / "data.txt").write_text("hello\n")
+    http_server.redirects["/moved.txt"] = "/data.txt"
+    crate = ROCrate()
+    crate.add_file(f"{http_server.url}/moved.txt", "data.txt", fetch_remote=True, validate_url=True)
+    out_path = tmpdir / "ro_crate_out"
+    crate.write(out_path)
+    assert (out_path / "data.txt").read_text() == "hello\n"
+    f = crate.dereference("data.txt")
+    assert f["contentSize"] == "6"
+    assert f["encodingFormat"] == "text/plain"
+    assert [r[:2] for r in http_server.requests if r[0] == "HEAD"] == [("HEAD", "/moved.txt"), ("HEAD", "/data.txt")]
+
+
+def test_validate_urls(tmpdir, http_server):
+    n = 40
+    (http_server.root / "dir").mkdir()
+    for i in range(n):
+        (http_server.root / f"{i}.txt").write_text("x" * i)
+    local_path = tmpdir / "local.txt"
+    local_path.write_text("foo")
+    crate = ROCrate()
+    for i in range(n):
+        crate.add_file(f"{http_server.url}/{i}.txt")
+    crate.add_file(f"{http_server.url}/0.txt", "copy_of_0.txt", fetch_remote=True)
+    crate.add_file(f"{http_server.url}/missing.txt")
+    crate.add_dataset(f"{http_server.url}/dir/")
+    crate.add_file(f"file://{local_path}", fetch_remote=True)
+    crate.add_file(f"file://{tmpdir / 'missing.txt'}")
+
+    # keep requests in flight long enough to overlap
+    http_server.delay = 0.02
+    report = crate.validate_urls(max_workers=8)
+    # n + missing + dir + 2 file URLs (0.txt is requested once)
+    assert len(report) == n + 4
+    assert len(http_server.requests) == n + 2
+    assert 1 < http_server.max_in_flight <= 8
+    r = report[f"{http_server.url}/0.txt"]
+    assert r["entities"] == [f"{http_server.url}/0.txt", "copy_of_0.txt"]
+    assert r["status"] == 200
+    assert r["error"] is None
+    for i in range(n):
+        url = f"{http_server.url}/{i}.txt"
+        assert report[url]["content_length"] == str(i)
+        f = crate.dereference(url)
+        assert f["contentSize"] == str(i)
+        assert f["encodingFormat"] == "text/plain"
+        assert f["sdDatePublished"] == report[url]["last_modified"]
+    assert "sdDatePublished" not in crate.dereference("copy_of_0.txt")
+    assert report[f"{http_server.url}/missing.txt"]["status"] == 404
+    assert report[f"{http_server.url}/missing.txt"]["error"]
+    assert "contentSize" not in crate.dereference(f"{http_server.url}/missing.txt")
+    assert report[f"{http_server.url}/dir/"]["error"] is None
+    assert "sdDatePublished" in crate.dereference(f"{http_server.url}/dir/")
+    assert report[f"file://{local_path}"]["error"] is None
+    assert report[f"file://{tmpdir / 'missing.txt'}"]["error"]
+
+
+def test_validate_urls_missing_headers(tmpdir, http_server):
+    (http_server.root / "data.txt").write_text("hello\n")
+    local_path = tmpdir / "local.txt"
+    local_path.write_text("foo")
+    crate = ROCrate()
+    properties = {"contentSize": "6", "encodingFormat": "text/plain"}
+    remote = crate.add_file(f"{http_server.url}/data.txt", properties=properties)
+    local = crate.add_file(f"file://{local_path}", properties=properties)
+    http_server.omit_headers = {"Content-Length", "Content-Type"}
+    report = crate.validate_urls()
+    assert report[f"{http_server.url}/data.txt"]["error"] is None
+    assert report[f"{http_server.url}/data.txt"]["content_length"] is None
+    assert report[f"file://{local_path}"]["error"] is None
+    for entity in remote, local:
+        assert entity["contentSize"] == "6"
+        assert entity["encodingFormat"] == "text/plain"
+    assert "sdDatePublished" in remote
+    assert "sdDatePublished" not in local
+    # the same for entities without these properties
+    crate = ROCrate()
+    remote = crate.add_file(f"{http_server.url}/data.txt")
+    local = crate.add_file(f"file://{local_path}")
+    crate.validate_urls()
+    for entity in remote, local:
+        assert "contentSize" not in entity
+        assert "encodingFormat" not in entity
+    assert "sdDatePublished" not in local
+
+
+def test_resumed_download(tmpdir, http_server):
+    data = os.urandom(100000)
+    (http_server.root / "data.bin").write_bytes(data)
+    http_server.ranges = True
+    crate = ROCrate(downloader=Downloader(backoff=0, parallel=2, part_size=30000))
+    crate.add_file(f"{http_server.url}/data.bin", "data.bin", fetch_remote=True, record_size=True)
+    http_server.errors = 1
+    http_server.failures, http_server.fail_after = 3, 20000
+    out_path = tmpdir / "ro_crate_out"
+    crate.write(out_path)
+    assert (out_path / "data.bin").read_bytes() == data
+    assert crate.dereference("data.bin")["contentSize"] == str(len(data))
+    http_server.failures = 2
+    with zipfile.ZipFile(io.BytesIO(b"".join(crate.stream_zip()))) as zf:
+        assert zf.read("data.bin") == data
+
+
+@pytest.mark.parametrize("how", ["write", "write_zip", "stream_zip", "hardlink", "incremental"])
+def test_record_checksums(test_data_dir, tmpdir, http_server, how):
+    local_path = test_data_dir / "sample_file.txt"
+    local_data = local_path.read_bytes()
+    remote_data = os.urandom(10000)
+    (http_server.root / "data.bin").write_bytes(remote_data)
+    crate = ROCrate()
+    checksums = ("sha256", "md5")
+    crate.add_file(local_path, record_checksums=checksums)
+    crate.add_file(io.StringIO("foo"), "foo.txt", record_checksums="sha256")
+    crate.add_file(io.BytesIO(b""), "empty.txt", record_checksums=checksums)
+    crate.add_file(f"{http_server.url}/data.bin", "data.bin", fetch_remote=True, record_checksums=checksums)
+    crate.add_file(f"{http_server.url}/data.bin", record_checksums=checksums)
+    crate.add_file(test_data_dir / "sample_cwl_wf.cwl")
+    out_path = tmpdir / "ro_crate_out"
+    if how == "write_zip":
+        crate.write_zip(tmpdir / "ro_crate_out.zip")
+    elif how == "stream_zip":
+        b"".join(crate.stream_zip())
+    elif how == "incremental":
+        crate.write(out_path, incremental=True)
+        for e in crate.data_entities:
+            for algo in checksums:
+                e._jsonld.pop(algo, None)
+            if isinstance(e.source, io.IOBase):
+                e.source.seek(0)
+        crate.write(out_path, incremental=True)
+    else:
+        crate.write(out_path, link_mode="copy" if how == "write" else how)
+    if how in ("write", "hardlink", "incremental"):
+        metadata = json.loads((out_path / "ro-crate-metadata.json").read_text())
+    else:
+        metadata = crate.metadata.generate()
+    entities = {e["@id"]: e for e in metadata["@graph"]}
+    for algo in checksums:
+        assert entities["sample_file.txt"][algo] == hashlib.new(algo, local_data).hexdigest()
+        assert entities["empty.txt"][algo] == hashlib.new(algo).hexdigest()
+        assert entities["data.bin"][algo] == hashlib.new(algo, remote_data).hexdigest()
+        assert algo not in entities[f"{http_server.url}/data.bin"]
+        assert algo not in entities["sample_cwl_wf.cwl"]
+    assert entities["foo.txt"]["sha256"] == hashlib.sha256(b"foo").hexdigest()
+    assert "md5" not in entities["foo.txt"]
+    with pytest.raises(ValueError):
+        crate.add_file(local_path, record_checksums=["no-such-algorithm"])
+    with pytest.raises(ValueError):
+        Dataset(crate, test_data_dir / "test_add_dir", record_checksums="sha256")
+    with pytest.raises(ValueError):
+        Subcrate(crate, test_data_dir / "test_add_dir", record_checksums="sha256")
+
+
 def test_file_uri(tmpdir):
     f_name = uuid.uuid4().hex
     f_path = (tmpdir / f_name).resolve()
@@ -413,6 +687,73 @@ def test_write_zip_copy_unlisted(test_data_dir, tmpdir):
     assert (out_path / "test" / "test1" / "output_exp.bed").is_file()
 
 
+def test_unlisted_special_names(tmpdir):
+    crate_dir = tmpdir / "crate"
+    names = ["a b.txt", "a%20b.txt", "c:d.txt", " e.txt", "f#g.txt", "h?i.txt", "j;k.txt", "l\tm.txt", "listed.txt"]
+    (crate_dir / "sub").mkdir(parents=True)
+    for name in names:
+        (crate_dir / "sub" / name).write_text(name, "utf-8")
+    crate = ROCrate()
+    crate.add_file(crate_dir / "sub" / "listed.txt", "sub/listed.txt")
+    crate.source = crate_dir
+    for name in names:
+        for rel in f"sub/{name}", f"sub/{name}_":
+            assert crate._is_listed(rel) == (rel in crate)
+    assert crate._is_listed("sub/listed.txt")
+    unlisted = {rel for rel, _ in crate._stream_zip_unlisted()}
+    assert unlisted == {f"sub/{name}" for name in names if name != "listed.txt"}
+    out_path = tmpdir / "ro_crate_out"
+    crate.write(out_path)
+    for name in names:
+        assert (out_path / "sub" / name).read_text("utf-8") == name
+
+
+@pytest.mark.parametrize("n_files", [
+    10000,
+    pytest.param(100000, marks=pytest.mark.slow),
+])
+def test_unlisted_perf(tmpdir, monkeypatch, n_files):
+    """\
+    Before the switch to a single scandir pass with set membership tests,
+    finding the unlisted files took about 30 microseconds per file, growing
+    with the size of the crate (10k: 0.32s, 100k: 2.5s, 300k: 9.1s). Now it
+    takes about 4 microseconds per file (10k: 0.04s, 100k: 0.37s, 300k:
+    1.15s). Rather than the time, which depends on the machine, check that
+    each directory is listed once, that files are not stat'ed and that
+    their ids are not resolved.
+    """
+    crate_dir = Path(tmpdir / "crate")
+    crate = ROCrate()
+    for i in range(n_files):
+        rel = f"d{i // 1000}/f{i}.txt"
+        if i % 1000 == 0:
+            (crate_dir / rel).parent.mkdir(parents=True)
+        open(crate_dir / rel, "wb").close()
+        if i % 10 == 0:
+            crate.add_file(crate_dir / rel, rel)
+    crate.source = crate_dir
+    calls = {"scandir": 0, "stat": 0, "lstat": 0}
+
+    def counting(name):
+        fn = getattr(os, name)
+
+        def wrapper(*args, **kwargs):
+            calls[name] += 1
+            return fn(*args, **kwargs)
+        return wrapper
+
+    for name in calls:
+        monkeypatch.setattr(os, name, counting(name))
+    resolve_id = crate.resolve_id
+    resolved = []
+    monkeypatch.setattr(crate, "resolve_id", lambda id_: resolved.append(id_) or resolve_id(id_))
+    n_unlisted = sum(1 for _ in crate._stream_zip_unlisted())
+    monkeypatch.undo()
+    assert n_unlisted == n_files - n_files // 10
+    assert calls == {"scandir": 1 + (n_files + 999) // 1000, "stat": 0, "lstat": 0}
+    assert not resolved
+
+
 def test_no_zip_in_zip(test_data_dir, tmpdir):
     crate_dir = test_data_dir / 'ro-crate-galaxy-sortchangecase'
     crate = ROCrate(crate_dir)
@@ -504,6 +845,203 @@ def test_stream(test_data_dir, tmpdir):
     assert (extract_path / "test" / "test-metadata.json").is_file()
 
 
+@pytest.mark.parametrize("max_workers", [1, 4])
+def test_stream_zip_parallel(test_data_dir, tmpdir, max_workers):
+    crate = ROCrate(test_data_dir / "read_crate")
+    expected = {}
+    with zipfile.ZipFile(io.BytesIO(b"".join(crate.stream_zip()))) as zf:
+        for info in zf.infolist():
+            expected[info.filename] = zf.read(info)
+    with zipfile.ZipFile(io.BytesIO(b"".join(crate.stream_zip(max_workers=max_workers)))) as zf:
+        assert not zf.testzip()
+        assert {info.filename: zf.read(info) for info in zf.infolist()} == expected
+    out_path = tmpdir / 'ro_crate_out.zip'
+    crate.write_zip(out_path, max_workers=max_workers)
+    with zipfile.ZipFile(out_path, "r") as zf:
+        assert zf.namelist() == list(expected)
+
+
+@pytest.mark.parametrize("max_workers", [None, 2])
+def test_write_zip_compression_policy(test_data_dir, tmpdir, helpers, max_workers):
+    crate = ROCrate()
+    text = (test_data_dir / "sample_file.txt").read_bytes() * 100
+    crate.add_file(io.BytesIO(text), "data.txt")
+    crate.add_file(io.BytesIO(text), "data.txt.gz")
+    crate.add_file(io.BytesIO(text), "image", properties={"encodingFormat": "image/png"})
+    crate.add_file(io.BytesIO(os.urandom(10000)), "random.bin")
+    policy = CompressionPolicy()
+    out_path = tmpdir / 'ro_crate_out.zip'
+    crate.write_zip(out_path, max_workers=max_workers, compression_policy=policy)
+    with zipfile.ZipFile(out_path, "r") as zf:
+        assert not zf.testzip()
+        assert zf.read("data.txt.gz") == text
+        methods = {info.filename: info.compress_type for info in zf.infolist()}
+    assert methods["data.txt"] == methods[helpers.METADATA_FILE_NAME] == zipfile.ZIP_DEFLATED
+    for name in "data.txt.gz", "image", "random.bin":
+        assert methods[name] == zipfile.ZIP_STORED
+    assert policy.stats[zipfile.ZIP_STORED]["members"] == 3
+
+
+def test_stream_zip_range(test_data_dir, tmpdir, helpers):
+    crate = ROCrate()
+    crate.root_dataset["datePublished"] = "2024-01-01T00:00:00+00:00"
+    crate.add_file(test_data_dir / "sample_file.txt")
+    crate.add_file(io.StringIO("Hello, World!"), "test-data/hello.txt")
+    crate.add_dataset(test_data_dir / "test_add_dir", "test_add_dir")
+    plan = crate.zip_plan()
+    data = b"".join(crate.stream_zip(range=(0, None)))
+    assert len(data) == plan.size
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        assert not zf.testzip()
+        names = set(zf.namelist())
+        assert zf.read("test-data/hello.txt") == b"Hello, World!"
+        assert zf.read("sample_file.txt") == (test_data_dir / "sample_file.txt").read_bytes()
+        assert json.loads(zf.read(helpers.METADATA_FILE_NAME)) == crate.metadata.generate()
+    with zipfile.ZipFile(io.BytesIO(b"".join(crate.stream_zip()))) as zf:
+        assert set(zf.namelist()) == names
+    # ranges computed separately from the same crate
+    size = plan.size
+    for start, end in (0, 100), (100, size // 2), (size // 2, size - 1), (size - 1, None):
+        assert b"".join(crate.stream_zip(range=(start, end))) == data[start:end]
+        assert b"".join(crate.stream_zip(range=(start, end), plan=plan)) == data[start:end]
+    crate.add_file("http://example.org/foo.txt", fetch_remote=True)
+    with pytest.raises(ValueError):
+        crate.zip_plan()
+
+
+def test_zip_plan_remote_range(http_server):
+    data = os.urandom(100000)
+    (http_server.root / "data.bin").write_bytes(data)
+    http_server.ranges = True
+    crate = ROCrate()
+    crate.root_dataset["datePublished"] = "2024-01-01T00:00:00+00:00"
+    crate.add_file(f"{http_server.url}/data.bin", "data.bin", fetch_remote=True, properties={
+        "contentSize": str(len(data)),
+    })
+    plan = crate.zip_plan()
+    full = b"".join(crate.stream_zip(range=(0, None), plan=plan))
+    with zipfile.ZipFile(io.BytesIO(full)) as zf:
+        assert zf.read("data.bin") == data
+    start = full.index(data[:1000]) + len(data) // 2
+    del http_server.requests[:]
+    assert b"".join(crate.stream_zip(range=(start, start + 1000), plan=plan)) == full[start:start + 1000]
+    assert [r[2].get("Range") for r in http_server.requests] == [f"bytes={len(data) // 2}-"]
+
+
+def test_zip_plan_record_size(test_data_dir, tmpdir, http_server):
+    data = os.urandom(1000)
+    (http_server.root / "data.bin").write_bytes(data)
+
+    def make_crate(**kwargs):
+        crate = ROCrate()
+        crate.root_dataset["datePublished"] = "2024-01-01T00:00:00+00:00"
+        crate.add_file(test_data_dir / "sample_file.txt", record_size=True, **kwargs)
+        crate.add_file(io.StringIO("Hello, World!"), "hello.txt", record_size=True, **kwargs)
+        return crate
+
+    crate = make_crate()
+    plan = crate.zip_plan()
+    assert crate.dereference("hello.txt")["contentSize"] == "13"
+    data = b"".join(crate.stream_zip(range=(0, None), plan=plan))
+    assert b"".join(make_crate().stream_zip(range=(0, None))) == data
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        metadata = json.loads(zf.read("ro-crate-metadata.json"))
+    sizes = {_["@id"]: _.get("contentSize") for _ in metadata["@graph"]}
+    assert sizes["hello.txt"] == "13"
+    assert sizes["sample_file.txt"] == str((test_data_dir / "sample_file.txt").stat().st_size)
+    with pytest.raises(ValueError):
+        make_crate(record_checksums="sha256").zip_plan()
+    # checksums recorded by a previous write
+    crate = make_crate(record_checksums="sha256")
+    crate.write(tmpdir / "ro_crate_out")
+    crate.zip_plan()
+
+
+def test_stream_zip_prefetch(test_data_dir, tmpdir, http_server):
+    n = 8
+    (http_server.root / "dir").mkdir()
+    for i in range(n):
+        (http_server.root / f"{i}.txt").write_bytes(os.urandom(i * 10000))
+        (http_server.root / "dir" / f"{i}.txt").write_text(f"part {i}\n")
+
+    def make_crate():
+        crate = ROCrate()
+        crate.root_dataset["datePublished"] = "2024-01-01T00:00:00+00:00"
+        crate.add_file(test_data_dir / "sample_file.txt")
+        for i in range(n):
+            crate.add_file(f"{http_server.url}/{i}.txt", f"files/{i}.txt", fetch_remote=True, record_size=True)
+        crate.add_dataset(f"{http_server.url}/dir/", "dir/", fetch_remote=True, properties={
+            "hasPart": [{"@id": f"{i}.txt"} for i in range(n)]
+        })
+        crate.add_file(f"{http_server.url}/0.txt", validate_url=True)
+        return crate
+
+    def read_zip(data):
+        with zipfile.ZipFile(io.BytesIO(data)) as zf:
+            return [(info.filename, zf.read(info)) for info in zf.infolist()]
+
+    # keep requests in flight long enough to overlap
+    http_server.delay = 0.05
+    expected = read_zip(b"".join(make_crate().stream_zip()))
+    assert http_server.max_in_flight == 1
+    http_server.max_in_flight = 0
+    # small buffer to also exercise spooling to disk
+    crate = make_crate()
+    got = read_zip(b"".join(crate.stream_zip(prefetch=4, prefetch_memory=20000)))
+    assert got == expected
+    assert crate.dereference("files/3.txt")["contentSize"] == "30000"
+    assert 1 < http_server.max_in_flight <= 4
+
+    crate = make_crate()
+    out_path = tmpdir / "ro_crate_out.zip"
+    crate.write_zip(out_path, prefetch=2, max_workers=2)
+    with open(out_path, "rb") as f:
+        assert read_zip(f.read()) == expected
+
+    crate.add_file(f"{http_server.url}/{uuid.uuid4().hex}", "missing.txt", fetch_remote=True)
+    with pytest.raises(URLError):
+        crate.write_zip(out_path, prefetch=4)
+
+
+def test_async(test_data_dir, tmpdir, helpers):
+    crate = ROCrate(test_data_dir / "read_crate")
+    expected = {}
+    with zipfile.ZipFile(io.BytesIO(b"".join(crate.stream_zip()))) as zf:
+        for info in zf.infolist():
+            expected[info.filename] = zf.read(info)
+    ticks = 0
+
+    async def ticker(done):
+        nonlocal ticks
+        while not done.is_set():
+            ticks += 1
+            await asyncio.sleep(0)
+
+    async def download():
+        return b"".join([chunk async for chunk in crate.astream_zip(chunk_size=1024)])
+
+    async def main():
+        done = asyncio.Event()
+        tick_task = asyncio.create_task(ticker(done))
+        archives = await asyncio.gather(*[download() for _ in range(4)])
+        done.set()
+        await tick_task
+        f = crate.dereference("test_galaxy_wf.ga")
+        chunks = [_ async for _ in f.astream(chunk_size=100)]
+        await crate.awrite(tmpdir / "ro_crate_out")
+        return archives, chunks
+
+    archives, chunks = asyncio.run(main())
+    for data in archives:
+        with zipfile.ZipFile(io.BytesIO(data)) as zf:
+            assert {info.filename: zf.read(info) for info in zf.infolist()} == expected
+    # the event loop was not blocked while streaming
+    assert ticks > 1
+    assert {path for path, _ in chunks} == {"test_galaxy_wf.ga"}
+    assert b"".join(chunk for _, chunk in chunks) == expected["test_galaxy_wf.ga"]
+    assert (tmpdir / "ro_crate_out" / "test_galaxy_wf.ga").read_bytes() == expected["test_galaxy_wf.ga"]
+
+
 def test_percent_escape(test_data_dir, tmpdir, helpers):
     crate = ROCrate()
     f_path = test_data_dir / "read_crate" / "with space.txt"
@@ -702,6 +1240,182 @@ def test_subcrates_creation(test_data_dir, tmpdir, to_zip):
     assert out_subcrate_crate.get("subsubcrate/setup.cfg") is out_subsubf
 
 
+@pytest.mark.parametrize("max_workers", [1, 4])
+def test_write_parallel(test_data_dir, tmpdir, max_workers):
+    def tree(top):
+        return {p.relative_to(top): p.read_bytes() if p.is_file() else None for p in top.rglob("*")}
+
+    def make_crate():
+        crate = ROCrate()
+        crate.add_tree(source)
+        crate.add_file(test_data_dir / "sample_file.txt", record_size=True)
+        crate.add_file(io.BytesIO(b"foo"), "foo.txt")
+        return crate
+    source = test_data_dir / "read_extra"
+    (source / "ro-crate-metadata.json").unlink()
+    serial_out, parallel_out = tmpdir / "serial_out", tmpdir / "parallel_out"
+    make_crate().write(serial_out)
+    crate = make_crate()
+    crate.write(parallel_out, max_workers=max_workers)
+    assert tree(parallel_out) == tree(serial_out)
+    assert (parallel_out / "foo.txt").read_bytes() == b"foo"
+    assert crate.dereference("sample_file.txt")["contentSize"] == str((test_data_dir / "sample_file.txt").stat().st_size)
+
+    crate = ROCrate(test_data_dir / 'ro-crate-galaxy-sortchangecase')
+    serial_out, parallel_out = tmpdir / "serial_out_2", tmpdir / "parallel_out_2"
+    crate.write(serial_out)
+    crate.write(parallel_out, max_workers=max_workers)
+    assert tree(parallel_out) == tree(serial_out)
+    assert (parallel_out / "test" / "test1" / "input.bed").is_file()
+
+
+def test_write_parallel_errors(test_data_dir, tmpdir, helpers):
+    crate = ROCrate()
+    crate.add_file(test_data_dir / "sample_file.txt")
+    missing = [crate.add_file(test_data_dir / uuid.uuid4().hex) for _ in range(2)]
+    out_path = tmpdir / "ro_crate_out"
+    with pytest.raises(WriteError) as exc_info:
+        crate.write(out_path, max_workers=2)
+    assert [k for k, _ in exc_info.value.errors] == [_.id for _ in missing]
+    assert all(isinstance(e, FileNotFoundError) for _, e in exc_info.value.errors)
+    # other files are written, metadata is not
+    assert (out_path / "sample_file.txt").is_file()
+    assert not (out_path / helpers.METADATA_FILE_NAME).exists()
+
+
+@pytest.mark.parametrize("link_mode", ["copy", "hardlink", "symlink", "auto"])
+def test_write_link_mode(test_data_dir, tmpdir, link_mode):
+    crate_dir = test_data_dir / 'ro-crate-galaxy-sortchangecase'
+    crate = ROCrate(crate_dir)
+    out_path = tmpdir / 'ro_crate_out'
+    crate.write(out_path, link_mode=link_mode)
+    linked = link_mode in ("hardlink", "symlink")
+    for rel in "sort-and-change-case.ga", "test/test1/input.bed":  # listed, unlisted
+        assert (out_path / rel).read_bytes() == (crate_dir / rel).read_bytes()
+        assert (out_path / rel).samefile(crate_dir / rel) is linked
+        assert (out_path / rel).is_symlink() is (link_mode == "symlink")
+    assert not (out_path / "ro-crate-metadata.json").samefile(crate_dir / "ro-crate-metadata.json")
+    with pytest.raises(ValueError):
+        crate.write(out_path, link_mode="foo")
+
+
+def test_write_interleaved(test_data_dir, tmpdir, helpers, monkeypatch):
+    # options of a write must not leak into another write of the same crate
+    # running at the same time (e.g. via awrite)
+    crate_dir = test_data_dir / 'ro-crate-galaxy-sortchangecase'
+    crate = ROCrate(crate_dir)
+    nested = []
+
+    def copy_and_write(*args, **kwargs):
+        if not nested:
+            nested.append(tmpdir / "ro_crate_out_2")
+            crate.write(nested[0])
+        return copy_file(*args, **kwargs)
+
+    monkeypatch.setattr("rocrate.rocrate.copy_file", copy_and_write)
+    out_path = tmpdir / 'ro_crate_out'
+    stats = crate.write(out_path, link_mode="hardlink", incremental=True, metadata_format="compact")
+    assert nested
+    for rel in "sort-and-change-case.ga", "test/test1/input.bed":
+        assert (out_path / rel).samefile(crate_dir / rel)
+        assert not (tmpdir / "ro_crate_out_2" / rel).samefile(crate_dir / rel)
+    assert stats["copied_files"] == len([_ for _ in crate_dir.rglob("*") if _.is_file()])
+    text = (out_path / helpers.METADATA_FILE_NAME).read_text("utf-8")
+    assert "\n" not in text
+    text = (tmpdir / "ro_crate_out_2" / helpers.METADATA_FILE_NAME).read_text("utf-8")
+    assert text == json.dumps(crate.metadata.generate(), indent=4, sort_keys=True)
+
+
+@pytest.mark.parametrize("json_backend", ["json", "orjson"])
+@pytest.mark.parametrize("metadata_format", ["pretty", "compact", "sorted-compact"])
+def test_write_metadata_format(test_data_dir, tmpdir, helpers, metadata_format, json_backend):
+    if json_backend != "json":
+        pytest.importorskip(json_backend)
+    crate_dir = test_data_dir / 'ro-crate-galaxy-sortchangecase'
+    crate = ROCrate(crate_dir, json_backend=json_backend)
+    crate.root_dataset["description"] = "multi\nline, non-ASCII (\u00e8) and \"quoted\""
+    crate.root_dataset["version"] = 0.00001
+    out_path = tmpdir / 'ro_crate_out'
+    crate.write(out_path, metadata_format=metadata_format)
+    text = (out_path / helpers.METADATA_FILE_NAME).read_text("utf-8")
+    pretty_text = json.dumps(crate.metadata.generate(), indent=4, sort_keys=True)
+    if metadata_format == "pretty":
+        assert text == pretty_text
+    else:
+        assert "\n" not in text
+        assert len(text) < len(pretty_text)
+    # same JSON-LD graph
+    assert json.loads(text) == json.loads(pretty_text)
+    if metadata_format == "sorted-compact":
+        def check_sorted(pairs):
+            keys = [k for k, _ in pairs]
+            assert keys == sorted(keys)
+        json.loads(text, object_pairs_hook=check_sorted)
+    crate_2 = ROCrate(out_path)
+    assert crate_2.root_dataset["description"] == crate.root_dataset["description"]
+    # the default format is restored
+    crate.write(tmpdir / 'ro_crate_out_2')
+    assert (tmpdir / 'ro_crate_out_2' / helpers.METADATA_FILE_NAME).read_text("utf-8") == pretty_text
+    with pytest.raises(ValueError):
+        crate.write(out_path, metadata_format="foo")
+
+
+def test_write_incremental(test_data_dir, tmpdir, helpers):
+    crate_dir = test_data_dir / 'ro-crate-galaxy-sortchangecase'
+    crate = ROCrate(crate_dir)
+    out_path = tmpdir / 'ro_crate_out'
+    metadata_path = out_path / helpers.METADATA_FILE_NAME
+    stats = crate.write(out_path, incremental=True)
+    assert stats["skipped_files"] == 0
+    n_files, n_bytes = stats["copied_files"], stats["copied_bytes"]
+    assert n_files == sum(1 for _ in crate_dir.rglob("*") if _.is_file())
+    metadata_mtime = metadata_path.stat().st_mtime_ns
+    stats = crate.write(out_path, incremental=True)
+    assert stats == {"copied_files": 0, "copied_bytes": 0, "skipped_files": n_files, "skipped_bytes": n_bytes}
+    assert metadata_path.stat().st_mtime_ns == metadata_mtime
+    # changed source (listed and unlisted)
+    changed = ["sort-and-change-case.ga", "test/test1/input.bed"]
+    for rel in changed:
+        with open(crate_dir / rel, "a") as f:
+            f.write("\n")
+    stats = crate.write(out_path, incremental=True)
+    assert stats["copied_files"] == 2
+    assert stats["copied_bytes"] == sum((crate_dir / _).stat().st_size for _ in changed)
+    for rel in changed:
+        assert (out_path / rel).read_bytes() == (crate_dir / rel).read_bytes()
+    assert metadata_path.stat().st_mtime_ns == metadata_mtime
+    # changed destination
+    (out_path / "sort-and-change-case.ga").unlink()
+    assert crate.write(out_path, incremental=True)["copied_files"] == 1
+    assert (out_path / "sort-and-change-case.ga").is_file()
+    # changed graph
+    crate.name = "Foo"
+    stats = crate.write(out_path, incremental=True)
+    assert stats["copied_files"] == 1
+    assert helpers.read_json_entities(out_path)["./"]["name"] == "Foo"
+    # the manifest is not part of the crate
+    out_path_2 = tmpdir / 'ro_crate_out_2'
+    ROCrate(out_path).write(out_path_2)
+    assert (out_path / ".ro-crate-write-manifest.json").is_file()
+    assert not (out_path_2 / ".ro-crate-write-manifest.json").exists()
+
+
+@pytest.mark.parametrize("checksum", [False, True])
+def test_write_incremental_checksum(test_data_dir, tmpdir, checksum):
+    crate = ROCrate()
+    source = test_data_dir / "sample_file.txt"
+    crate.add_file(source)
+    out_path = tmpdir / 'ro_crate_out'
+    crate.write(out_path, incremental=True, checksum=checksum)
+    st = source.stat()
+    os.utime(source, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    stats = crate.write(out_path, incremental=True, checksum=checksum)
+    assert stats["copied_files"] == (0 if checksum else 1)
+    # a manifest entry is updated with the new mtime
+    stats = crate.write(out_path, incremental=True, checksum=checksum)
+    assert stats["copied_files"] == 0
+
+
 @pytest.mark.parametrize("version", ["1.0", "1.1", "1.2"])
 def test_write_version(tmpdir, helpers, version):
     basename = helpers.LEGACY_METADATA_FILE_NAME if version == "1.0" else helpers.METADATA_FILE_NAME
@@ -0,0 +1,200 @@
+# Copyright 2019-2026 The University of Manchester, UK
+# Copyright 2020-2026 Vlaams Instituut voor Biotechnologie (VIB), BE
+# Copyright 2020-2026 Barcelona Supercomputing Center (BSC), ES
+# Copyright 2020-2026 Center for Advanced Studies, Research and Development in Sardinia (CRS4), IT
+# Copyright 2022-2026 École Polytechnique Fédérale de Lausanne, CH
+# Copyright 2024-2026 Data Centre, SciLifeLab, SE
+# Copyright 2024-2026 National Institute of Informatics (NII), JP
+# Copyright 2025-2026 Senckenberg Society for Nature Research (SGN), DE
+# Copyright 2025-2026 European Molecular Biology Laboratory (EMBL), Heidelberg, DE
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import io
+import random
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from rocrate.memory_buffer import MemoryBuffer
+from rocrate.zip_writer import CompressionPolicy, ZipWriter, ParallelZipWriter, ZipPlan
+
+
+def _members():
+    rng = random.Random(42)
+    words = [f"w{rng.randrange(1000)}".encode() for _ in range(500)]
+    text = b" ".join(rng.choice(words) for _ in range(20000))
+    return {
+        "empty.txt": b"",
+        "small.txt": b"foo",
+        "text.txt": text,
+        "random.bin": rng.randbytes(50000),
+        "dir/text_2.txt": text[::-1],
+    }
+
+
+@pytest.mark.parametrize("max_workers", [None, 1, 3])
+def test_zip_writer(max_workers):
+    members = _members()
+    out = io.BytesIO()
+    with MemoryBuffer() as buffer:
+        with zipfile.ZipFile(buffer, mode="w", compression=zipfile.ZIP_DEFLATED) as archive:
+            if max_workers is None:
+                writer = ZipWriter(archive)
+            else:
+                writer = ParallelZipWriter(archive, max_workers=max_workers, block_size=4096)
+            with writer:
+                for name, data in members.items():
+                    # uneven chunks, also crossing block boundaries
+                    writer.write(name, data[:1000])
+                    for i in range(1000, len(data), 3000):
+                        writer.write(name, data[i:i + 3000])
+                    out.write(buffer.read())
+                writer.close()
+        out.write(buffer.read())
+    with zipfile.ZipFile(out) as zf:
+        assert zf.testzip() is None
+        assert zf.namelist() == list(members)
+        for name, data in members.items():
+            assert zf.read(name) == data
+            info = zf.getinfo(name)
+            assert info.compress_type == zipfile.ZIP_DEFLATED
+            if name == "text.txt":
+                assert info.compress_size < info.file_size / 2
+
+
+@pytest.mark.parametrize("max_workers", [None, 2])
+def test_zip_writer_error(max_workers):
+    # the original error is not masked by the archive's close
+    with pytest.raises(RuntimeError, match="boom"):
+        with zipfile.ZipFile(io.BytesIO(), mode="w", compression=zipfile.ZIP_DEFLATED) as archive:
+            if max_workers is None:
+                writer = ZipWriter(archive)
+            else:
+                writer = ParallelZipWriter(archive, max_workers=max_workers)
+            with writer:
+                writer.write("foo.txt", b"foo")
+                writer.write("bar.txt", b"bar")
+                raise RuntimeError("boom")
+
+
+@pytest.mark.parametrize("max_workers", [None, 2])
+def test_compression_policy(max_workers):
+    members = _members()
+    members["random.gz"] = members["random.bin"]
+    members["image"] = b"x" * 10000
+    members["text.gz"] = members["text.txt"]  # stored, even if compressible
+    policy = CompressionPolicy()
+    out = io.BytesIO()
+    with MemoryBuffer() as buffer:
+        with zipfile.ZipFile(buffer, mode="w", compression=zipfile.ZIP_DEFLATED) as archive:
+            if max_workers is None:
+                writer = ZipWriter(archive, policy=policy)
+            else:
+                writer = ParallelZipWriter(archive, max_workers=max_workers, block_size=4096, policy=policy)
+            with writer:
+                for name, data in members.items():
+                    encoding_formats = ("image/png",) if name == "image" else ()
+                    for i in range(0, max(len(data), 1), 5000):
+                        writer.write(name, data[i:i + 5000], encoding_formats)
+                writer.close()
+        out.write(buffer.read())
+    stored = {"random.bin", "random.gz", "image", "text.gz", "small.txt", "empty.txt"}
+    with zipfile.ZipFile(out) as zf:
+        assert zf.testzip() is None
+        for name, data in members.items():
+            assert zf.read(name) == data
+            expected = zipfile.ZIP_STORED if name in stored else zipfile.ZIP_DEFLATED
+            assert zf.getinfo(name).compress_type == expected, name
+    stats = policy.stats
+    assert set(stats) == {zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED}
+    assert stats[zipfile.ZIP_STORED]["members"] == len(stored)
+    assert stats[zipfile.ZIP_STORED]["compress_size"] == stats[zipfile.ZIP_STORED]["file_size"]
+    assert stats[zipfile.ZIP_DEFLATED]["members"] == len(members) - len(stored)
+    assert stats[zipfile.ZIP_DEFLATED]["compress_size"] < stats[zipfile.ZIP_DEFLATED]["file_size"] / 2
+    report = policy.report().splitlines()
+    assert len(report) == 2
+    assert report[0].startswith("store: 6 members")
+    assert report[1].startswith("deflate: 2 members")
+
+
+def test_zip_plan(tmpdir):
+    rng = random.Random(42)
+    path = tmpdir / "c.bin"
+    path.write_bytes(rng.randbytes(20000))
+    date_time = (2020, 1, 2, 3, 4, 6)
+
+    def digits(offset):
+        data = b"0123456789"[offset:]
+        return iter([data[:5], b"", data[5:]])
+    members = [
+        ("a.txt", 3, b"foo", date_time),
+        ("b/c.bin", 20000, path, date_time),
+        ("empty", 0, b"", (1970, 1, 1, 0, 0, 0)),
+        ("è.txt", 10, digits, date_time),
+    ]
+    plan = ZipPlan(members)
+    data = b"".join(plan.stream(chunk_size=1000))
+    assert len(data) == plan.size
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        assert zf.testzip() is None
+        assert zf.namelist() == [_[0] for _ in members]
+        assert zf.read("b/c.bin") == path.read_bytes()
+        assert zf.read("è.txt") == b"0123456789"
+        for info in zf.infolist():
+            assert info.compress_type == zipfile.ZIP_STORED
+        assert zf.getinfo("a.txt").date_time == date_time
+        assert zf.getinfo("empty").date_time == (1980, 1, 1, 0, 0, 0)
+    for m, info in zip(plan.members, zipfile.ZipFile(io.BytesIO(data)).infolist()):
+        assert m.offset == info.header_offset
+        assert data[m.data_offset:m.data_offset + m.size] == zipfile.ZipFile(io.BytesIO(data)).read(m.name)
+    # any range of the same archive, from a fresh plan (with no CRCs yet)
+    for _ in range(200):
+        start = rng.randrange(plan.size + 1)
+        end = rng.randrange(start, plan.size + 1)
+        assert b"".join(ZipPlan(members).stream(start, end, chunk_size=1000)) == data[start:end]
+    assert b"".join(plan.stream(plan.size - 10, plan.size + 10)) == data[-10:]
+    with pytest.raises(ValueError):
+        list(plan.stream(10, 5))
+    # data changed after computing the plan
+    path.write_bytes(b"foo")
+    with pytest.raises(RuntimeError):
+        list(ZipPlan(members).stream())
+
+
+def test_zip_plan_crc_reuse():
+    reads = []
+    lock = threading.Lock()
+
+    def source(offset):
+        with lock:
+            reads.append(offset)
+        time.sleep(0.01)
+        return iter([bytes(1000)[offset:]])
+    plan = ZipPlan([(f"{i}.bin", 1000, source, (2020, 1, 1, 0, 0, 0)) for i in range(5)])
+    tail = plan.central_dir_offset
+    # concurrent ranges that reach the central directory
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(
+            lambda start: b"".join(plan.stream(start)), [tail, tail + 10, tail + 20, tail + 30]
+        ))
+    assert reads == [0] * 5
+    assert results[1] == results[0][10:]
+    # CRCs are not computed again for later ranges
+    assert b"".join(plan.stream(tail - 5)).endswith(results[0])
+    assert reads == [0] * 5
+    with zipfile.ZipFile(io.BytesIO(b"".join(plan.stream()))) as zf:
+        assert zf.testzip() is None